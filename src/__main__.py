@@ -20,9 +20,14 @@
 import time
 start_time = time.monotonic()
 
+from os import getenv
 from sys import exit
 
 try:
+    if getenv('IMPORT_PROFILE', 'false').lower() == 'true':
+        from downloader.import_profiler import install_import_profiler
+        install_import_profiler(start_time)
+
     from downloader.main import main, read_env, ensure_utf8_filesystem_encoding
 except (ImportError, SyntaxError) as e:
     print(e)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# Micro-benchmark for the JSON backends used to load and save databases and stores.
+# Usage: python3 src/bench_json_backend.py [--repeat N]
+
+import argparse
+import hashlib
+import io
+import time
+
+from downloader.file_system import _json_dump_to_file
+from downloader.json_backend import JsonBackend, StdlibJsonBackend, detect_json_backend
+from downloader.logger import OffLogger
+
+
+def fake_db(db_id: str, files_amount: int) -> dict:
+    files = {}
+    folders = {}
+    for i in range(files_amount):
+        folder = f'games/System{i % 40}/Collection{i % 300}'
+        folders[folder] = {}
+        files[f'{folder}/Some Game Title ({i}) (Europe) (Rev {i % 3}).zip'] = {
+            'hash': hashlib.md5(str(i).encode()).hexdigest(),
+            'size': 1024 + i * 37,
+            'url': f'https://archive.example.org/download/set/file_{i}.zip',
+            'tags': [i % 11, i % 17, i % 23],
+        }
+    return {
+        'db_id': db_id,
+        'base_files_url': 'https://raw.githubusercontent.com/MiSTer-devel/Distribution_MiSTer/',
+        'timestamp': 1700000000,
+        'files': files,
+        'folders': folders,
+        'zips': {},
+        'tag_dictionary': {f'tag{i}': i for i in range(40)},
+    }
+
+
+def fake_store(dbs: dict[str, int]) -> dict:
+    store_dbs = {}
+    for db_id, files_amount in dbs.items():
+        db = fake_db(db_id, files_amount)
+        store_dbs[db_id] = {'base_path': '/media/fat', 'files': db['files'], 'folders': db['folders'], 'zips': {}}
+    return {'dbs': store_dbs, 'db_fingerprints': {}, 'migration_version': 12, 'internal': True}
+
+
+def measure(label: str, repeat: int, operation) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        best = min(best, time.perf_counter() - start)
+    print(f'  {label:<28} {best * 1000:9.1f} ms')
+    return best
+
+
+def bench_payload(name: str, payload: dict, backends: list[JsonBackend], repeat: int) -> None:
+    reference = StdlibJsonBackend().dumps(payload)
+    print(f'{name}: {len(reference) / (1024 * 1024):.1f} MB')
+    for backend in backends:
+        if backend.dumps(payload) != reference or backend.loads(reference) != payload:
+            raise AssertionError(f'{backend.name} does not round-trip the same bytes as the standard library')
+
+        measure(f'{backend.name} loads', repeat, lambda: backend.loads(reference))
+        measure(f'{backend.name} dumps', repeat, lambda: backend.dumps(payload))
+
+    streamed = io.BytesIO()
+    _json_dump_to_file(payload, streamed)
+    if streamed.getvalue() != reference:
+        raise AssertionError('Streamed dump does not produce the same bytes as the standard library')
+    measure('streamed dump (save_json)', repeat, lambda: _json_dump_to_file(payload, io.BytesIO()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    backends: list[JsonBackend] = [StdlibJsonBackend()]
+    detected = detect_json_backend(OffLogger())
+    if detected.name != backends[0].name:
+        backends.append(detected)
+
+    bench_payload('db 10k files', fake_db('small_db', 10_000), backends, args.repeat)
+    bench_payload('db 50k files', fake_db('big_db', 50_000), backends, args.repeat)
+    bench_payload('store 3 dbs (70k files)', fake_store({'distribution_mister': 10_000, 'arcade_roms': 50_000, 'bios': 10_000}), backends, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
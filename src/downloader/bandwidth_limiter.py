@@ -0,0 +1,171 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from downloader.config import Config
+from downloader.constants import BANDWIDTH_LIMIT_MAX_WAIT_SLICE, BANDWIDTH_LIMIT_PRIORITY_MAX_DELAY, BANDWIDTH_LIMIT_PRIORITY_WAIT_SLICE, BANDWIDTH_LIMIT_SMALL_FILE_SIZE
+from downloader.job_system import ActivityTracker
+
+
+class TokenBucket:
+    """Refills at 'rate' bytes per second up to 'capacity', which defaults to one second of rate.
+    Tokens are taken before the bytes are read, so the bucket never goes into debt."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, time_monotonic: Callable[[], float] = time.monotonic) -> None:
+        self._rate = rate
+        self.capacity = max(1, int(rate if capacity is None else capacity))
+        self._time_monotonic = time_monotonic
+        self._tokens = float(self.capacity)
+        self._last_refill = time_monotonic()
+
+    def wait_time(self, amount: int) -> float:
+        """Seconds until 'amount' tokens are available. 'amount' must not exceed the capacity."""
+        now = self._time_monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+        return 0.0 if self._tokens >= amount else (amount - self._tokens) / self._rate
+
+    def take(self, amount: int) -> None:
+        self._tokens -= amount
+
+    def give_back(self, amount: int) -> None:
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class BandwidthLimiter:
+    """Global and per-database download rate limits.
+
+    Every transfer waits for its tokens. Priority transfers (database files, zip summaries and small files)
+    only go first: while one of them is waiting, bulk transfers hold back for up to BANDWIDTH_LIMIT_PRIORITY_MAX_DELAY."""
+
+    def __init__(self, global_rate: int, db_rates: dict[str, int], activity_tracker: Optional[ActivityTracker] = None, is_interrupted: Callable[[], bool] = lambda: False, small_file_size: int = BANDWIDTH_LIMIT_SMALL_FILE_SIZE, time_monotonic: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep) -> None:
+        self._global_bucket = TokenBucket(global_rate, time_monotonic=time_monotonic) if global_rate > 0 else None
+        self._db_buckets = {db_id: TokenBucket(rate, time_monotonic=time_monotonic) for db_id, rate in db_rates.items() if rate > 0}
+        self._activity_tracker = activity_tracker
+        self._is_interrupted = is_interrupted
+        self._small_file_size = small_file_size
+        self._time_monotonic = time_monotonic
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._priority_waiters = 0
+
+    def is_active(self) -> bool:
+        return self._global_bucket is not None or len(self._db_buckets) > 0
+
+    def is_priority(self, size: Optional[int]) -> bool:
+        return size is not None and size <= self._small_file_size
+
+    def throttled(self, in_stream: Any, db_id: Optional[str], priority: bool) -> Any:
+        buckets = [] if self._global_bucket is None else [self._global_bucket]
+        if db_id is not None and db_id in self._db_buckets:
+            buckets.append(self._db_buckets[db_id])
+        if len(buckets) == 0:
+            return in_stream
+        return _ThrottledStream(in_stream, self, buckets, priority)
+
+    def _acquire(self, buckets: list[TokenBucket], amount: int, priority: bool) -> int:
+        """Waits until 'amount' bytes, capped to the smallest bucket capacity, can be taken from all the buckets.
+        Returns the bytes taken, or 0 when the wait was interrupted."""
+        amount = min([amount] + [bucket.capacity for bucket in buckets])
+        yield_until = self._time_monotonic() + BANDWIDTH_LIMIT_PRIORITY_MAX_DELAY
+        if priority:
+            with self._lock:
+                self._priority_waiters += 1
+
+        try:
+            while not self._is_interrupted():
+                with self._lock:
+                    if not priority and self._priority_waiters > 0 and self._time_monotonic() < yield_until:
+                        wait = BANDWIDTH_LIMIT_PRIORITY_WAIT_SLICE
+                    else:
+                        wait = max(bucket.wait_time(amount) for bucket in buckets)
+                        if wait <= 0:
+                            for bucket in buckets:
+                                bucket.take(amount)
+                            return amount
+
+                # Waiting in slices keeps the activity tracker alive, so long waits are not taken for a stalled pipeline.
+                self._sleep(min(wait, BANDWIDTH_LIMIT_MAX_WAIT_SLICE))
+                if self._activity_tracker is not None:
+                    self._activity_tracker.track(self._time_monotonic())
+
+            return 0
+        finally:
+            if priority:
+                with self._lock:
+                    self._priority_waiters -= 1
+
+    def _give_back(self, buckets: list[TokenBucket], amount: int) -> None:
+        with self._lock:
+            for bucket in buckets:
+                bucket.give_back(amount)
+
+
+class _ThrottledStream:
+    def __init__(self, in_stream: Any, limiter: BandwidthLimiter, buckets: list[TokenBucket], priority: bool) -> None:
+        self._in_stream = in_stream
+        self._limiter = limiter
+        self._buckets = buckets
+        self._priority = priority
+
+    def read(self, amount: int = -1) -> bytes:
+        if amount < 0:
+            chunk = self._in_stream.read(amount)
+            pending = len(chunk)
+            while pending > 0:
+                taken = self._limiter._acquire(self._buckets, pending, self._priority)
+                if taken == 0:
+                    break
+                pending -= taken
+            return chunk
+
+        # HTTP responses know how many bytes are left, so small transfers don't wait for a whole chunk worth of tokens.
+        remaining = getattr(self._in_stream, 'length', None)
+        if isinstance(remaining, int) and remaining < amount:
+            amount = max(0, remaining)
+        if amount == 0:
+            return self._in_stream.read(amount)
+
+        taken = self._limiter._acquire(self._buckets, amount, self._priority)
+        if taken == 0:
+            # Interrupted: the caller's copy loop is the one that aborts the transfer.
+            return self._in_stream.read(amount)
+
+        chunk = self._in_stream.read(taken)
+        if len(chunk) < taken:
+            self._limiter._give_back(self._buckets, taken - len(chunk))
+        return chunk
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._in_stream, name)
+
+
+def bandwidth_limiter_from_config(config: Config, activity_tracker: Optional[ActivityTracker] = None, is_interrupted: Callable[[], bool] = lambda: False) -> Optional[BandwidthLimiter]:
+    """Limits are expressed in KB/s in downloader.ini: 'downloader_bandwidth_limit' under [mister], and
+    'bandwidth_limit' under each database section. Returns None when no limit is set."""
+    db_rates: dict[str, int] = {}
+    for db_id, section in config['databases'].items():
+        options = section.get('options', None)
+        if options is not None and options.bandwidth_limit:
+            db_rates[db_id] = options.bandwidth_limit * 1024
+
+    limiter = BandwidthLimiter(max(0, config['downloader_bandwidth_limit']) * 1024, db_rates, activity_tracker, is_interrupted)
+    return limiter if limiter.is_active() else None
@@ -23,6 +23,7 @@ from downloader.constants import CHECK_STATUS_FAILED, CHECK_STATUS_UPDATE_AVAILA
     EXIT_CHECK_SUCCESS, EXIT_ERROR_WRONG_SETUP
 from downloader.db_utils import DbSectionPackage, filter_db_sections, sorted_db_sections
 from downloader.file_system import FileSystem
+from downloader.http_validators import HttpValidators
 from downloader.local_repository import LocalRepository
 from downloader.logger import Logger
 from downloader.online_checker import CheckBox, OnlineChecker
@@ -31,13 +32,14 @@ from downloader.update_output import UpdateOutput
 
 
 class CheckService:
-    def __init__(self, config: Config, online_checker: OnlineChecker, local_repository: LocalRepository, file_system: FileSystem, update_output: UpdateOutput, logger: Logger) -> None:
+    def __init__(self, config: Config, online_checker: OnlineChecker, local_repository: LocalRepository, file_system: FileSystem, update_output: UpdateOutput, logger: Logger, http_validators: Optional[HttpValidators] = None) -> None:
         self._config = config
         self._online_checker = online_checker
         self._local_repository = local_repository
         self._file_system = file_system
         self._update_output = update_output
         self._logger = logger
+        self._http_validators = http_validators
 
     def check_available_updates(self, db_ids: Optional[list[str]] = None) -> int:
         self._update_output.check_started()
@@ -64,6 +66,9 @@ class CheckService:
         ]
 
         self._emit_file_space_state()
+        if self._http_validators is not None:
+            # Only read: saving them on every check would mean a write to the SD card for each menu opening.
+            self._http_validators.load_state(self._local_repository.load_http_validators())
         check_box = self._online_checker.check_dbs(db_pkgs)
         self._emit_check_box(check_box)
         status = _check_status(check_box, len(db_pkgs))
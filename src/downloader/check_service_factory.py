@@ -17,6 +17,7 @@
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
 import atexit
+from typing import TYPE_CHECKING, Optional
 
 from downloader.check_service import CheckService
 from downloader.config import Config
@@ -24,6 +25,7 @@ from downloader.constants import HTTP_SOCKET_TIMEOUT, JOB_SYSTEM_INACTIVITY_TIME
 from downloader.external_drives_repository import ExternalDrivesRepositoryFactory
 from downloader.file_system import FileSystemFactory
 from downloader.http_gateway import HttpGateway
+from downloader.http_validators import HttpValidators
 from downloader.interruptions import Interruptions
 from downloader.job_system import ActivityTracker, JobSystem
 from downloader.jobs.reporters import DownloaderProgressReporter, FileDownloadProgressReporter
@@ -36,16 +38,20 @@ from downloader.store_migrator import StoreMigrator
 from downloader.update_output import UpdateOutput
 from downloader.waiter import Waiter
 
+if TYPE_CHECKING:
+    from downloader.daemon import DaemonState
+
 
 class CheckServiceFactory:
-    def __init__(self, logger: Logger, update_output: UpdateOutput, external_drives_repository_factory: ExternalDrivesRepositoryFactory) -> None:
+    def __init__(self, logger: Logger, update_output: UpdateOutput, external_drives_repository_factory: ExternalDrivesRepositoryFactory, daemon_state: Optional['DaemonState'] = None) -> None:
         self._logger = logger
         self._update_output = update_output
         self._external_drives_repository_factory = external_drives_repository_factory
+        self._daemon_state = daemon_state
 
     @staticmethod
-    def for_main(top_logger: TopLogger, update_output: UpdateOutput):
-        return CheckServiceFactory(top_logger, update_output, ExternalDrivesRepositoryFactory())
+    def for_main(top_logger: TopLogger, update_output: UpdateOutput, daemon_state: Optional['DaemonState'] = None):
+        return CheckServiceFactory(top_logger, update_output, ExternalDrivesRepositoryFactory(), daemon_state)
 
     def create(self, config: Config):
         path_dictionary: dict[str, str] = dict()
@@ -55,19 +61,23 @@ class CheckServiceFactory:
         system_file_system = file_system_factory.create_for_system_scope()
         external_drives_repository = self._external_drives_repository_factory.create(system_file_system, self._logger)
         store_migrator = StoreMigrator(migrations(config), self._logger)
-        local_repository = LocalRepository(config, self._logger, system_file_system, store_migrator, external_drives_repository)
+        store_cache = self._daemon_state.store_cache if self._daemon_state is not None else None
+        local_repository = LocalRepository(config, self._logger, system_file_system, store_migrator, external_drives_repository, store_cache=store_cache)
 
-        ssl_ctx, ssl_err = context_from_curl_ssl(config['curl_ssl'])
-        if ssl_err is not None:
-            self._logger.debug(ssl_err)
-            self._logger.print('WARNING! Ignoring SSL parameters...')
-        http_gateway = HttpGateway(
-            ssl_ctx=ssl_ctx,
-            read_timeout=HTTP_SOCKET_TIMEOUT,
-            logger=DebugOnlyLoggerDecorator(self._logger) if config['http_logging'] else None,
-            config=config['http_config']
-        )
-        atexit.register(http_gateway.cleanup)
+        if self._daemon_state is not None:
+            http_gateway = self._daemon_state.http_gateway(config)
+        else:
+            ssl_ctx, ssl_err = context_from_curl_ssl(config['curl_ssl'])
+            if ssl_err is not None:
+                self._logger.debug(ssl_err)
+                self._logger.print('WARNING! Ignoring SSL parameters...')
+            http_gateway = HttpGateway(
+                ssl_ctx=ssl_ctx,
+                read_timeout=HTTP_SOCKET_TIMEOUT,
+                logger=DebugOnlyLoggerDecorator(self._logger) if config['http_logging'] else None,
+                config=config['http_config']
+            )
+            atexit.register(http_gateway.cleanup)
 
         file_download_reporter = FileDownloadProgressReporter(
             self._logger,
@@ -82,6 +92,7 @@ class CheckServiceFactory:
             max_tries=config['downloader_retries'],
             max_timeout=JOB_SYSTEM_INACTIVITY_TIMEOUT,
         )
+        http_validators = self._daemon_state.http_validators if self._daemon_state is not None else HttpValidators()
         online_checker_workers_factory = OnlineCheckerWorkersFactory(
             worker_context=job_system,
             progress_reporter=file_download_reporter,
@@ -92,6 +103,7 @@ class CheckServiceFactory:
             local_repository=local_repository,
             config=config,
             external_drives_repository=external_drives_repository,
+            http_validators=http_validators,
         )
         online_checker = OnlineChecker(
             logger=self._logger,
@@ -106,4 +118,5 @@ class CheckServiceFactory:
             system_file_system,
             self._update_output,
             self._logger,
+            http_validators,
         )
@@ -18,14 +18,16 @@
 
 from enum import IntEnum, unique
 from pathlib import Path
-from typing import NamedTuple, TypedDict, Optional
+from typing import TYPE_CHECKING, NamedTuple, TypedDict, Optional
 
 from downloader.constants import FILE_downloader_ini, K_BASE_PATH, K_DOWNLOADER_TIMEOUT, K_DOWNLOADER_RETRIES, \
     MEDIA_FAT, DISTRIBUTION_MISTER_DB_ID, K_DOWNLOADER_THREADS_LIMIT, STORAGE_PRIORITY_PREFER_SD, \
     DEFAULT_MINIMUM_SYSTEM_FREE_SPACE_MB, DEFAULT_MINIMUM_EXTERNAL_FREE_SPACE_MB, DOWNLOADER_OUTPUT_HUMAN
 from downloader.db_options import DbOptions
 from downloader.error import DownloaderError
-from downloader.http_gateway import HttpConfig
+
+if TYPE_CHECKING:
+    from downloader.http_gateway import HttpConfig  # Only for typing, so that reading the config doesn't load ssl and http.client
 
 
 class Environment(TypedDict):
@@ -103,13 +105,17 @@ class ConfigMisterSection(TypedDict):
     update_linux: bool
     file_checking: FileChecking
     downloader_threads_limit: int
+    downloader_threads_autotune: bool
     downloader_timeout: int
     downloader_retries: int
+    downloader_bandwidth_limit: int
+    index_processes: int
     filter: str
     minimum_system_free_space_mb: int
     minimum_external_free_space_mb: int
     user_defined_options: list[str]
     http_proxy: Optional[str]
+    http_prewarm_connections: int
 
 
 class ConfigRequired(ConfigMisterSection):
@@ -130,7 +136,7 @@ class ConfigRequired(ConfigMisterSection):
     curl_ssl: str
     ssl_cert_file: str
     http_logging: bool
-    http_config: Optional[HttpConfig]
+    http_config: Optional['HttpConfig']
     rotate_logs: bool
     downloader_output: str
 
@@ -154,8 +160,11 @@ def default_config() -> Config:
         'allow_reboot': AllowReboot.ALWAYS,
         'update_linux': True,
         'downloader_threads_limit': 6,
+        'downloader_threads_autotune': False,
         'downloader_timeout': 180,
         'downloader_retries': 3,
+        'downloader_bandwidth_limit': 0,
+        'index_processes': 0,
         'zip_file_count_threshold': 60,
         'zip_accumulated_mb_threshold': 100,
         'filter': '',
@@ -174,6 +183,7 @@ def default_config() -> Config:
         'minimum_system_free_space_mb': DEFAULT_MINIMUM_SYSTEM_FREE_SPACE_MB,
         'minimum_external_free_space_mb': DEFAULT_MINIMUM_EXTERNAL_FREE_SPACE_MB,
         'http_proxy': '',
+        'http_prewarm_connections': 2,
         'http_config': None,
         'rotate_logs': True,
         'downloader_output': DOWNLOADER_OUTPUT_HUMAN
@@ -29,14 +29,14 @@ from typing import Optional, TypeVar, Union, SupportsInt
 from downloader.config import Environment, Config, default_config, InvalidConfigParameter, AllowReboot, \
     ConfigDatabaseSection, ConfigMisterSection, AllowDelete, FileChecking, IgnoredDatabase
 from downloader.constants import FILE_downloader_ini, FOLDER_downloader, DEFAULT_UPDATE_LINUX_ENV, K_DEFAULT_DB_ID, K_BASE_PATH, DISTRIBUTION_MISTER_DB_ID, \
-    K_DB_URL, K_DOWNLOADER_THREADS_LIMIT, K_DOWNLOADER_TIMEOUT, K_DOWNLOADER_RETRIES, K_FILTER, K_BASE_SYSTEM_PATH, \
+    K_DB_URL, K_DOWNLOADER_THREADS_LIMIT, K_DOWNLOADER_THREADS_AUTOTUNE, K_DOWNLOADER_TIMEOUT, K_DOWNLOADER_RETRIES, K_INDEX_PROCESSES, K_FILTER, K_BASE_SYSTEM_PATH, \
     K_STORAGE_PRIORITY, K_ALLOW_DELETE, K_ALLOW_REBOOT, K_VERBOSE, K_UPDATE_LINUX, K_MINIMUM_SYSTEM_FREE_SPACE_MB, \
     K_MINIMUM_EXTERNAL_FREE_SPACE_MB, STORAGE_PRIORITY_OFF, STORAGE_PRIORITY_PREFER_SD, \
-    STORAGE_PRIORITY_PREFER_EXTERNAL, EXIT_ERROR_WRONG_SETUP, K_BENCH, K_HTTP_PROXY, FILE_CHECKING_FASTEST, \
+    STORAGE_PRIORITY_PREFER_EXTERNAL, EXIT_ERROR_WRONG_SETUP, K_BENCH, K_HTTP_PROXY, K_HTTP_PREWARM_CONNECTIONS, K_DOWNLOADER_BANDWIDTH_LIMIT, K_BANDWIDTH_LIMIT, K_BASE_FILES_MIRRORS, FILE_CHECKING_FASTEST, \
     FILE_CHECKING_BALANCED, FILE_CHECKING_EXHAUSTIVE, FILE_CHECKING_VERIFY_INTEGRITY, KENV_EXTRA_DROP_IN_DATABASE_FILES, \
     DOWNLOADER_OUTPUTS, DOWNLOADER_OUTPUT_HUMAN, K_DOWNLOADER_OUTPUT, K_DESCRIPTION
-from downloader.db_options import DbOptions, DbOptionsProps, DbOptionsValidationException
-from downloader.http_gateway import http_config, HttpGatewayException
+from downloader.db_entity import is_url_valid
+from downloader.db_options import DbOptions, DbOptionsProps, DbIniOptionsProps, DbOptionsValidationException
 from downloader.logger import Logger
 from downloader.update_output import UpdateOutput
 
@@ -197,13 +197,15 @@ class ConfigReader:
 
         config['skip_free_space_checks'] = strtobool(self._env['SKIP_FREE_SPACE_CHECKS']) or config['is_pc_launcher']
 
-        try:
-            if self._env['HTTP_PROXY'] or self._env['HTTPS_PROXY']:
-                config['http_config'] = http_config(http_proxy=self._env['HTTP_PROXY'], https_proxy=self._env['HTTPS_PROXY'])
-            elif config['http_proxy'] != '':
-                config['http_config'] = http_config(http_proxy=config['http_proxy'], https_proxy=None)
-        except HttpGatewayException as e:
-            raise InvalidConfigParameter(f'Invalid http_config: {e}') from e
+        if self._env['HTTP_PROXY'] or self._env['HTTPS_PROXY'] or config['http_proxy'] != '':
+            from downloader.http_gateway import http_config, HttpGatewayException
+            try:
+                if self._env['HTTP_PROXY'] or self._env['HTTPS_PROXY']:
+                    config['http_config'] = http_config(http_proxy=self._env['HTTP_PROXY'], https_proxy=self._env['HTTPS_PROXY'])
+                else:
+                    config['http_config'] = http_config(http_proxy=config['http_proxy'], https_proxy=None)
+            except HttpGatewayException as e:
+                raise InvalidConfigParameter(f'Invalid http_config: {e}') from e
 
         config['environment'] = self._env
 
@@ -358,8 +360,20 @@ class ConfigReader:
         if parser.has(K_FILTER):
             options['filter'] = parser.get_string(K_FILTER, '')
 
+        ini_options: DbIniOptionsProps = dict()
+        if parser.has(K_BANDWIDTH_LIMIT):
+            bandwidth_limit = parser.get_int(K_BANDWIDTH_LIMIT, -1)
+            if bandwidth_limit < 0:
+                raise InvalidConfigParameter("Invalid options for section '%s': %s" % (section_id, K_BANDWIDTH_LIMIT))
+            ini_options['bandwidth_limit'] = bandwidth_limit
+        if parser.has(K_BASE_FILES_MIRRORS):
+            mirrors = parser.get_string(K_BASE_FILES_MIRRORS, '').replace(',', ' ').split()
+            if not all(is_url_valid(mirror) for mirror in mirrors):
+                raise InvalidConfigParameter("Invalid options for section '%s': %s" % (section_id, K_BASE_FILES_MIRRORS))
+            ini_options['base_files_mirrors'] = mirrors
+
         try:
-            return DbOptions(options)
+            return DbOptions(options, ini_options)
         except DbOptionsValidationException as e:
             raise InvalidConfigParameter("Invalid options for section '%s': %s" % (section_id, e.fields_to_string()))
 
@@ -375,13 +389,17 @@ class ConfigReader:
             'bench': parser.get_bool(K_BENCH, result['bench']),
             'update_linux': parser.get_bool(K_UPDATE_LINUX, result['update_linux']),
             'downloader_threads_limit': parser.get_int(K_DOWNLOADER_THREADS_LIMIT, result['downloader_threads_limit']),
+            'downloader_threads_autotune': parser.get_bool(K_DOWNLOADER_THREADS_AUTOTUNE, result['downloader_threads_autotune']),
             'downloader_timeout': parser.get_int(K_DOWNLOADER_TIMEOUT, result['downloader_timeout']),
             'downloader_retries': parser.get_int(K_DOWNLOADER_RETRIES, result['downloader_retries']),
+            'downloader_bandwidth_limit': parser.get_int(K_DOWNLOADER_BANDWIDTH_LIMIT, result['downloader_bandwidth_limit']),
+            'index_processes': parser.get_int(K_INDEX_PROCESSES, result['index_processes']),
             'filter': parser.get_string(K_FILTER, result['filter']).strip().lower(),
             'minimum_system_free_space_mb': parser.get_int(K_MINIMUM_SYSTEM_FREE_SPACE_MB, result['minimum_system_free_space_mb']),
             'minimum_external_free_space_mb': parser.get_int(K_MINIMUM_EXTERNAL_FREE_SPACE_MB, result['minimum_external_free_space_mb']),
             'user_defined_options': [],
-            'http_proxy': parser.get_string(K_HTTP_PROXY, '').strip()
+            'http_proxy': parser.get_string(K_HTTP_PROXY, '').strip(),
+            'http_prewarm_connections': parser.get_int(K_HTTP_PREWARM_CONNECTIONS, result['http_prewarm_connections']),
         }
 
         for key in mister:
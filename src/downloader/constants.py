@@ -70,12 +70,16 @@ FILE_yc_txt: Final[str] = 'yc.txt'
 FOLDER_downloader: Final[str] = 'downloader'
 
 # Downloader files
+FOLDER_downloader_config: Final[str] = 'Scripts/.config/downloader'
 FILE_downloader_storage_zip: Final[str] = 'Scripts/.config/downloader/downloader.json.zip'
 FILE_downloader_storage_json: Final[str] = 'Scripts/.config/downloader/downloader.json'
 FILE_downloader_storage_backup_pext: Final[str] = 'Scripts/.config/downloader/downloader_backup_pext.json'
 FILE_downloader_storage_sigs_json: Final[str] = 'Scripts/.config/downloader/downloader_sigs.json'
 FILE_downloader_storage_fingerprints_json: Final[str] = 'Scripts/.config/downloader/downloader_fingerprints.json'
 FILE_downloader_previous_free_space_json: Final[str] = 'Scripts/.config/downloader/previous_free_space.json'
+FILE_downloader_http_redirects_json: Final[str] = 'Scripts/.config/downloader/http_redirects.json'
+FILE_downloader_http_validators_json: Final[str] = 'Scripts/.config/downloader/http_validators.json'
+FILE_downloader_metrics_json: Final[str] = 'Scripts/.config/downloader/metrics.json'
 FILE_downloader_external_storage: Final[str] = '.downloader_db.json'
 FILE_downloader_external_store_fingerprints_json: Final[str] = '.downloader_db_fingerprints.json'
 FILE_downloader_last_successful_run: Final[str] = 'Scripts/.config/downloader/%s.last_successful_run'
@@ -102,6 +106,10 @@ FILE_Linux_user_files: Final[list[tuple[str, str]]] = [
     ('/media/fat/linux/dhcpcd.conf', '/etc/dhcpcd.conf'),
     ('/media/fat/linux/fstab', '/etc/fstab'),
 ]
+FOLDER_Linux: Final[str] = '/media/fat/linux'
+FOLDER_Linux_update: Final[str] = '/media/fat/linux.update'
+FOLDER_Linux_update_files: Final[str] = '/media/fat/linux.update/files/linux'
+LINUX_UPDATE_EXCLUDED_FOLDERS: Final[frozenset[str]] = frozenset(['gamecontrollerdb'])
 
 # Signal files
 FILE_downloader_needs_reboot_after_linux_update: Final[str] = '/tmp/downloader_needs_reboot_after_linux_update'
@@ -148,6 +156,56 @@ STORAGE_PATHS_SET: Final[set[str]] = set(STORAGE_PATHS_PRIORITY_SEQUENCE)
 # Timeouts
 HTTP_SOCKET_TIMEOUT: Final[int] = 60
 JOB_SYSTEM_INACTIVITY_TIMEOUT: Final[int] = 600
+EXTERNAL_STORE_DRIVE_TIMEOUT: Final[int] = 60
+SAFE_FETCH_RETRY_WAIT: Final[float] = 2.0
+
+# Logs
+FILE_LOGGER_BUFFER_LINES: Final[int] = 4096
+FILE_LOGGER_FLUSH_INTERVAL: Final[float] = 0.5
+
+# Update output
+UPDATE_OUTPUT_BATCH_INTERVAL: Final[float] = 0.1
+UPDATE_OUTPUT_BATCH_MAX_LINES: Final[int] = 1000
+
+# File removal
+REMOVAL_JOBS_PER_DRIVE: Final[int] = 3
+REMOVAL_MIN_FILES_PER_JOB: Final[int] = 64
+UNINSTALL_WORKERS_PER_DRIVE: Final[int] = 4
+
+# Index processing
+INDEX_PROCESS_POOL_MIN_FILES: Final[int] = 5000
+
+# Threads autotuning
+THREADS_AUTOTUNE_MIN_THREADS: Final[int] = 2
+THREADS_AUTOTUNE_PERIOD: Final[float] = 3.0
+THREADS_AUTOTUNE_TOLERANCE: Final[float] = 0.1
+THREADS_AUTOTUNE_MAX_IOWAIT: Final[float] = 0.5
+THREADS_AUTOTUNE_MAX_LATENCY_FACTOR: Final[float] = 3.0
+
+# Bandwidth limit
+BANDWIDTH_LIMIT_SMALL_FILE_SIZE: Final[int] = 512 * 1024
+BANDWIDTH_LIMIT_MAX_WAIT_SLICE: Final[float] = 1.0
+BANDWIDTH_LIMIT_PRIORITY_WAIT_SLICE: Final[float] = 0.05
+BANDWIDTH_LIMIT_PRIORITY_MAX_DELAY: Final[float] = 5.0
+
+# Mirrors
+MIRROR_REFERENCE_SIZE: Final[int] = 1024 * 1024
+MIRROR_SCORE_EWMA_WEIGHT: Final[float] = 0.3
+MIRROR_SPREAD_FACTOR: Final[float] = 1.5
+MIRROR_FAILURES_TO_DISABLE: Final[int] = 2
+MIRROR_DISABLED_SECONDS: Final[float] = 60.0
+MIRROR_FAILOVER_HTTP_RETRIES: Final[int] = 2
+
+# Zip summaries prefetch
+ZIP_SUMMARY_PREFETCH_THREADS: Final[int] = 4
+HTTP_VALIDATORS_MAX_AGE: Final[float] = 60 * 24 * 60 * 60
+HTTP_VALIDATORS_TIME_REFRESH: Final[float] = 24 * 60 * 60
+
+# Daemon
+FILE_downloader_daemon_socket: Final[str] = '/tmp/downloader_daemon.sock'
+DAEMON_REQUEST_TIMEOUT: Final[float] = 10.0
+DAEMON_MAX_REQUEST_SIZE: Final[int] = 64 * 1024
+DAEMON_OUTPUT_DRAIN_TIMEOUT: Final[float] = 1.0
 
 # Filters
 ESSENTIAL_TERM: Final[str] = 'essential'
@@ -164,7 +222,9 @@ K_ALLOW_DELETE: Final[str] = 'allow_delete'
 K_ALLOW_REBOOT: Final[str] = 'allow_reboot'
 K_UPDATE_LINUX: Final[str] = 'update_linux'
 K_DOWNLOADER_THREADS_LIMIT: Final[str] = 'downloader_threads_limit'
+K_DOWNLOADER_THREADS_AUTOTUNE: Final[str] = 'downloader_threads_autotune'
 K_DOWNLOADER_TIMEOUT: Final[str] = 'downloader_timeout'
+K_INDEX_PROCESSES: Final[str] = 'index_processes'
 K_DOWNLOADER_RETRIES: Final[str] = 'downloader_retries'
 K_ZIP_FILE_COUNT_THRESHOLD: Final[str] = 'zip_file_count_threshold'
 K_ZIP_ACCUMULATED_MB_THRESHOLD: Final[str] = 'zip_accumulated_mb_threshold'
@@ -188,6 +248,10 @@ K_IS_PC_LAUNCHER: Final[str] = 'is_pc_launcher'
 K_MINIMUM_SYSTEM_FREE_SPACE_MB: Final[str] = 'minimum_system_free_space_mb'
 K_MINIMUM_EXTERNAL_FREE_SPACE_MB: Final[str] = 'minimum_external_free_space_mb'
 K_HTTP_PROXY: Final[str] = 'http_proxy'
+K_HTTP_PREWARM_CONNECTIONS: Final[str] = 'http_prewarm_connections'
+K_DOWNLOADER_BANDWIDTH_LIMIT: Final[str] = 'downloader_bandwidth_limit'
+K_BANDWIDTH_LIMIT: Final[str] = 'bandwidth_limit'
+K_BASE_FILES_MIRRORS: Final[str] = 'base_files_mirrors'
 
 # Default Config option
 DEFAULT_CACERT_FILE: Final[str] = '/etc/ssl/certs/cacert.pem'
@@ -0,0 +1,323 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import codecs
+import io
+import json
+import os
+import signal
+import socket
+import threading
+import traceback
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from typing import Any, Callable, Generator, Optional, TextIO
+
+from downloader.config import Config
+from downloader.constants import DAEMON_MAX_REQUEST_SIZE, DAEMON_OUTPUT_DRAIN_TIMEOUT, DAEMON_REQUEST_TIMEOUT, \
+    FILE_downloader_daemon_socket, HTTP_SOCKET_TIMEOUT
+from downloader.http_gateway import HttpGateway
+from downloader.http_validators import HttpValidators
+from downloader.index_process_pool import IndexProcessPool
+from downloader.local_repository import StoreCache
+from downloader.logger import DebugOnlyLoggerDecorator, Logger, OffLogger, PrintLogger
+from downloader.metrics import NoopMetrics, set_metrics
+from downloader.ssl_context import context_from_curl_ssl
+
+
+class DaemonState:
+    """Components that stay warm between the commands served by the daemon.
+
+    The config is read again for every command, and the components built from it are rebuilt
+    whenever the options they depend on change."""
+
+    def __init__(self) -> None:
+        self.logger = _CommandLogger()
+        self.http_validators = HttpValidators()
+        self.store_cache = StoreCache()
+        self._http_gateway: Optional[HttpGateway] = None
+        self._http_gateway_key: Optional[str] = None
+        self._index_process_pool: Optional[IndexProcessPool] = None
+        self._index_processes = 0
+
+    def start_command(self, logger: Logger) -> None:
+        self.logger.set_logger(logger)
+
+    def http_gateway(self, config: Config) -> HttpGateway:
+        key = repr((config['curl_ssl'], config['http_logging'], config['http_config']))
+        gateway = self._http_gateway
+        if gateway is not None and not gateway.out_of_service and key == self._http_gateway_key:
+            return gateway
+
+        if gateway is not None:
+            gateway.cleanup()
+
+        ssl_ctx, ssl_err = context_from_curl_ssl(config['curl_ssl'])
+        if ssl_err is not None:
+            self.logger.debug(ssl_err)
+            self.logger.print('WARNING! Ignoring SSL parameters...')
+        self._http_gateway = HttpGateway(
+            ssl_ctx=ssl_ctx,
+            read_timeout=HTTP_SOCKET_TIMEOUT,
+            logger=DebugOnlyLoggerDecorator(self.logger) if config['http_logging'] else None,
+            config=config['http_config']
+        )
+        self._http_gateway_key = key
+        return self._http_gateway
+
+    def index_process_pool(self, config: Config) -> IndexProcessPool:
+        pool = self._index_process_pool
+        if pool is not None and self._index_processes == config['index_processes'] and (pool.enabled() or self._index_processes == 0):
+            return pool
+
+        if pool is not None:
+            pool.shutdown()
+
+        self._index_processes = config['index_processes']
+        self._index_process_pool = IndexProcessPool(self._index_processes, self.logger)
+        self._index_process_pool.start()
+        return self._index_process_pool
+
+    def cleanup(self) -> None:
+        if self._http_gateway is not None:
+            self._http_gateway.cleanup()
+        if self._index_process_pool is not None:
+            self._index_process_pool.shutdown()
+        self.store_cache.clear()
+
+
+RunCommand = Callable[[list[str], DaemonState], int]
+
+
+def run_daemon(run_command: RunCommand, socket_path: str = FILE_downloader_daemon_socket) -> int:
+    logger = PrintLogger()
+    if not hasattr(socket, 'AF_UNIX'):
+        logger.print('Daemon mode is not supported on this system.')
+        return 1
+
+    try:
+        server = _listen(socket_path)
+    except OSError as e:
+        logger.print(f'Could not listen at "{socket_path}": {e}')
+        return 1
+
+    if server is None:
+        logger.print(f'Another daemon is already listening at "{socket_path}".')
+        return 1
+
+    state = DaemonState()
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    logger.print(f'Downloader daemon listening at "{socket_path}".')
+    try:
+        while True:
+            connection, _ = server.accept()
+            with connection:
+                _serve(connection, state, run_command)
+    except (KeyboardInterrupt, _DaemonStopped):
+        pass
+    finally:
+        server.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+        state.cleanup()
+        logger.print('Downloader daemon stopped.')
+
+    return 0
+
+
+def _listen(socket_path: str) -> Optional[socket.socket]:
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            return None
+        except OSError:
+            # Leftover of a daemon that didn't exit cleanly.
+            os.unlink(socket_path)
+        finally:
+            probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+        os.chmod(socket_path, 0o600)
+        server.listen(4)
+    except OSError:
+        server.close()
+        raise
+    return server
+
+
+class _DaemonStopped(BaseException):
+    """Raised by the SIGTERM handler. It is not a SystemExit, because a SystemExit raised by a command
+    only ends that command."""
+
+
+def _exit_on_signal(_signum: int, _frame: Any) -> None:
+    raise _DaemonStopped()
+
+
+def _serve(connection: socket.socket, state: DaemonState, run_command: RunCommand) -> None:
+    connection.settimeout(DAEMON_REQUEST_TIMEOUT)
+    client = _ClientStream(connection)
+    try:
+        args = _read_request(connection)
+    except (OSError, ValueError) as e:
+        client.write(f'Invalid daemon request: {e}\n')
+        client.write_exit(1)
+        return
+
+    if args is None:
+        return
+
+    connection.settimeout(None)
+    with redirect_stdout(client), redirect_stderr(client), _redirect_output_fds(client):
+        # noinspection PyBroadException
+        try:
+            exit_code = run_command(['downloader'] + args, state)
+        except SystemExit as e:
+            exit_code = _system_exit_code(e, client)
+        except Exception:
+            traceback.print_exc(file=client)
+            exit_code = 1
+        finally:
+            state.start_command(OffLogger())
+            set_metrics(NoopMetrics())
+
+    client.write_exit(exit_code)
+
+
+def _system_exit_code(e: SystemExit, client: '_ClientStream') -> int:
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    client.write(f'{e.code}\n')
+    return 1
+
+
+@contextmanager
+def _redirect_output_fds(client: '_ClientStream') -> Generator[None, None, None]:
+    """Subprocesses (like the ones of the Linux update) write straight into the stdout and stderr file
+    descriptors, so those are pointed to a pipe that is forwarded to the client while the command runs."""
+    read_fd, write_fd = os.pipe()
+    saved_fds = [os.dup(1), os.dup(2)]
+    os.dup2(write_fd, 1)
+    os.dup2(write_fd, 2)
+    os.close(write_fd)
+    forwarder = threading.Thread(target=_forward_fd, args=(read_fd, client), daemon=True)
+    forwarder.start()
+    try:
+        yield
+    finally:
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        for fd in saved_fds:
+            os.close(fd)
+        # The pipe reaches its end once no process keeps it open anymore.
+        forwarder.join(DAEMON_OUTPUT_DRAIN_TIMEOUT)
+
+
+def _forward_fd(read_fd: int, client: '_ClientStream') -> None:
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    try:
+        while True:
+            data = os.read(read_fd, 4096)
+            if not data:
+                break
+            client.write(decoder.decode(data))
+        client.write(decoder.decode(b'', final=True))
+    finally:
+        os.close(read_fd)
+
+
+def _read_request(connection: socket.socket) -> Optional[list[str]]:
+    data = b''
+    while b'\n' not in data:
+        chunk = connection.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > DAEMON_MAX_REQUEST_SIZE:
+            raise ValueError('request too large')
+
+    line = data.split(b'\n', 1)[0].strip()
+    if len(line) == 0:
+        return None
+
+    args = json.loads(line.decode('utf-8'))
+    if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+        raise ValueError('expected a JSON list of arguments')
+    if '--daemon' in args:
+        raise ValueError('--daemon can not be sent to a daemon')
+    return args
+
+
+class _ClientStream(io.TextIOBase):
+    """Text stream that writes into the client socket. If the client disconnects, the command keeps running
+    until the end so that stores and logs are saved as usual, and its output is discarded."""
+
+    def __init__(self, connection: socket.socket) -> None:
+        super().__init__()
+        self._connection = connection
+        self._lock = threading.Lock()
+        self._disconnected = False
+
+    @property
+    def encoding(self) -> str:
+        return 'utf-8'
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        data = text.encode('utf-8', 'replace')
+        with self._lock:
+            if not self._disconnected:
+                try:
+                    self._connection.sendall(data)
+                except OSError:
+                    self._disconnected = True
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def write_exit(self, exit_code: int) -> None:
+        self.write(f'DLP1\tevent:daemon_exit\tcode:{exit_code}\n')
+
+
+class _CommandLogger(Logger):
+    """Components living in DaemonState outlive the commands, so they log through whichever logger the
+    command being served is using."""
+
+    def __init__(self) -> None:
+        self._logger: Logger = OffLogger()
+
+    def set_logger(self, logger: Logger) -> None:
+        self._logger = logger
+
+    def print(self, *args: Any, sep: str='', end: str='\n', file: Optional[TextIO]=None, flush: bool=True) -> None:
+        self._logger.print(*args, sep=sep, end=end, file=file, flush=flush)
+
+    def debug(self, *args: Any, sep: str='', end: str='\n', flush: bool=True) -> None:
+        self._logger.debug(*args, sep=sep, end=end, flush=flush)
+
+    def bench(self, *args: Any) -> None:
+        self._logger.bench(*args)
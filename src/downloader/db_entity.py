@@ -65,6 +65,8 @@ class DbEntity:
 
         self.base_files_url: str = db_props.get('base_files_url', '')
         if not isinstance(self.base_files_url, str): raise DbEntityValidationException(f'Database "{section}" needs a valid "base_files_url" field. The database maintainer should fix this.')
+        self.base_files_mirrors: list[str] = db_props.get('base_files_mirrors', [])
+        if not isinstance(self.base_files_mirrors, list) or not all(isinstance(mirror, str) and is_url_valid(mirror) for mirror in self.base_files_mirrors): raise DbEntityValidationException(f'Database "{section}" needs a valid "base_files_mirrors" field. The database maintainer should fix this.')
         self.tag_dictionary: dict[str, int] = db_props.get('tag_dictionary', {})
         if not isinstance(self.tag_dictionary, dict): raise DbEntityValidationException(f'Database "{section}" needs a valid "tag_dictionary" field. The database maintainer should fix this.')
         self.linux: Optional[dict[str, Any]] = db_props.get('linux', None)
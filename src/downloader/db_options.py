@@ -26,8 +26,15 @@ class DbOptionsProps(TypedDict, total=False):
     store_replica: str
 
 
+class DbIniOptionsProps(TypedDict, total=False):
+    bandwidth_limit: int
+    base_files_mirrors: list[str]
+
+
 class DbOptions:
-    def __init__(self, props: Any) -> None:
+    def __init__(self, props: Any, ini_props: Optional[DbIniOptionsProps] = None) -> None:
+        """'ini_props' are the options that only downloader.ini can set, already validated by ConfigReader.
+        Databases can't set them through their 'default_options'."""
         if not isinstance(props, dict):
             raise DbOptionsValidationException(['Database-scoped options has improper format.'])
 
@@ -67,11 +74,16 @@ class DbOptions:
 
         self._props = props
 
+        ini_props = ini_props or {}
+        self.bandwidth_limit: Optional[int] = ini_props.get('bandwidth_limit', None)
+        self.base_files_mirrors: Optional[list[str]] = ini_props.get('base_files_mirrors', None)
+        self._ini_props = ini_props
+
     def any(self) -> bool:
-        return self.filter is not None
+        return self.filter is not None or self.bandwidth_limit is not None or self.base_files_mirrors is not None
 
     def unwrap_props(self) -> Any:
-        return self._props
+        return {**self._props, **self._ini_props} if len(self._ini_props) > 0 else self._props
 
 
 class DbOptionsValidationException(DownloaderError):
@@ -18,7 +18,7 @@
 
 
 from dataclasses import dataclass
-from typing import Any, Iterable, Mapping, cast
+from typing import Any, Iterable, Mapping, Optional, cast
 
 from downloader.config import Config, ConfigDatabaseSection, FileChecking
 from downloader.constants import DB_STATE_FINGERPRINT_NO_HASH, DB_STATE_FINGERPRINT_NO_SIZE, \
@@ -60,11 +60,15 @@ def filter_db_sections(config: Config, db_ids: Iterable[str]) -> tuple[list[tupl
 
 
 def build_db_config(input_config: Config, db: DbEntity, ini_description: ConfigDatabaseSection) -> Config:
+    return build_db_config_with_default_filter(input_config, db.default_options.filter, ini_description)
+
+
+def build_db_config_with_default_filter(input_config: Config, default_filter: Optional[str], ini_description: ConfigDatabaseSection) -> Config:
     result = input_config.copy()
 
-    if db.default_options.filter is not None:
-        if 'filter' not in input_config['user_defined_options'] or '[mister]' in db.default_options.filter:
-            result['filter'] = db.default_options.filter
+    if default_filter is not None:
+        if 'filter' not in input_config['user_defined_options'] or '[mister]' in default_filter:
+            result['filter'] = default_filter
 
     if 'options' in ini_description and ini_description['options'].filter is not None:
         result['filter'] = ini_description['options'].filter
@@ -0,0 +1,190 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import errno
+import selectors
+import socket
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+AddrInfo = tuple[int, int, int, str, Any]
+
+DNS_CACHE_TTL = 300.0
+CONNECTION_ATTEMPT_DELAY = 0.25  # RFC 8305 recommends 250ms between connection attempts
+
+_IN_PROGRESS = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK)}
+
+
+class DnsCache:
+    """In-process cache for the system resolver, and a 'Happy Eyeballs' connector on top of it.
+    Connection attempts alternate address families starting with the one that worked last, and a new attempt
+    starts every CONNECTION_ATTEMPT_DELAY while the previous ones are still pending, so a broken IPv6 route
+    doesn't stall the connection until the connect timeout."""
+
+    def __init__(self, ttl: float = DNS_CACHE_TTL, attempt_delay: float = CONNECTION_ATTEMPT_DELAY, getaddrinfo: Callable[..., list[AddrInfo]] = socket.getaddrinfo, time_monotonic: Callable[[], float] = time.monotonic) -> None:
+        self._ttl = ttl
+        self._attempt_delay = attempt_delay
+        self._getaddrinfo = getaddrinfo
+        self._time_monotonic = time_monotonic
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, int], tuple[float, list[AddrInfo]]] = {}
+        self._resolving_locks: dict[tuple[str, int], threading.Lock] = {}
+        self._preferred_family: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, host: str, port: int) -> list[AddrInfo]:
+        key = (host, port)
+        with self._lock:
+            infos = self._valid_entry(key)
+            if infos is not None:
+                self.hits += 1
+                return infos
+            resolving_lock = self._resolving_locks.setdefault(key, threading.Lock())
+
+        # Only one thread resolves each host, the rest wait for its answer.
+        with resolving_lock:
+            with self._lock:
+                infos = self._valid_entry(key)
+                if infos is not None:
+                    self.hits += 1
+                    return infos
+                self.misses += 1
+
+            infos = self._getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            with self._lock:
+                self._entries[key] = (self._time_monotonic() + self._ttl, infos)
+            return infos
+
+    def forget(self, host: str, port: int) -> None:
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def create_connection(self, address: tuple[str, int], timeout: Any = None, source_address: Optional[tuple[str, int]] = None) -> socket.socket:
+        """Drop-in replacement for socket.create_connection."""
+        host, port = address
+        timeout = timeout if isinstance(timeout, (int, float)) else None
+        infos = self._sorted_by_preference(self.resolve(host, port))
+        if not infos:
+            raise OSError(f'getaddrinfo returned an empty list for {host}')
+
+        try:
+            sock, family = self._race(infos, timeout, source_address)
+        except OSError:
+            self.forget(host, port)
+            raise
+
+        self._preferred_family = family
+        sock.setblocking(True)
+        if timeout is not None:
+            sock.settimeout(timeout)
+        return sock
+
+    def _valid_entry(self, key: tuple[str, int]) -> Optional[list[AddrInfo]]:
+        entry = self._entries.get(key, None)
+        if entry is None or entry[0] < self._time_monotonic():
+            return None
+        return entry[1]
+
+    def _sorted_by_preference(self, infos: list[AddrInfo]) -> list[AddrInfo]:
+        # Interleaves families (RFC 8305 section 4), starting with the one that connected last time.
+        by_family: dict[int, list[AddrInfo]] = {}
+        for info in infos:
+            by_family.setdefault(info[0], []).append(info)
+
+        families = list(by_family)
+        preferred = self._preferred_family
+        if preferred in by_family:
+            families.remove(preferred)
+            families.insert(0, preferred)
+
+        result: list[AddrInfo] = []
+        while any(by_family.values()):
+            for family in families:
+                if by_family[family]:
+                    result.append(by_family[family].pop(0))
+        return result
+
+    def _race(self, infos: list[AddrInfo], timeout: Optional[float], source_address: Optional[tuple[str, int]]) -> tuple[socket.socket, int]:
+        start = self._time_monotonic()
+        deadline = None if timeout is None else start + timeout
+        pending = list(infos)
+        attempts: dict[socket.socket, AddrInfo] = {}
+        last_error: Optional[OSError] = None
+        next_attempt = start
+        winner: Optional[socket.socket] = None
+
+        with selectors.DefaultSelector() as selector:
+            try:
+                while pending or attempts:
+                    now = self._time_monotonic()
+                    if deadline is not None and now >= deadline:
+                        raise socket.timeout('timed out')
+
+                    if pending and now >= next_attempt:
+                        info = pending.pop(0)
+                        try:
+                            sock = _start_attempt(info, source_address)
+                        except OSError as e:
+                            last_error = e
+                            continue
+                        attempts[sock] = info
+                        selector.register(sock, selectors.EVENT_WRITE)
+                        next_attempt = now + self._attempt_delay
+                        continue
+
+                    wait = None
+                    if pending: wait = next_attempt - now
+                    if deadline is not None: wait = deadline - now if wait is None else min(wait, deadline - now)
+
+                    for key, _ in selector.select(wait):
+                        sock = key.fileobj  # type: ignore[assignment]
+                        selector.unregister(sock)
+                        info = attempts.pop(sock)
+                        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                        if error == 0:
+                            winner = sock
+                            return sock, info[0]
+
+                        sock.close()
+                        last_error = OSError(error, f'{errno.errorcode.get(error, error)} connecting to {info[4]}')
+                        next_attempt = self._time_monotonic()  # A failed attempt lets the next one start right away
+            finally:
+                for sock in attempts:
+                    if sock is not winner:
+                        sock.close()
+
+        raise last_error if last_error is not None else OSError('Could not connect to any address')
+
+
+def _start_attempt(info: AddrInfo, source_address: Optional[tuple[str, int]]) -> socket.socket:
+    family, type_, proto, _, sockaddr = info
+    sock = socket.socket(family, type_, proto)
+    try:
+        sock.setblocking(False)
+        if source_address is not None:
+            sock.bind(source_address)
+        error = sock.connect_ex(sockaddr)
+        if error not in _IN_PROGRESS:
+            raise OSError(error, f'{errno.errorcode.get(error, error)} connecting to {sockaddr}')
+        return sock
+    except BaseException:
+        sock.close()
+        raise
@@ -17,18 +17,18 @@
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
 import hashlib
-import json
 from collections import Counter
 from typing import Any, Mapping, Optional
 
+from downloader.json_backend import json_backend
+
 
 EXTERNAL_STORE_FINGERPRINTS = 'external_store_fingerprints'
 
 
 def external_store_fragment_fingerprint(fragment: dict[str, Any]) -> str:
     # Content-only hash: drives cannot be identified by mount path, so there is no drive salt.
-    canonical_fragment = json.dumps(fragment, sort_keys=True, separators=(',', ':'), ensure_ascii=True)
-    return hashlib.md5(canonical_fragment.encode()).hexdigest()
+    return hashlib.md5(json_backend().dumps_canonical(fragment)).hexdigest()
 
 
 def external_store_manifest(external_store: dict[str, Any], db_ids: set[str]) -> dict[str, str]:
@@ -17,14 +17,14 @@
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
 import re
-from pathlib import Path
 from typing import Optional, Any, Iterable, TypedDict, Union, Final
 from abc import ABC, abstractmethod
 
 from downloader.config import Config
-from downloader.constants import ESSENTIAL_TERM
+from downloader.constants import ESSENTIAL_TERM, INDEX_PROCESS_POOL_MIN_FILES
 from downloader.db_entity import DbEntity
 from downloader.error import DownloaderError
+from downloader.index_process_pool import IndexProcessPool
 from downloader.jobs.index import Index
 from downloader.logger import Logger
 
@@ -75,8 +75,9 @@ class FilterCalculatorImpl(FilterCalculator):
 
 
 class FileFilter:
-    def __init__(self, filter_calculator: Optional[FilterCalculator]) -> None:
+    def __init__(self, filter_calculator: Optional[FilterCalculator], process_pool: Optional[IndexProcessPool] = None) -> None:
         self._filter_calculator = filter_calculator
+        self._process_pool = process_pool
 
     def select_filtered_files(self, summary: Index) -> tuple[Index, ZipData]:
         filtered_zip_data: ZipData = {}
@@ -85,27 +86,25 @@ class FileFilter:
         if self._filter_calculator is None:
             return summary, filtered_zip_data
 
-        for file_path, file_desc in list(summary.files.items()):
-            if self._filter_calculator.is_filtered(file_desc):
+        file_items = list(summary.files.items())
+        files_tags = [file_desc.get('tags', []) for _, file_desc in file_items]
+        folders_tags = [(folder_path, folder_desc.get('tags', [])) for folder_path, folder_desc in summary.folders.items()]
+        if self._process_pool is not None and self._process_pool.enabled() and len(file_items) >= INDEX_PROCESS_POOL_MIN_FILES:
+            # Only the tags travel to the worker process, and only flags and folder paths come back.
+            file_flags, filtered_folders = self._process_pool.run(classify_filtered_tags, self._filter_calculator, files_tags, folders_tags)
+        else:
+            file_flags, filtered_folders = classify_filtered_tags(self._filter_calculator, files_tags, folders_tags)
+
+        for (file_path, file_desc), filtered in zip(file_items, file_flags):
+            if filtered:
                 if 'zip_id' in file_desc:
                     self._add_filtered_file_in_zip(filtered_zip_data, file_path, file_desc['zip_id'], file_desc)
                 summary.files.pop(file_path)
 
-        keep_folders = set()
-
-        for folder_path in reversed(sorted(summary.folders.keys(), key=len)):
-            if folder_path in keep_folders:
-                continue
-
-            folder_desc = summary.folders[folder_path]
-
-            if self._filter_calculator.is_filtered(folder_desc):
-                if 'zip_id' in folder_desc:
-                    self._add_filtered_folder_in_zip(filtered_zip_data, folder_path, folder_desc['zip_id'], folder_desc)
-                summary.folders.pop(folder_path)
-            else:
-                for parent in Path(folder_path).parents:
-                    keep_folders.add(str(parent))
+        for folder_path in filtered_folders:
+            folder_desc = summary.folders.pop(folder_path)
+            if 'zip_id' in folder_desc:
+                self._add_filtered_folder_in_zip(filtered_zip_data, folder_path, folder_desc['zip_id'], folder_desc)
 
         return summary, filtered_zip_data
 
@@ -124,14 +123,58 @@ class FileFilter:
         zip_desc['folders'][folder_path] = folder_desc
 
 
+def classify_filtered_entries(filter_calculator: FilterCalculator, file_descriptions: list[FileFolderDesc], folders: dict[str, FileFolderDesc]) -> tuple[bytearray, list[str]]:
+    """Returns a filtered flag per file and the filtered folders."""
+    file_flags = bytearray(len(file_descriptions))
+    for i, file_desc in enumerate(file_descriptions):
+        if filter_calculator.is_filtered(file_desc):
+            file_flags[i] = 1
+
+    keep_folders = set()
+    filtered_folders = []
+
+    for folder_path in reversed(sorted(folders.keys(), key=len)):
+        if folder_path in keep_folders:
+            continue
+
+        if filter_calculator.is_filtered(folders[folder_path]):
+            filtered_folders.append(folder_path)
+        else:
+            parent = folder_path
+            while '/' in parent:
+                parent = parent.rsplit('/', 1)[0]
+                if parent in keep_folders:
+                    break
+                keep_folders.add(parent)
+
+    return file_flags, filtered_folders
+
+
+def classify_filtered_tags(filter_calculator: FilterCalculator, files_tags: list[list[Union[str, int]]], folders_tags: list[tuple[str, list[Union[str, int]]]]) -> tuple[bytearray, list[str]]:
+    """Pure function, so it can run in a worker process. Same result as classify_filtered_entries, from the tags alone."""
+    # Big dbs repeat the same few tag combinations over thousands of files, so each combination is calculated once.
+    by_combination: dict[tuple[Union[str, int], ...], int] = {}
+    file_flags = bytearray(len(files_tags))
+    for i, tags in enumerate(files_tags):
+        combination = tuple(tags)
+        filtered = by_combination.get(combination, None)
+        if filtered is None:
+            filtered = by_combination[combination] = 1 if filter_calculator.is_filtered({'tags': tags}) else 0
+        file_flags[i] = filtered
+
+    _, filtered_folders = classify_filtered_entries(filter_calculator, [], {folder_path: {'tags': tags} for folder_path, tags in folders_tags})
+    return file_flags, filtered_folders
+
+
 class FileFilterFactory:
-    def __init__(self, logger: Logger) -> None:
+    def __init__(self, logger: Logger, process_pool: Optional[IndexProcessPool] = None) -> None:
         self._logger = logger
+        self._process_pool = process_pool
         self._unused: set[str] = set()
         self._used: set[str] = set()
 
     def create(self, db: DbEntity, index: Index, config: Config) -> FileFilter:
-        return FileFilter(self._create_filter_calculator(db, index, config))
+        return FileFilter(self._create_filter_calculator(db, index, config), self._process_pool)
 
     def unused_filter_parts(self) -> list[str]:
         return list(self._unused - self._used)
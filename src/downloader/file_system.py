@@ -20,35 +20,28 @@ import io
 import os
 import hashlib
 import shutil
-import json
 import socket
 import tempfile
 import threading
 import time
 import zipfile
 from abc import ABC, abstractmethod
+from itertools import islice
 from pathlib import Path
 from typing import Callable, Final, Optional, Any, Union, IO, BinaryIO
 
 from downloader.config import Config
-from downloader.constants import HASH_file_does_not_exist, STORAGE_PATHS_SET
+from downloader.constants import HASH_file_does_not_exist, STORAGE_PATHS_SET, FOLDER_downloader_config
 from downloader.error import DownloaderError
 from downloader.job_system import ActivityTracker
+from downloader.json_backend import json_backend, set_json_backend, detect_json_backend
 from downloader.logger import Logger, OffLogger
+from downloader.metrics import metrics
 from downloader.path_package import PathPackage
 
 is_windows: Final = os.name == 'nt'
 COPY_BUFSIZE: Final = 256 * 1024
 
-# OPTIMIZATION:
-# Uncommenting all the HAS_ORJSON blocks has the potential of saving around 200ms
-# The drawback is we need to install the following files:
-#  - /media/fat/Scripts/.config/downloader/orjson/orjson.cpython-39-arm-linux-gnueabihf.so
-#  - /media/fat/Scripts/.config/downloader/orjson/__init__.py
-#HAS_ORJSON = False
-#import sys
-
-
 class FileSystemFactory:
     def __init__(self, config: Config, path_dictionary: dict[str, str], logger: Logger, activity_tracker: ActivityTracker, time_monotonic: Callable[[], float] = time.monotonic) -> None:
         self._config = config
@@ -65,30 +58,18 @@ class FileSystemFactory:
         return self.create_for_config(self._config)
 
     def create_for_config(self, config) -> 'FileSystem':
-        # if self._lazy_json_init is False:
-        #     self._lazy_json_init = True
-        #
-        #     self._logger.bench('FileSystemFactory trying to load ORJSON start.')
-        #     global HAS_ORJSON
-        #     if os.path.exists('/media/fat/Scripts/.config/downloader/orjson'):
-        #         try:
-        #             sys.path.insert(0, '/media/fat/Scripts/.config/downloader')
-        #             import orjson as _orjson
-        #             globals()['orjson'] = _orjson
-        #             #HAS_ORJSON = True
-        #         except ImportError:
-        #             pass
-        #     if HAS_ORJSON:
-        #         self._logger.debug('Using ORJSON!')
-        #     else:
-        #         self._logger.debug('Using standard JSON library.')
-        #     self._logger.bench('FileSystemFactory trying to load ORJSON end.')
+        if self._lazy_json_init is False:
+            self._lazy_json_init = True
+            set_json_backend(detect_json_backend(self._logger, os.path.join(config['base_system_path'], FOLDER_downloader_config)))
 
         return _FileSystem(config['base_path'], self._path_dictionary, self._logger, self._unique_temp_filenames, self._shared_state, self._activity_tracker, self._time_monotonic)
 
     def cancel_ongoing_operations(self) -> None:
         self._shared_state.interrupting_operations = True
 
+    def is_cancelling_operations(self) -> bool:
+        return self._shared_state.interrupting_operations
+
 
 class FileSystem(ABC):
 
@@ -108,6 +89,10 @@ class FileSystem(ABC):
     def are_files(self, file_pkgs: list[PathPackage]) -> tuple[list[PathPackage], list[PathPackage]]:
         """interface"""
 
+    @abstractmethod
+    def are_files_at(self, full_paths: list[str]) -> list[bool]:
+        """interface"""
+
     @abstractmethod
     def print_debug(self) -> None:
         """interface"""
@@ -172,6 +157,14 @@ class FileSystem(ABC):
     def folder_has_items(self, path: str) -> bool:
         """interface"""
 
+    @abstractmethod
+    def subfolder_names(self, path: str) -> set[str]:
+        """interface"""
+
+    @abstractmethod
+    def folder_items_count(self, path: str) -> Optional[int]:
+        """interface"""
+
     @abstractmethod
     def remove_folder(self, path: str) -> Optional[Exception]:
         """interface"""
@@ -227,6 +220,9 @@ class ReadOnlyFileSystem:
     def are_files(self, file_pkgs: list[PathPackage]) -> tuple[list[PathPackage], list[PathPackage]]:
         return self._fs.are_files(file_pkgs)
 
+    def are_files_at(self, full_paths: list[str]) -> list[bool]:
+        return self._fs.are_files_at(full_paths)
+
     def is_folder(self, path):
         return self._fs.is_folder(path)
 
@@ -248,9 +244,15 @@ class ReadOnlyFileSystem:
     def load_dict_from_transfer(self, source: str, transfer):
         return self._fs.load_dict_from_transfer(source, transfer)
 
+    def subfolder_names(self, path: str) -> set[str]:
+        return self._fs.subfolder_names(path)
+
     def folder_has_items(self, path):
         return self._fs.folder_has_items(path)
 
+    def folder_items_count(self, path):
+        return self._fs.folder_items_count(path)
+
     def hash(self, path):
         return self._fs.hash(path)
 
@@ -308,6 +310,7 @@ class _FileSystem(FileSystem):
         full_path = self._path(path)
         if use_cache and self._shared_state.contains_file(full_path):
             self._quick_hit += 1
+            metrics().count('fs.is_file_cache_hits')
             return True
         elif os.path.isfile(full_path):
             self._slow_hit += 1
@@ -329,6 +332,16 @@ class _FileSystem(FileSystem):
         self._shared_state.add_many_files(bulk_add)
         return are, nope
 
+    def are_files_at(self, full_paths: list[str]) -> list[bool]:
+        presence = self._shared_state.contained_files(full_paths)
+        bulk_add = []
+        for i, present in enumerate(presence):
+            if not present and os.path.isfile(full_paths[i]):
+                bulk_add.append(full_paths[i])
+                presence[i] = True
+        self._shared_state.add_many_files(bulk_add)
+        return presence
+
     def print_debug(self) -> None:
         self._logger.debug('IS_FILE quick hits: %s slow hits: %s', self._quick_hit, self._slow_hit)
 
@@ -366,31 +379,40 @@ class _FileSystem(FileSystem):
             return f.write(content)
 
     def write_file_bytes_atomically(self, path: str, content: bytes) -> Optional[Exception]:
-        full_path = self._path(path)
+        try:
+            self._write_atomically(self._path(path), lambda f: f.write(content))
+            return None
+        except Exception as error:
+            return error
+
+    def _write_atomically(self, full_path: str, write: Callable[[BinaryIO], Any]) -> None:
+        # The target is never opened for writing: a power cut leaves either the old file or the new one.
         parent = os.path.dirname(full_path) or '.'
-        temporary_path: Optional[str] = None
+        descriptor, temporary_path = tempfile.mkstemp(
+            prefix=f'.{os.path.basename(full_path)}.',
+            suffix='.tmp',
+            dir=parent,
+        )
         try:
-            descriptor, temporary_path = tempfile.mkstemp(
-                prefix=f'.{os.path.basename(full_path)}.',
-                suffix='.tmp',
-                dir=parent,
-            )
             with os.fdopen(descriptor, 'wb') as temporary_file:
-                temporary_file.write(content)
+                write(temporary_file)
                 temporary_file.flush()
                 if os.path.exists(full_path):
-                    shutil.copystat(full_path, temporary_path)
+                    try:
+                        shutil.copystat(full_path, temporary_path)
+                    except OSError:
+                        pass
                 os.fsync(temporary_file.fileno())
             os.replace(temporary_path, full_path)
-            self._shared_state.add_file(full_path)
-            return None
-        except Exception as error:
-            if temporary_path is not None:
-                try:
-                    os.unlink(temporary_path)
-                except OSError:
-                    pass
-            return error
+        except BaseException:
+            try:
+                os.unlink(temporary_path)
+            except OSError:
+                pass
+            raise
+
+        _fsync_folder(parent)
+        self._shared_state.add_file(full_path)
 
     def touch(self, path: str) -> None:
         full_path = self._path(path)
@@ -440,6 +462,7 @@ class _FileSystem(FileSystem):
             raise FileCopyError(f"Cannot append '{source}' to '{target}'") from e
 
     def hash(self, path: str) -> str:
+        metrics().count('fs.files_hashed')
         try:
             return hash_file(self._path(path))
         except Exception as e:
@@ -488,6 +511,29 @@ class _FileSystem(FileSystem):
 
         return False
 
+    def folder_items_count(self, path: str) -> Optional[int]:
+        try:
+            with os.scandir(self._path(path)) as iterator:
+                return sum(1 for _ in iterator)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            self._ignore_error(e)
+            return None
+
+    def subfolder_names(self, path: str) -> set[str]:
+        result = set()
+        try:
+            with os.scandir(self._path(path)) as iterator:
+                for entry in iterator:
+                    if entry.is_dir():
+                        result.add(entry.name)
+
+        except OSError as e:
+            self._ignore_error(e)
+
+        return result
+
     def remove_folder(self, path: str) -> Optional[Exception]:
         full_path = self._path(path)
         self._debug_log('Deleting empty folder', (path, full_path))
@@ -519,7 +565,7 @@ class _FileSystem(FileSystem):
                         break
 
                     last_data_time = self._time_monotonic()
-                    self._activity_tracker.track(last_data_time)
+                    self._activity_tracker.track(last_data_time, len(chunk))
                     out_file.write(chunk)
                     file_size += len(chunk)
                 except socket.timeout:
@@ -547,7 +593,7 @@ class _FileSystem(FileSystem):
                     break
 
                 last_data_time = self._time_monotonic()
-                self._activity_tracker.track(last_data_time)
+                self._activity_tracker.track(last_data_time, len(chunk))
                 buf.write(chunk)
 
                 if md5_hasher is not None:
@@ -599,18 +645,19 @@ class _FileSystem(FileSystem):
     def save_json_on_zip(self, db: dict[str, Any], path: str) -> None:
         full_path = self._path(path)
         json_name = Path(path).stem
-        zip_path = Path(full_path).absolute()
 
         self._debug_log('Saving json on zip', (path, full_path))
 
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            zipf.writestr(json_name, _json_dump_binary(db))
+        def write_zip(f: BinaryIO) -> None:
+            with zipfile.ZipFile(f, 'w') as zipf, zipf.open(json_name, 'w') as json_file:
+                _json_dump_to_file(db, json_file)
+
+        self._write_atomically(str(Path(full_path).absolute()), write_zip)
 
     def save_json(self, db: dict[str, Any], path: str) -> None:
         full_path = self._path(path)
         self._debug_log('Saving json', (path, full_path))
-        with open(full_path, 'wb') as f:
-            _json_dump_to_file(db, f)
+        self._write_atomically(full_path, lambda f: _json_dump_to_file(db, f))
 
     def unzip_contents(self, zip_file: Union[str, io.BytesIO], target_path: Union[str, dict[str, str]], test_info: Any, /) -> None:
         if not isinstance(zip_file, str):
@@ -698,6 +745,22 @@ def hash_file(path: str) -> str:
         return file_hash.hexdigest()
 
 
+def _fsync_folder(path: str) -> None:
+    # Makes the rename itself durable. Not supported on Windows nor by some filesystems, where it's a no-op.
+    if is_windows:
+        return
+    try:
+        descriptor = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
 def absolute_parent_folder(absolute_path: str) -> str:
     return str(Path(absolute_path).parent)
 
@@ -745,6 +808,12 @@ class FsSharedState:
                     foreigns.append(p)
         return contained, foreigns
 
+    def contained_files(self, paths: list[str]) -> list[bool]:
+        if len(paths) == 0: return []
+        with self._files_lock:
+            files = self._files
+            return [p in files for p in paths]
+
     def add_many_files(self, paths: list[str]) -> None:
         if len(paths) == 0: return
         with self._files_lock:
@@ -758,22 +827,42 @@ class FsSharedState:
         with self._files_lock:
             self._files.discard(path)
 
+_JSON_STREAMED_DICT_MAX_ENTRIES: Final = 64
+_JSON_DICT_CHUNK_ENTRIES: Final = 1000
+
 def _json_load_from_bytesio(data: io.BytesIO) -> dict[str, Any]:
-    #if HAS_ORJSON: return orjson.loads(data.getvalue())
-    return json.loads(data.getvalue().decode("utf-8"))
+    return json_backend().loads(data.getvalue())
 
 def _json_loads_from_iobytes(data: IO[bytes]) -> dict[str, Any]:
-    #if HAS_ORJSON: return orjson.loads(data.read())
-    return json.loads(data.read().decode("utf-8"))
+    return json_backend().loads(data.read())
 
 def _json_loads_from_binaryio(data: BinaryIO) -> dict[str, Any]:
-    #if HAS_ORJSON: return orjson.loads(data.read())
-    return json.loads(data.read().decode("utf-8"))
-
-def _json_dump_binary(obj: dict[str, Any]) -> bytes:
-    #if HAS_ORJSON: return orjson.dumps(obj)
-    return json.dumps(obj).encode()
-
-def _json_dump_to_file(obj: dict[str, Any], f: BinaryIO) -> int:
-    #if HAS_ORJSON: return f.write(orjson.dumps(obj))
-    return f.write(json.dumps(obj).encode())
+    return json_backend().loads(data.read())
+
+def _json_dump_to_file(obj: Any, f: IO[bytes]) -> int:
+    # Streams the store piece by piece (same bytes as json.dumps) so it never needs
+    # to be held in memory as a single string. Small dicts are walked key by key,
+    # and dicts with many entries (files, folders) are encoded in chunks, which is
+    # much faster than one call per entry.
+    if not isinstance(obj, dict) or len(obj) == 0 or not all(isinstance(key, str) for key in obj):
+        return f.write(json_backend().dumps(obj))
+
+    written = f.write(b'{')
+    if len(obj) > _JSON_STREAMED_DICT_MAX_ENTRIES:
+        items = iter(obj.items())
+        first = True
+        while True:
+            chunk = dict(islice(items, _JSON_DICT_CHUNK_ENTRIES))
+            if len(chunk) == 0:
+                break
+            if not first:
+                written += f.write(b', ')
+            first = False
+            written += f.write(json_backend().dumps(chunk)[1:-1])
+    else:
+        for i, (key, value) in enumerate(obj.items()):
+            if i > 0:
+                written += f.write(b', ')
+            written += f.write(json_backend().dumps(key) + b': ')
+            written += _json_dump_to_file(value, f)
+    return written + f.write(b'}')
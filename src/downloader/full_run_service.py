@@ -19,7 +19,7 @@
 import datetime
 import sys
 import time
-from typing import Optional
+from typing import Any, Optional
 
 from downloader.certificates_fix import CertificatesFix
 from downloader.config import Config, FileChecking
@@ -30,9 +30,12 @@ from downloader.constants import DOWNLOADER_VERSION, EXIT_ERROR_NO_CERTS, EXIT_E
 from downloader.db_utils import DbSectionPackage, filter_db_sections, sorted_db_sections
 from downloader.external_drives_repository import ExternalDrivesRepository
 from downloader.file_system import FileSystem
+from downloader.http_gateway import HttpGateway
+from downloader.http_validators import HttpValidators
 from downloader.linux_updater import LinuxUpdater
 from downloader.local_repository import LocalRepository
 from downloader.logger import FilelogManager, Logger, ConfigLogManager
+from downloader.metrics import metrics
 from downloader.online_importer import OnlineImporter, InstallationBox, NetworkProblems
 from downloader.os_utils import OsUtils
 from downloader.other import format_files_message, format_folders_message, format_zips_message, remove_run_signal, screen_columns
@@ -42,7 +45,7 @@ from downloader.update_output import UpdateOutput
 
 
 class FullRunService:
-    def __init__(self, config: Config, logger: Logger, filelog_manager: FilelogManager, printlog_manager: ConfigLogManager, local_repository: LocalRepository, online_importer: OnlineImporter, linux_updater: LinuxUpdater, reboot_calculator: RebootCalculator, certificates_fix: CertificatesFix, external_drives_repository: ExternalDrivesRepository, os_utils: OsUtils, waiter: Waiter, file_system: FileSystem, update_output: UpdateOutput) -> None:
+    def __init__(self, config: Config, logger: Logger, filelog_manager: FilelogManager, printlog_manager: ConfigLogManager, local_repository: LocalRepository, online_importer: OnlineImporter, linux_updater: LinuxUpdater, reboot_calculator: RebootCalculator, certificates_fix: CertificatesFix, external_drives_repository: ExternalDrivesRepository, os_utils: OsUtils, waiter: Waiter, file_system: FileSystem, update_output: UpdateOutput, http_gateway: HttpGateway, http_validators: HttpValidators) -> None:
         self._waiter = waiter
         self._os_utils = os_utils
         self._external_drives_repository = external_drives_repository
@@ -57,13 +60,17 @@ class FullRunService:
         self._config = config
         self._file_system = file_system
         self._update_output = update_output
+        self._http_gateway = http_gateway
+        self._http_validators = http_validators
+        self._loaded_redirects_state: dict[str, Any] = {}
         self._file_checking_mode_resolver = FileCheckingModeResolver(local_repository, file_system, logger)
         self._final_reporter = FinalReporter(local_repository, config, logger, waiter, self._update_output)
 
     def configure_components(self) -> None:
         self._logger.bench('FullRunService configure_components start.')
-        self._printlog_manager.configure(self._config)
-        self._filelog_manager.set_local_repository(self._local_repository)
+        with metrics().span('full_run_service.configure_components'):
+            self._printlog_manager.configure(self._config)
+            self._filelog_manager.set_local_repository(self._local_repository)
         self._logger.bench('FullRunService configure_components done.')
 
     def print_drives(self) -> int:
@@ -86,9 +93,12 @@ class FullRunService:
         return self._run(db_ids)
 
     def _run(self, filter_db_ids: Optional[list[str]]) -> int:
+        self._filelog_manager.use_final_logfile()
         self._update_output.run_started(DOWNLOADER_VERSION, self._config['commit'])
         self._logger.bench('FullRunService Full Run start.')
-        result = self._run_impl(filter_db_ids)
+        with metrics().span('full_run_service.run'):
+            result = self._run_impl(filter_db_ids)
+        self._save_http_state()
         self._logger.bench('FullRunService Full Run done.')
         self._remove_run_signal()
 
@@ -123,6 +133,12 @@ class FullRunService:
 
         self._local_repository.ensure_base_paths()
 
+        self._loaded_redirects_state = self._local_repository.load_http_redirects()
+        loaded_redirects = self._http_gateway.load_redirects_state(self._loaded_redirects_state)
+        if loaded_redirects > 0:
+            self._logger.debug(f'Loaded {loaded_redirects} cached HTTP redirects.')
+        self._http_validators.load_state(self._local_repository.load_http_validators())
+
         file_checking_opt = self._config['file_checking']
         new_file_checking = self._file_checking_mode_resolver.calc_file_checking_changes(file_checking_opt)
         if new_file_checking is not None:
@@ -211,6 +227,15 @@ class FullRunService:
     def _remove_run_signal(self) -> None:
         remove_run_signal(self._file_system, self._logger)
 
+    def _save_http_state(self) -> None:
+        # Only written when they changed, to spare the SD card a write per run.
+        redirects_state = self._http_gateway.redirects_state()
+        if _redirect_targets(redirects_state) != _redirect_targets(self._loaded_redirects_state):
+            self._local_repository.save_http_redirects(redirects_state)
+
+        if self._http_validators.needs_save() and self._local_repository.save_http_validators(self._http_validators.state()) is None:
+            self._http_validators.mark_saved()
+
 class FileCheckingModeResolver:
     def __init__(self, local_repository: LocalRepository, file_system: FileSystem, logger: Logger) -> None:
         self._local_repository = local_repository
@@ -378,3 +403,10 @@ class FinalReporter:
         self._logger.print('Folders that failed: %d' % len(box.failed_folders()))
         self._logger.print('Zips that failed: %d' % len(box.failed_zips()))
         self._logger.print('Databases that failed: %d' % len(box.failed_dbs()))
+
+
+def _redirect_targets(redirects_state: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
+    # Expiration times move on every run, only the learned targets tell if there is something new to save.
+    def targets(entries: Any) -> dict[str, Any]:
+        return {source: entry[0] for source, entry in entries.items() if isinstance(entry, list) and len(entry) > 0} if isinstance(entries, dict) else {}
+    return targets(redirects_state.get('urls', None)), targets(redirects_state.get('hosts', None))
@@ -16,15 +16,18 @@
 # You can download the latest version of this tool from:
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
+from downloader.bandwidth_limiter import bandwidth_limiter_from_config
 from downloader.certificates_fix import CertificatesFix
 from downloader.config import Config
-from downloader.constants import HTTP_SOCKET_TIMEOUT, JOB_SYSTEM_INACTIVITY_TIMEOUT
+from downloader.constants import HTTP_SOCKET_TIMEOUT, JOB_SYSTEM_INACTIVITY_TIMEOUT, THREADS_AUTOTUNE_MIN_THREADS
 from downloader.external_drives_repository import ExternalDrivesRepositoryFactory
 from downloader.file_filter import FileFilterFactory
 from downloader.file_system import FileSystemFactory
 from downloader.free_space_reservation import LinuxFreeSpaceReservation, UnlimitedFreeSpaceReservation
 from downloader.full_run_service import FullRunService
 from downloader.http_gateway import HttpGateway
+from downloader.http_validators import HttpValidators
+from downloader.index_process_pool import IndexProcessPool
 from downloader.interruptions import Interruptions
 from downloader.job_system import ActivityTracker, JobSystem
 from downloader.jobs.fetch_file_worker import SafeFileFetcher
@@ -41,22 +44,28 @@ from downloader.reboot_calculator import RebootCalculator
 from downloader.ssl_context import context_from_curl_ssl
 from downloader.store_migrator import StoreMigrator
 from downloader.target_path_calculator import TargetPathsCalculatorFactory
+from downloader.threads_autotuner import ThreadsAutotuner
 from downloader.waiter import Waiter
 import atexit
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from downloader.daemon import DaemonState
 
 
 class FullRunServiceFactory:
-    def __init__(self, logger: Logger, filelog_manager: FilelogManager, printlog_manager: ConfigLogManager, update_output: UpdateOutput, external_drives_repository_factory=None) -> None:
+    def __init__(self, logger: Logger, filelog_manager: FilelogManager, printlog_manager: ConfigLogManager, update_output: UpdateOutput, external_drives_repository_factory=None, daemon_state: Optional['DaemonState'] = None) -> None:
         self._logger = logger
         self._filelog_manager = filelog_manager
         self._printlog_manager = printlog_manager
         self._update_output = update_output
         self._external_drives_repository_factory = external_drives_repository_factory or ExternalDrivesRepositoryFactory()
+        self._daemon_state = daemon_state
 
 
     @staticmethod
-    def for_main(top_logger: TopLogger, update_output: UpdateOutput):
-        return FullRunServiceFactory(top_logger, top_logger.file_logger, top_logger, update_output)
+    def for_main(top_logger: TopLogger, update_output: UpdateOutput, daemon_state: Optional['DaemonState'] = None):
+        return FullRunServiceFactory(top_logger, top_logger.file_logger, top_logger, update_output, daemon_state=daemon_state)
 
     def create(self, config: Config):
         path_dictionary: dict[str, str] = dict()
@@ -68,20 +77,26 @@ class FullRunServiceFactory:
         store_migrator = StoreMigrator(migrations(config), self._logger)
         local_repository = LocalRepository(config, self._logger, system_file_system, store_migrator, external_drives_repository)
 
-        ssl_ctx, ssl_err = context_from_curl_ssl(config['curl_ssl'])
-        if ssl_err is not None:
-            self._logger.debug(ssl_err)
-            self._logger.print('WARNING! Ignoring SSL parameters...')
-        http_gateway = HttpGateway(
-            ssl_ctx=ssl_ctx,
-            read_timeout=HTTP_SOCKET_TIMEOUT,
-            logger=DebugOnlyLoggerDecorator(self._logger) if config['http_logging'] else None,
-            config=config['http_config']
-        )
-        atexit.register(http_gateway.cleanup)
+        if self._daemon_state is not None:
+            http_gateway = self._daemon_state.http_gateway(config)
+        else:
+            ssl_ctx, ssl_err = context_from_curl_ssl(config['curl_ssl'])
+            if ssl_err is not None:
+                self._logger.debug(ssl_err)
+                self._logger.print('WARNING! Ignoring SSL parameters...')
+            http_gateway = HttpGateway(
+                ssl_ctx=ssl_ctx,
+                read_timeout=HTTP_SOCKET_TIMEOUT,
+                logger=DebugOnlyLoggerDecorator(self._logger) if config['http_logging'] else None,
+                config=config['http_config']
+            )
+            atexit.register(http_gateway.cleanup)
         safe_file_fetcher = SafeFileFetcher(config, system_file_system, self._logger, http_gateway, waiter)
         interrupts = Interruptions(file_system_factory, http_gateway)
         file_download_reporter = FileDownloadProgressReporter(self._logger, interrupts, self._update_output)
+        threads_tuner = None
+        if config['downloader_threads_autotune'] and config['downloader_threads_limit'] > THREADS_AUTOTUNE_MIN_THREADS:
+            threads_tuner = ThreadsAutotuner(self._logger, activity_tracker, http_gateway.first_byte_latency, THREADS_AUTOTUNE_MIN_THREADS, config['downloader_threads_limit'], print_report=config['verbose'] or config['bench'])
         job_system = JobSystem(
             reporter=DownloaderProgressReporter(self._logger, [file_download_reporter]),
             logger=self._logger,
@@ -89,12 +104,20 @@ class FullRunServiceFactory:
             max_threads=config['downloader_threads_limit'],
             max_tries=config['downloader_retries'],
             max_timeout=JOB_SYSTEM_INACTIVITY_TIMEOUT,
+            threads_tuner=threads_tuner,
         )
 
-        file_filter_factory = FileFilterFactory(self._logger)
+        if self._daemon_state is not None:
+            index_process_pool = self._daemon_state.index_process_pool(config)
+        else:
+            index_process_pool = IndexProcessPool(config['index_processes'], self._logger)
+            atexit.register(index_process_pool.shutdown)
+            index_process_pool.start()
+        file_filter_factory = FileFilterFactory(self._logger, index_process_pool)
         free_space_reservation = UnlimitedFreeSpaceReservation() if config['skip_free_space_checks'] else LinuxFreeSpaceReservation(logger=self._logger, config=config)
         linux_updater = LinuxUpdater(self._logger, waiter, config, system_file_system, safe_file_fetcher, self._update_output)
 
+        http_validators = self._daemon_state.http_validators if self._daemon_state is not None else HttpValidators()
         old_pext_paths: set[str] = set()  # @TODO: Should end up empty. Remove when we have 100% in not having pext paths anymore.
         fail_ctx = FailCtx(self._logger)
         online_importer_workers_factory = OnlineImporterWorkersFactory(
@@ -110,7 +133,9 @@ class FullRunServiceFactory:
             target_paths_calculator_factory=TargetPathsCalculatorFactory(system_file_system, external_drives_repository, old_pext_paths),
             fail_ctx=fail_ctx,
             config=config,
-            update_output=self._update_output
+            update_output=self._update_output,
+            bandwidth_limiter=bandwidth_limiter_from_config(config, activity_tracker, file_system_factory.is_cancelling_operations),
+            http_validators=http_validators,
         )
         online_importer = OnlineImporter(
             config=config,
@@ -140,6 +165,8 @@ class FullRunServiceFactory:
             waiter,
             system_file_system,
             self._update_output,
+            http_gateway,
+            http_validators,
         )
         instance.configure_components()
         return instance
@@ -24,11 +24,13 @@ import time
 from datetime import datetime, timezone
 from contextlib import contextmanager
 from email.utils import parsedate_to_datetime
-from typing import Literal, Type, Any, Optional, Generator, Union, Protocol, TypeVar, Generic, TypedDict
+from typing import Iterable, Literal, Type, Any, Optional, Generator, Union, Protocol, TypeVar, Generic, TypedDict
 from urllib.parse import urlparse, ParseResult, urlunparse, urljoin
 from http.client import HTTPConnection, HTTPSConnection, HTTPResponse, HTTPException
 from types import TracebackType
 
+from downloader.dns_cache import DnsCache
+
 
 T = TypeVar('T')
 class HttpGatewayException(Exception): pass
@@ -51,7 +53,7 @@ class HttpConfig(TypedDict):
 
 
 class HttpGateway:
-    def __init__(self, read_timeout: float = 60, connect_timeout: float = 15, keep_alive_timeout: float = 120, ssl_ctx: Optional[ssl.SSLContext] = None, logger: Optional[HttpLogger] = None, config: Optional[HttpConfig] = None) -> None:
+    def __init__(self, read_timeout: float = 60, connect_timeout: float = 15, keep_alive_timeout: float = 120, ssl_ctx: Optional[ssl.SSLContext] = None, logger: Optional[HttpLogger] = None, config: Optional[HttpConfig] = None, dns_cache: Optional[DnsCache] = None, tls_sessions: Optional['TlsSessionCache'] = None) -> None:
         now = time.monotonic()
         self._ssl_ctx = ssl_ctx if ssl_ctx is not None else ssl.create_default_context()
         self._read_timeout = read_timeout
@@ -59,6 +61,8 @@ class HttpGateway:
         self._keep_alive_timeout = keep_alive_timeout
         self._logger = logger
         self._config = config
+        self._dns_cache = dns_cache if dns_cache is not None else DnsCache()
+        self._tls_sessions = tls_sessions if tls_sessions is not None else TlsSessionCache()
         self._connections: dict[_QueueId, _ConnectionQueue] = {}
         self._connections_lock = threading.Lock()
         self._clean_timeout_connections_timer = now
@@ -70,6 +74,8 @@ class HttpGateway:
         self._redirects_swap: dict[Any, _Redirect[Any]] = {}
         self._clean_timeout_redirects_timer = now
         self._clean_timeout_redirects_lock = threading.Lock()
+        self._first_byte_latency: Optional[float] = None
+        self._first_byte_latency_lock = threading.Lock()
         self._out_of_service = False
 
     def __enter__(self): return self
@@ -81,32 +87,116 @@ class HttpGateway:
         self.cleanup()
 
     @contextmanager
-    def open(self, url: str, method: Optional[str] = None, body: Any = None, headers: Any = None) -> Generator[tuple[str, HTTPResponse], None, None]:
+    def open(self, url: str, method: Optional[str] = None, body: Any = None, headers: Any = None, max_retries: int = 10) -> Generator[tuple[str, HTTPResponse], None, None]:
         now = time.monotonic()
         self._clean_timeout_connections(now)
         self._clean_timeout_redirects(now)
 
         method = 'GET' if method is None else method.upper()
         if self._logger is not None: self._logger.debug(f'^^^^ {method} {url}')
+        original_url = url
         url = self._process_url(url)
         parsed_url = urlparse(url)
         scheme_code = _scheme_dict.get(parsed_url.scheme, -1)
         if scheme_code == -1: raise HttpGatewayException(f"URL '{url}' has wrong scheme '{parsed_url.scheme}'.")
-        final_url, conn = self._request(
-            url,
-            parsed_url,
-            method,
-            body,
-            self._make_headers(headers, is_http=scheme_code==0),
-        )
+        request_headers = self._make_headers(headers, is_http=scheme_code==0)
+        queue_id: _QueueId = (parsed_url.scheme, parsed_url.netloc)
+        uses_cached_redirect = url != original_url or self._process_queue_id(queue_id) != queue_id
+        final_url, conn = self._request(url, parsed_url, method, body, request_headers, max_retries)
+        if uses_cached_redirect and 400 <= conn.response.status < 500 and self._forget_redirects(original_url, url):
+            # A cached redirect target (maybe one learned in a previous run) doesn't serve this resource anymore.
+            if self._logger is not None: self._logger.debug(f'HTTP {conn.response.status} from cached redirect target. Retrying: {original_url}')
+            conn.finish_response()
+            url = original_url
+            final_url, conn = self._request(url, urlparse(url), method, body, request_headers, max_retries)
+        first_byte = time.monotonic() - now
+        self._track_first_byte_latency(first_byte)
         if self._logger is not None: self._logger.debug(f'HTTP {conn.response.status}: {final_url}\n'
-                                                        f'1st byte @ {time.monotonic() - now:.3f}s\nvvvv\n')
+                                                        f'1st byte @ {first_byte:.3f}s\nvvvv\n')
         try:
             yield final_url, conn.response
         finally:
             conn.finish_response()
             if self._logger is not None: self._logger.print(f'|||| Done: {final_url} ({time.monotonic() - now:.3f}s)')
 
+    def redirects_state(self) -> dict[str, Any]:
+        """Learned redirects that haven't expired yet, with wall-clock expiration times so they can be saved between runs."""
+        now, wall_now = time.monotonic(), time.time()
+        with self._url_redirects_lock:
+            urls = {source: [redirect.target, wall_now + redirect.timeout - now] for source, redirect in self._url_redirects.items() if not redirect.is_expired(now)}
+        with self._queue_redirects_lock:
+            hosts = {_queue_id_to_str(source): [_queue_id_to_str(redirect.target), wall_now + redirect.timeout - now] for source, redirect in self._queue_redirects.items() if not redirect.is_expired(now)}
+        return {'version': REDIRECTS_STATE_VERSION, 'urls': urls, 'hosts': hosts}
+
+    def load_redirects_state(self, state: dict[str, Any]) -> int:
+        """Loads the output of redirects_state, skipping expired or malformed entries. Returns how many redirects were loaded."""
+        if not isinstance(state, dict) or state.get('version', None) != REDIRECTS_STATE_VERSION:
+            return 0
+
+        now, wall_now = time.monotonic(), time.time()
+        urls: dict[str, _Redirect[str]] = {}
+        for source, target, expires_at in _redirect_entries(state.get('urls', None), wall_now):
+            urls[source] = _Redirect(target, now + expires_at - wall_now)
+
+        hosts: dict[_QueueId, _Redirect[_QueueId]] = {}
+        for source, target, expires_at in _redirect_entries(state.get('hosts', None), wall_now):
+            source_queue_id, target_queue_id = _queue_id_from_str(source), _queue_id_from_str(target)
+            if source_queue_id is not None and target_queue_id is not None:
+                hosts[source_queue_id] = _Redirect(target_queue_id, now + expires_at - wall_now)
+
+        with self._url_redirects_lock:
+            for source, redirect in urls.items():
+                self._url_redirects.setdefault(source, redirect)
+        with self._queue_redirects_lock:
+            for queue_id, queue_redirect in hosts.items():
+                self._queue_redirects.setdefault(queue_id, queue_redirect)
+
+        return len(urls) + len(hosts)
+
+    def _forget_redirects(self, original_url: str, redirected_url: str) -> bool:
+        forgotten = False
+        with self._url_redirects_lock:
+            if self._url_redirects.pop(original_url, None) is not None:
+                forgotten = True
+        parsed_original, parsed_redirected = urlparse(original_url), urlparse(redirected_url)
+        with self._queue_redirects_lock:
+            for queue_id in {(parsed_original.scheme, parsed_original.netloc), (parsed_redirected.scheme, parsed_redirected.netloc)}:
+                if self._queue_redirects.pop(queue_id, None) is not None:
+                    forgotten = True
+        return forgotten
+
+    def prewarm(self, urls: Iterable[str], connections_per_host: int) -> int:
+        """Opens keep-alive connections for the hosts of 'urls' in background threads, so that they are
+        already connected (and TLS-handshaked) when the first requests for those hosts arrive."""
+        if connections_per_host <= 0 or self._out_of_service:
+            return 0
+
+        queue_ids: set[_QueueId] = set()
+        for url in urls:
+            parsed_url = urlparse(url)
+            if parsed_url.scheme not in _scheme_dict or not parsed_url.netloc:
+                continue
+            queue_ids.add(self._process_queue_id((parsed_url.scheme, parsed_url.netloc)))
+
+        started = 0
+        for queue_id in queue_ids:
+            queue = self._connection_queue(queue_id)
+            for _ in range(queue.reserve_prewarm(connections_per_host)):
+                threading.Thread(target=queue.prewarm_one, daemon=True).start()
+                started += 1
+
+        if self._logger is not None and started > 0: self._logger.debug(f'Prewarming {started} connections for {len(queue_ids)} hosts.')
+        return started
+
+    def first_byte_latency(self) -> Optional[float]:
+        """Moving average of the seconds until the first byte of a response arrives. None until a request is done."""
+        return self._first_byte_latency
+
+    def _track_first_byte_latency(self, seconds: float) -> None:
+        with self._first_byte_latency_lock:
+            previous = self._first_byte_latency
+            self._first_byte_latency = seconds if previous is None else previous * 0.8 + seconds * 0.2
+
     def _make_headers(self, headers: Any, is_http: bool) -> dict[str, str]:
         if is_http and self._config and self._config['http_proxy_headers']:
             headers = headers if isinstance(headers, dict) else {}
@@ -114,6 +204,10 @@ class HttpGateway:
         else:
             return {**_default_headers, **headers} if isinstance(headers, dict) else _default_headers
 
+    @property
+    def out_of_service(self) -> bool:
+        return self._out_of_service
+
     def cleanup(self) -> None:
         self._out_of_service = True
         total_cleared = 0
@@ -122,10 +216,13 @@ class HttpGateway:
                 total_cleared += queue.clear_all()
             self._connections.clear()
         if self._logger is not None and total_cleared > 0: self._logger.debug(f'Cleaning up {total_cleared} connections.')
+        if self._logger is not None and self._dns_cache.misses > 0: self._logger.debug(f'DNS cache: {self._dns_cache.hits} hits, {self._dns_cache.misses} misses.')
+        if self._logger is not None and self._tls_sessions.handshakes > 0: self._logger.debug(f'TLS sessions: {self._tls_sessions.resumed} of {self._tls_sessions.handshakes} handshakes resumed ({self._tls_sessions.resumed * 100 // self._tls_sessions.handshakes}%).')
+        self._tls_sessions.clear()
         with self._queue_redirects_lock: self._queue_redirects.clear()
         with self._url_redirects_lock: self._url_redirects.clear()
 
-    def _request(self, url: str, parsed_url: ParseResult, method: str, body: Any, headers: Any) -> tuple[str, '_Connection']:
+    def _request(self, url: str, parsed_url: ParseResult, method: str, body: Any, headers: Any, max_retries: int) -> tuple[str, '_Connection']:
         for retry in range(11):
             queue_id: _QueueId = self._process_queue_id((parsed_url.scheme, parsed_url.netloc))
             conn = self._take_connection(queue_id)
@@ -138,13 +235,13 @@ class HttpGateway:
                 raise e
             except (HTTPException, OSError) as e:
                 conn.kill()
-                if retry >= 10: raise e
+                if retry >= min(10, max_retries): raise e
                 elif self._logger is not None: self._logger.debug(f'HTTP Exception! {type(e).__name__} ({retry}) [{url}] {str(e)}\n'
                                                                   f'Killed "{parsed_url.scheme}://{parsed_url.netloc}" connection {conn.id}.\n')
                 if retry >= 3: time.sleep(2 ** retry * 0.01)  # Exponential backoff starting on fourth retry after a failure
             else:
                 if self._logger is not None: self._logger.debug(conn.describe())
-                is_resource_moved = 300 <= conn.response.status < 400
+                is_resource_moved = 300 <= conn.response.status < 400 and conn.response.status != 304
                 if not is_resource_moved:
                     break  # If the resource is not moved, we got a final response already
 
@@ -191,11 +288,13 @@ class HttpGateway:
     def _process_queue_id(self, queue_id: '_QueueId') -> '_QueueId': return _redirect(queue_id, self._queue_redirects, self._queue_redirects_lock)
 
     def _take_connection(self, queue_id: '_QueueId') -> '_Connection':
+        return self._connection_queue(queue_id).pull()
+
+    def _connection_queue(self, queue_id: '_QueueId') -> '_ConnectionQueue':
         with self._connections_lock:
             if queue_id not in self._connections:
-                self._connections[queue_id] = _ConnectionQueue(queue_id, self._read_timeout, self._connect_timeout, self._keep_alive_timeout, self._ssl_ctx, self._logger, self._config)
-            queue = self._connections[queue_id]
-        return queue.pull()
+                self._connections[queue_id] = _ConnectionQueue(queue_id, self._read_timeout, self._connect_timeout, self._keep_alive_timeout, self._ssl_ctx, self._logger, self._config, self._dns_cache, self._tls_sessions)
+            return self._connections[queue_id]
 
     def _clean_timeout_connections(self, now: float) -> None:
         if now - self._clean_timeout_connections_timer < 30.0:
@@ -358,10 +457,32 @@ def _make_proxy_auth_header(proxy: ParseResult) -> Optional[str]:
 
 USER_AGENT = 'Downloader/2.X (Linux; theypsilon@gmail.com)'
 _default_headers = {'User-Agent': USER_AGENT, 'Connection': 'keep-alive', 'Keep-Alive': 'timeout=120'}
+_MAX_DRAIN_SIZE = 64 * 1024  # Small unread bodies (redirects, errors) are consumed so the connection can be reused
 
 
 _QueueId = tuple[str, str]
 
+REDIRECTS_STATE_VERSION = 1
+
+def _queue_id_to_str(queue_id: _QueueId) -> str:
+    return f'{queue_id[0]}://{queue_id[1]}'
+
+def _queue_id_from_str(text: str) -> Optional[_QueueId]:
+    scheme, separator, netloc = text.partition('://')
+    if not separator or scheme not in _scheme_dict or not netloc:
+        return None
+    return scheme, netloc
+
+def _redirect_entries(entries: Any, wall_now: float) -> Generator[tuple[str, str, float], None, None]:
+    if not isinstance(entries, dict):
+        return
+    for source, value in entries.items():
+        if not isinstance(value, list) or len(value) != 2:
+            continue
+        target, expires_at = value
+        if isinstance(source, str) and isinstance(target, str) and isinstance(expires_at, (int, float)) and expires_at > wall_now:
+            yield source, target, expires_at
+
 class _Redirect(Generic[T]):
     def __init__(self, target: T, timeout: float) -> None:
         self.target = target
@@ -403,6 +524,10 @@ class _Connection:
         expire_time = self._last_use_time + self._keep_alive_timeout
         return now_time > expire_time
 
+    def connect(self) -> None:
+        self._http.connect()
+        self._last_use_time = time.monotonic()
+
     def do_request(self, method: str, url: str, body: Any, headers: Any) -> None:
         self._http.request(method, url, headers=headers, body=body)
         self._http.sock.settimeout(self._read_timeout)
@@ -438,10 +563,23 @@ class _Connection:
         if isinstance(self._response, _FinishedResponse):
             return False
         if self._response is not None:
+            if not self._response.isclosed() and not self._drain_response(self._response):
+                # The body was not fully read (e.g. error responses), so the socket can't take another request.
+                self._max_uses = 0
             self._response.close()
         self._response = _FinishedResponse()
         return True
 
+    @staticmethod
+    def _drain_response(response: HTTPResponse) -> bool:
+        if response.length is None or response.length > _MAX_DRAIN_SIZE:
+            return False
+        try:
+            response.read()
+        except (HTTPException, OSError):
+            return False
+        return response.isclosed()
+
     def describe(self) -> str:
         return (
             f'[conn obj id={self._connection_queue.id[0]}://{self._connection_queue.id[1]}/{self.id}, '
@@ -465,7 +603,7 @@ class _FinishedResponse: pass
 
 
 class _ConnectionQueue:
-    def __init__(self, queue_id: _QueueId, read_timeout: float, connect_timeout: float, keep_alive_timeout: float, ctx: ssl.SSLContext, logger: Optional[HttpLogger], config: Optional[HttpConfig]) -> None:
+    def __init__(self, queue_id: _QueueId, read_timeout: float, connect_timeout: float, keep_alive_timeout: float, ctx: ssl.SSLContext, logger: Optional[HttpLogger], config: Optional[HttpConfig], dns_cache: Optional[DnsCache] = None, tls_sessions: Optional['TlsSessionCache'] = None) -> None:
         self.id = queue_id
         self._read_timeout = read_timeout
         self._connect_timeout = connect_timeout
@@ -473,12 +611,15 @@ class _ConnectionQueue:
         self._ctx = ctx
         self._logger = logger
         self._config = config
+        self._dns_cache = dns_cache
+        self._tls_sessions = tls_sessions
         self._queue: list[_Connection] = []
         self._queue_swap: list[_Connection] = []
         self._lock = threading.Lock()
         self._last_conn_id = -1
         self._queue_cleared = False
         self._all_connections: list[_Connection] = []  # Track all connections (idle and active)
+        self._prewarming = 0
 
     def pull(self) -> _Connection:
         with self._lock:
@@ -488,7 +629,47 @@ class _ConnectionQueue:
                 self._last_conn_id += 1
                 conn_id = self._last_conn_id
 
-        http_conn, use_absolute_form = create_http_connection(self.id[0], self.id[1], self._ctx, self._config, self._connect_timeout)
+        return self._create_connection(conn_id)
+
+    def reserve_prewarm(self, amount: int) -> int:
+        with self._lock:
+            if self._queue_cleared: return 0
+            missing = max(0, amount - len(self._queue) - self._prewarming)
+            self._prewarming += missing
+            return missing
+
+    def prewarm_one(self) -> None:
+        try:
+            with self._lock:
+                self._last_conn_id += 1
+                conn_id = self._last_conn_id
+
+            conn = self._create_connection(conn_id)
+            try:
+                conn.connect()
+            except Exception as e:
+                conn.kill()
+                if self._logger is not None: self._logger.debug(f'Prewarm of "{self.id[0]}://{self.id[1]}" connection {conn_id} failed: {type(e).__name__} {str(e)}')
+                return
+
+            with self._lock:
+                cleared = self._queue_cleared
+                if not cleared:
+                    self._queue.append(conn)
+            if cleared:
+                # clear_all ran while this connection was being established, so nobody else will close it.
+                conn.kill()
+        except Exception as e:
+            if self._logger is not None: self._logger.debug(e)
+        finally:
+            with self._lock:
+                self._prewarming -= 1
+
+    def _create_connection(self, conn_id: int) -> _Connection:
+        http_conn, use_absolute_form = create_http_connection(self.id[0], self.id[1], self._ctx, self._config, self._connect_timeout, self._tls_sessions)
+        if self._dns_cache is not None:
+            # http.client opens its sockets through this per-instance hook, which defaults to socket.create_connection.
+            http_conn._create_connection = self._dns_cache.create_connection  # type: ignore[attr-defined]
         conn = _Connection(conn_id=conn_id, http=http_conn, connection_queue=self, logger=self._logger, read_timeout=self._read_timeout, keep_alive_timeout=self._keep_alive_timeout, use_absolute_form=use_absolute_form)
         with self._lock:
             if self._queue_cleared:
@@ -528,28 +709,102 @@ class _ConnectionQueue:
             return expired_count
 
 
-def create_http_connection(scheme: str, netloc: str, ctx: ssl.SSLContext, config: Optional[HttpConfig], connect_timeout: float) -> tuple[HTTPConnection, bool]:
+def create_http_connection(scheme: str, netloc: str, ctx: ssl.SSLContext, config: Optional[HttpConfig], connect_timeout: float, tls_sessions: Optional['TlsSessionCache'] = None) -> tuple[HTTPConnection, bool]:
+    def https_connection(host: str, port: Optional[int] = None) -> HTTPSConnection:
+        if tls_sessions is None: return HTTPSConnection(host, port, timeout=connect_timeout, context=ctx)
+        return _ResumableHTTPSConnection(tls_sessions, host, port, timeout=connect_timeout, context=ctx)
+
     if scheme == 'http':
         if config and config['http_proxy']:
             proxy = config['http_proxy']
             if proxy['scheme'] == 'https':
-                return HTTPSConnection(proxy['hostname'], proxy['port'], timeout=connect_timeout, context=ctx), True
+                return https_connection(proxy['hostname'], proxy['port']), True
             return HTTPConnection(proxy['hostname'], proxy['port'], timeout=connect_timeout), True
         return HTTPConnection(netloc, timeout=connect_timeout), False
 
     elif scheme == 'https':
         if config and config['https_proxy']:
             proxy = config['https_proxy']
-            conn = HTTPSConnection(proxy['hostname'], proxy['port'], timeout=connect_timeout, context=ctx)
+            conn = https_connection(proxy['hostname'], proxy['port'])
             target_host, target_port = _split_host_port(netloc, 443)
             conn.set_tunnel(target_host, target_port, headers=config.get('https_proxy_headers'))
             return conn, False
-        return HTTPSConnection(netloc, timeout=connect_timeout, context=ctx), False
+        return https_connection(netloc), False
 
     else:
         raise HttpGatewayException(f"Scheme {scheme} not supported")
 
 
+class TlsSessionCache:
+    """Last TLS session seen for each server, so that reconnections can do an abbreviated handshake
+    instead of the full key exchange, which is particularly slow on the MiSTer CPU."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sessions: dict[tuple[str, int], ssl.SSLSession] = {}
+        self.handshakes = 0
+        self.resumed = 0
+
+    def get(self, server: tuple[str, int]) -> Optional[ssl.SSLSession]:
+        with self._lock:
+            return self._sessions.get(server, None)
+
+    def put(self, server: tuple[str, int], session: Optional[ssl.SSLSession]) -> None:
+        if session is None: return
+        with self._lock:
+            self._sessions[server] = session
+
+    def forget(self, server: tuple[str, int]) -> None:
+        with self._lock:
+            self._sessions.pop(server, None)
+
+    def count_handshake(self, resumed: bool) -> None:
+        with self._lock:
+            self.handshakes += 1
+            if resumed: self.resumed += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+
+class _ResumableHTTPSConnection(HTTPSConnection):
+    def __init__(self, tls_sessions: TlsSessionCache, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._tls_sessions = tls_sessions
+        self._tls_server: tuple[str, int] = (self.host, self.port)
+        self._tls_session_stored = False
+
+    def connect(self) -> None:
+        # Same as HTTPSConnection.connect, but offering the last session known for this server.
+        HTTPConnection.connect(self)
+        if self._tunnel_host:  # type: ignore[attr-defined]
+            self._tls_server = (self._tunnel_host, self._tunnel_port or 443)  # type: ignore[attr-defined]
+
+        session = self._tls_sessions.get(self._tls_server)
+        try:
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=self._tls_server[0], session=session)  # type: ignore[attr-defined]
+        except ssl.SSLError:
+            if session is None: raise
+            # The server might reject the session abruptly instead of falling back to a full handshake.
+            self._tls_sessions.forget(self._tls_server)
+            self.sock.close()
+            HTTPConnection.connect(self)
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=self._tls_server[0])  # type: ignore[attr-defined]
+
+        self._tls_sessions.count_handshake(self.sock.session_reused)
+        self._tls_session_stored = False
+
+    def getresponse(self) -> HTTPResponse:
+        sock = self.sock  # 'Connection: close' responses detach the socket from this object.
+        response = super().getresponse()
+        if not self._tls_session_stored and isinstance(sock, ssl.SSLSocket):
+            # TLS 1.3 tickets arrive after the handshake, so by now they have been read along with the response.
+            self._tls_session_stored = True
+            self._tls_sessions.put(self._tls_server, sock.session)
+        return response
+
+
 class _ResponseHeaders:
     def __init__(self, logger: Optional[HttpLogger]) -> None:
         self._logger = logger
@@ -0,0 +1,153 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from downloader.constants import HTTP_VALIDATORS_MAX_AGE, HTTP_VALIDATORS_TIME_REFRESH
+
+
+HTTP_VALIDATORS_STATE_VERSION = 1
+
+
+class HttpValidators:
+    """Remembers the cache validators (ETag, Last-Modified) and the MD5 of the metadata files downloaded
+    in previous runs, so that they can be requested conditionally later on. Entries are grouped by db_id."""
+
+    def __init__(self, time_wall: Callable[[], float] = time.time) -> None:
+        self._time_wall = time_wall
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._changed = False
+
+    def record(self, url: str, db_id: Optional[str], headers: Any, file_hash: str, file_size: int) -> None:
+        etag = headers.get('ETag', None)
+        last_modified = headers.get('Last-Modified', None)
+        if etag is None and last_modified is None:
+            return
+
+        now = self._time_wall()
+        entry: dict[str, Any] = {'db_id': db_id, 'hash': file_hash, 'size': file_size, 'time': now}
+        if etag is not None: entry['etag'] = etag
+        if last_modified is not None: entry['last_modified'] = last_modified
+        with self._lock:
+            previous = self._entries.get(url, None)
+            if previous is None or not _same_entry(previous, entry):
+                self._changed = True
+                self._entries[url] = entry
+            else:
+                self._refresh_time(previous, now)
+
+    def confirm(self, url: str) -> None:
+        """The server replied 304 Not Modified: the stored entry is still valid."""
+        with self._lock:
+            entry = self._entries.get(url, None)
+            if entry is not None:
+                self._refresh_time(entry, self._time_wall())
+
+    def set_default_filter(self, url: str, default_filter: Optional[str]) -> None:
+        """Remembers the default filter of the database served at url, so that it can be checked later without opening it."""
+        with self._lock:
+            entry = self._entries.get(url, None)
+            if entry is not None and ('default_filter' not in entry or entry['default_filter'] != default_filter):
+                entry['default_filter'] = default_filter
+                self._changed = True
+
+    def matches(self, url: str, headers: Any) -> bool:
+        """Whether the headers of a full response describe the same file that was stored."""
+        with self._lock:
+            entry = self._entries.get(url, None)
+        if entry is None:
+            return False
+
+        etag = headers.get('ETag', None)
+        if etag is not None and 'etag' in entry:
+            return etag == entry['etag']
+
+        last_modified = headers.get('Last-Modified', None)
+        content_length = headers.get('Content-Length', None)
+        return last_modified is not None and last_modified == entry.get('last_modified', None) \
+            and content_length is not None and content_length == str(entry.get('size', None))
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        with self._lock:
+            entry = self._entries.get(url, None)
+        return {} if entry is None else _conditional_headers(entry)
+
+    def entry(self, url: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(url, None)
+            return None if entry is None else entry.copy()
+
+    def db_urls(self, db_id: str) -> list[str]:
+        with self._lock:
+            return [url for url, entry in self._entries.items() if entry.get('db_id', None) == db_id]
+
+    def state(self) -> dict[str, Any]:
+        oldest = self._time_wall() - HTTP_VALIDATORS_MAX_AGE
+        with self._lock:
+            return {'version': HTTP_VALIDATORS_STATE_VERSION, 'urls': {url: entry.copy() for url, entry in self._entries.items() if entry['time'] >= oldest}}
+
+    def needs_save(self) -> bool:
+        """Whether state() differs from what was loaded or last saved."""
+        oldest = self._time_wall() - HTTP_VALIDATORS_MAX_AGE
+        with self._lock:
+            return self._changed or any(entry['time'] < oldest for entry in self._entries.values())
+
+    def mark_saved(self) -> None:
+        oldest = self._time_wall() - HTTP_VALIDATORS_MAX_AGE
+        with self._lock:
+            self._entries = {url: entry for url, entry in self._entries.items() if entry['time'] >= oldest}
+            self._changed = False
+
+    def _refresh_time(self, entry: dict[str, Any], now: float) -> None:
+        # Times are only used to expire old entries, so refreshing them once a day is enough and saves writing the file on every run.
+        if now - entry['time'] >= HTTP_VALIDATORS_TIME_REFRESH:
+            entry['time'] = now
+            self._changed = True
+
+    def load_state(self, state: dict[str, Any]) -> int:
+        if not isinstance(state, dict) or state.get('version', None) != HTTP_VALIDATORS_STATE_VERSION:
+            return 0
+
+        urls = state.get('urls', None)
+        if not isinstance(urls, dict):
+            return 0
+
+        loaded = 0
+        with self._lock:
+            for url, entry in urls.items():
+                if not isinstance(url, str) or not isinstance(entry, dict) or not isinstance(entry.get('hash', None), str) or not isinstance(entry.get('time', None), (int, float)):
+                    continue
+                if url in self._entries:
+                    continue
+                self._entries[url] = entry
+                loaded += 1
+        return loaded
+
+
+def _same_entry(a: dict[str, Any], b: dict[str, Any]) -> bool:
+    return all(a.get(key, None) == b.get(key, None) for key in ('db_id', 'hash', 'size', 'etag', 'last_modified'))
+
+
+def _conditional_headers(entry: dict[str, Any]) -> dict[str, str]:
+    headers = {}
+    if 'etag' in entry: headers['If-None-Match'] = entry['etag']
+    if 'last_modified' in entry: headers['If-Modified-Since'] = entry['last_modified']
+    return headers
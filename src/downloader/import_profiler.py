@@ -0,0 +1,94 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import builtins
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional, Protocol
+
+
+class ImportProfileLogger(Protocol):
+    def print(self, *args: Any, sep: str='', end: str='\n', flush: bool=True) -> None: ...
+
+
+class ImportProfiler:
+    """Measures the cost of each first-time import by wrapping builtins.__import__.
+    Cumulative time includes the nested imports, self time doesn't."""
+
+    def __init__(self, start_time: float, time_monotonic: Callable[[], float] = time.monotonic) -> None:
+        self._start_time = start_time
+        self._time_monotonic = time_monotonic
+        self._original_import: Optional[Callable[..., Any]] = None
+        self._local = threading.local()  # each thread keeps its own stack of nested imports
+        self._records: list[tuple[str, float, float, float]] = []  # name, started at, cumulative, self
+
+    def install(self) -> None:
+        if self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self) -> None:
+        if self._original_import is None:
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+
+    def _import(self, name: str, globals: Any = None, locals: Any = None, fromlist: Any = (), level: int = 0) -> Any:
+        original_import = self._original_import
+        assert original_import is not None
+        if level != 0 or name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+
+        stack: Optional[list[float]] = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        start = self._time_monotonic()
+        stack.append(0.0)
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = self._time_monotonic() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            self._records.append((name, start - self._start_time, cumulative, cumulative - nested))
+
+    def report(self, logger: ImportProfileLogger, top: int = 30) -> None:
+        records = list(self._records)
+        logger.print(f'Import profile: {len(records)} modules imported.')
+        logger.print(f'{"at ms":>8} {"cumul ms":>9} {"self ms":>8}  module')
+        for name, at, cumulative, self_time in sorted(records, key=lambda record: record[2], reverse=True)[:top]:
+            logger.print(f'{at * 1000:8.1f} {cumulative * 1000:9.1f} {self_time * 1000:8.1f}  {name}')
+        logger.print(f'Total import time: {sum(self_time for _name, _at, _cumulative, self_time in records) * 1000:.1f} ms')
+
+
+_profiler: Optional[ImportProfiler] = None
+
+
+def install_import_profiler(start_time: float) -> None:
+    global _profiler
+    if _profiler is None:
+        _profiler = ImportProfiler(start_time)
+        _profiler.install()
+
+
+def import_profiler() -> Optional[ImportProfiler]:
+    return _profiler
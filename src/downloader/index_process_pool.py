@@ -0,0 +1,94 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+from downloader.logger import Logger
+from downloader.metrics import metrics
+
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+T = TypeVar('T')
+
+
+class IndexProcessPool:
+    """Optional process pool for the pure CPU stages of index processing, so they can run outside the GIL.
+    Functions and arguments must be picklable. Any pool failure falls back to running in the calling thread."""
+
+    def __init__(self, processes: int, logger: Logger) -> None:
+        self._processes = processes
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._executor: Optional['ProcessPoolExecutor'] = None
+        self._broken = False
+
+    def enabled(self) -> bool:
+        return self._processes > 0 and not self._broken
+
+    def start(self) -> None:
+        # Spawning interpreters is slow on the MiSTer, so we warm them up while the dbs are being downloaded.
+        executor = self._executor_or_none()
+        if executor is None:
+            return
+        for _ in range(self._processes):
+            executor.submit(_warm_up)
+
+    def run(self, fn: Callable[..., T], *args: Any) -> T:
+        executor = self._executor_or_none()
+        if executor is None:
+            return fn(*args)
+
+        try:
+            with metrics().span('index_process_pool.' + fn.__name__):
+                return executor.submit(fn, *args).result()
+        except Exception as e:
+            self._logger.debug('IndexProcessPool failed, falling back to threads: ', e)
+            with self._lock:
+                self._broken = True
+            return fn(*args)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _executor_or_none(self) -> Optional['ProcessPoolExecutor']:
+        if not self.enabled():
+            return None
+
+        with self._lock:
+            if self._executor is None and not self._broken:
+                try:
+                    # Imported here because multiprocessing is expensive to load and the pool is disabled by default.
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    # Forking a process that already runs threads is unsafe, so the workers start from a clean interpreter.
+                    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._executor = ProcessPoolExecutor(max_workers=self._processes, mp_context=multiprocessing.get_context(start_method))
+                    self._logger.debug('IndexProcessPool started with ', self._processes, ' processes (', start_method, ').')
+                except Exception as e:
+                    self._logger.debug('IndexProcessPool could not start: ', e)
+                    self._broken = True
+            return self._executor
+
+
+def _warm_up() -> None:
+    import downloader.file_filter  # noqa: F401
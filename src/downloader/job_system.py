@@ -31,6 +31,8 @@ import queue
 import threading
 import signal
 
+from downloader.metrics import metrics
+
 
 class JobContext(Protocol):
     """A context for workers to interact with the job system in a thread-safe manner."""
@@ -58,12 +60,13 @@ class JobSystem(JobContext):
         JobSystem._next_job_type_id += 1
         return JobSystem._next_job_type_id
 
-    def __init__(self, reporter: 'ProgressReporter', logger: 'JobSystemLogger', activity_tracker: Optional['ActivityTracker'] = None, time_monotonic: Callable[[], float] = time.monotonic, max_threads: int = 6, max_tries: int = 3, wait_time: float = 0.25, max_cycle: int = 3, max_timeout: float = 300, fail_policy: JobFailPolicy = JobFailPolicy.FAULT_TOLERANT) -> None:
+    def __init__(self, reporter: 'ProgressReporter', logger: 'JobSystemLogger', activity_tracker: Optional['ActivityTracker'] = None, time_monotonic: Callable[[], float] = time.monotonic, max_threads: int = 6, max_tries: int = 3, wait_time: float = 0.25, max_cycle: int = 3, max_timeout: float = 300, fail_policy: JobFailPolicy = JobFailPolicy.FAULT_TOLERANT, threads_tuner: Optional['ThreadsTuner'] = None) -> None:
         self._reporter: ProgressReporter = reporter
         self._logger: JobSystemLogger = logger
         self._activity_tracker: ActivityTracker = activity_tracker if activity_tracker is not None else ActivityTracker()
         self._time_monotonic = time_monotonic
         self._max_threads: int = max_threads
+        self._threads_tuner: Optional[ThreadsTuner] = threads_tuner
         self._max_tries: int = max_tries
         self._wait_time: float = wait_time
         self._max_cycle: int = max_cycle
@@ -77,6 +80,7 @@ class JobSystem(JobContext):
         self._workers: dict[int, Worker] = {}
         self._lock = threading.Lock()
         self._pending_jobs_amount: int = 0
+        self._waiting_jobs_amount: int = 0
         self._are_jobs_cancelled: bool = False
         self._is_executing_jobs: bool = False
         self._timeout_clock: float = 0
@@ -130,6 +134,9 @@ class JobSystem(JobContext):
             else:
                 self._execute_without_threads()
 
+            if self._threads_tuner is not None:
+                self._threads_tuner.report()
+
             self._handle_notifications(False)
             self._jobs_cancelled.extend([p.job for p in self._pending_packages()])
             self._clear_job_queues()
@@ -155,7 +162,13 @@ class JobSystem(JobContext):
         if not self._is_executing_jobs: raise CantWaitWhenNotExecutingJobs('Can not wait when not executing jobs')
 
         if self._max_threads > 1:
-            time.sleep(sleep_time)
+            with self._lock:
+                self._waiting_jobs_amount += 1
+            try:
+                time.sleep(sleep_time)
+            finally:
+                with self._lock:
+                    self._waiting_jobs_amount -= 1
         else:
             # This branch does not need to be thread-safe at all, since concurrency is off.
             self._check_clock()
@@ -182,6 +195,11 @@ class JobSystem(JobContext):
             futures: list[tuple['_JobPackage', Future[None]]] = []
             max_futures = max_threads
             while (self._pending_jobs_amount > 0 or futures) and self._are_jobs_cancelled is False:
+                if self._threads_tuner is not None:
+                    # The executor is sized for the upper bound, the tuner only decides how many of its threads are busy.
+                    # Jobs waiting for other jobs don't count, otherwise they could take every slot from the jobs they wait for.
+                    max_futures = min(max_threads, self._threads_tuner.active_threads(self._time_monotonic(), self._has_queued_packages()) + self._waiting_jobs_amount)
+
                 while self._has_queued_packages() and (len(futures) < max_futures):
                     package = self._pop_package()
                     if package is None: break
@@ -192,6 +210,7 @@ class JobSystem(JobContext):
 
                 self._handle_notifications(True)
                 futures = self._remove_done_futures(futures)
+                self._record_queue_metrics(len(futures))
                 self._record_work_in_progress()
                 self._check_clock()
                 sys.stdout.flush()
@@ -230,7 +249,8 @@ class JobSystem(JobContext):
         job, worker = package.job, package.worker
         notifications.put((_JobState.JOB_STARTED, package, None))
 
-        jobs, error = worker.operate_on(job)
+        with metrics().span('job.' + job.__class__.__name__):
+            jobs, error = worker.operate_on(job)
 
         if error is not None:
             notifications.put((_JobState.NIL, package, error))
@@ -490,6 +510,11 @@ class JobSystem(JobContext):
         self._update_timeout_clock()
         self._try_report('report-cancelled', self._reporter.notify_jobs_cancelled, jobs)
 
+    def _record_queue_metrics(self, running_jobs: int) -> None:
+        registry = metrics()
+        registry.gauge('job_system.pending_jobs', self._pending_jobs_amount)
+        registry.gauge('job_system.running_jobs', running_jobs)
+
     def _record_work_in_progress(self) -> None: self._try_report('in-progress', self._reporter.notify_work_in_progress)
 
     def _try_report(self, context: str, method: Callable, *args) -> None:
@@ -579,26 +604,46 @@ class CantWaitWhenNotExecutingJobs(JobSystemAbortException): pass
 class CantWaitWhenTimedOut(JobSystemAbortException): pass
 class CycleDetectedException(JobSystemAbortException): pass
 
+class ThreadsTuner(Protocol):
+    """Decides how many jobs may run at the same time. Only called from the main thread."""
+
+    def active_threads(self, now: float, has_queued_jobs: bool) -> int:
+        """Called before filling the threads on each loop. Returns the amount of jobs that can be running concurrently."""
+
+    def report(self) -> None:
+        """Called when all the jobs are done."""
+
+
 class JobSystemLogger(Protocol):
     def print(self, *args, sep: str='', end: str='\n', file=sys.stdout, flush: bool=True) -> None: """Prints a message to the logger."""
     def debug(self, *args, sep: str='', end: str='\n', flush: bool=True) -> None: """Prints a debug message to the logger."""
 
 
 class ActivityTracker:
-    """Tracks worker activity to prevent false pipeline timeouts during long-running jobs."""
+    """Tracks worker activity to prevent false pipeline timeouts during long-running jobs.
+    It also accumulates the transferred bytes, so that throughput can be measured."""
 
     def __init__(self) -> None:
         self._last_progress_time: Optional[float] = None
+        self._transferred_bytes: int = 0
+        self._bytes_lock = threading.Lock()
 
-    def track(self, progress_time: float) -> 'ActivityTracker':
+    def track(self, progress_time: float, transferred_bytes: int = 0) -> 'ActivityTracker':
         if self._last_progress_time is None or progress_time > self._last_progress_time:
             self._last_progress_time = progress_time
+        if transferred_bytes > 0:
+            with self._bytes_lock:
+                self._transferred_bytes += transferred_bytes
         return self
 
     @property
     def last_progress_time(self) -> Optional[float]:
         return self._last_progress_time
 
+    @property
+    def transferred_bytes(self) -> int:
+        return self._transferred_bytes
+
 
 @dataclass(eq=False, order=False)
 class _JobPackage:
@@ -0,0 +1,97 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+from typing import Any
+
+from downloader.config import Config
+from downloader.db_utils import build_db_config_with_default_filter, can_skip_db_with_external_store_fingerprints
+from downloader.http_gateway import HttpGateway
+from downloader.http_validators import HttpValidators
+from downloader.job_system import JobContext, ProgressReporter, WorkerResult
+from downloader.jobs.check_db_validators_job import CheckDbValidatorsJob
+from downloader.jobs.load_local_store_fingerprints_job import local_store_fingerprints_tag
+from downloader.jobs.reporters import InstallationReport
+from downloader.jobs.worker_context import DownloaderWorker
+from downloader.logger import Logger
+
+
+class CheckDbValidatorsWorker(DownloaderWorker):
+    """Online check without downloading the database: a conditional HEAD request tells whether the database
+    is the same one seen in a previous run. If that one was installed with the same filter, it's up to date.
+    Otherwise the full check (download, open and compare with the store) takes place."""
+
+    def __init__(self, http_gateway: HttpGateway, http_validators: HttpValidators, logger: Logger, installation_report: InstallationReport, worker_context: JobContext, progress_reporter: ProgressReporter, config: Config) -> None:
+        self._http_gateway = http_gateway
+        self._http_validators = http_validators
+        self._logger = logger
+        self._installation_report = installation_report
+        self._worker_context = worker_context
+        self._progress_reporter = progress_reporter
+        self._config = config
+
+    def job_type_id(self) -> int: return CheckDbValidatorsJob.type_id
+    def reporter(self): return self._progress_reporter
+
+    def operate_on(self, job: CheckDbValidatorsJob) -> WorkerResult:  # type: ignore[override]
+        self._logger.bench('CheckDbValidatorsWorker start: ', job.section)
+        if self._is_up_to_date(job):
+            self._logger.debug('Online check: database not modified according to HTTP validators: ', job.section)
+            job.up_to_date = True
+            return [], None
+
+        self._logger.bench('CheckDbValidatorsWorker falling back to full check: ', job.section)
+        return [job.fallback_job], None
+
+    def _is_up_to_date(self, job: CheckDbValidatorsJob) -> bool:
+        db_url = job.ini_description['db_url']
+        entry = self._http_validators.entry(db_url)
+        if entry is None or not has_check_validators(entry):
+            return False
+
+        try:
+            with self._http_gateway.open(db_url, method='HEAD', headers=self._http_validators.conditional_headers(db_url)) as (_final_url, in_stream):
+                if in_stream.status != 304 and not (in_stream.status == 200 and self._http_validators.matches(db_url, in_stream.headers)):
+                    return False
+        except Exception as e:
+            self._logger.debug('CheckDbValidatorsWorker could not check: ', db_url, ' ', e)
+            return False
+
+        # HEAD requests are quick, the fingerprints job might not have even started yet.
+        while not self._store_fingerprints_finished():
+            self._logger.bench('CheckDbValidatorsWorker waiting for store fingerprints: ', job.section)
+            self._worker_context.wait_for_other_jobs(0.06)
+
+        fingerprints = job.load_local_store_fingerprints_job.local_store_fingerprints
+        figp = None if fingerprints is None else fingerprints.get(job.section, None)
+        if figp is None:
+            return False
+
+        config = build_db_config_with_default_filter(self._config, entry['default_filter'], job.ini_description)
+        available_external_fingerprints = job.load_local_store_fingerprints_job.available_external_store_fingerprints.get(job.section, [])
+        return can_skip_db_with_external_store_fingerprints(
+            config['file_checking'], figp, entry['hash'], entry['size'], config['filter'], available_external_fingerprints
+        )
+
+    def _store_fingerprints_finished(self) -> bool:
+        return len(self._installation_report.get_jobs_completed_by_tag(local_store_fingerprints_tag)) > 0 \
+            or len(self._installation_report.get_jobs_failed_by_tag(local_store_fingerprints_tag)) > 0
+
+
+def has_check_validators(entry: dict[str, Any]) -> bool:
+    return 'hash' in entry and 'size' in entry and 'default_filter' in entry and ('etag' in entry or 'last_modified' in entry)
+
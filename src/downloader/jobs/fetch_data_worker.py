@@ -18,43 +18,73 @@
 
 import io
 import socket
+import time
 from http.client import HTTPException
 from urllib.error import URLError
 
+from downloader.bandwidth_limiter import BandwidthLimiter
+from downloader.constants import MIRROR_FAILOVER_HTTP_RETRIES
 from downloader.file_system import FileSystem
 from downloader.http_gateway import HttpGateway
 from downloader.job_system import WorkerResult, ProgressReporter
 from downloader.jobs.fetch_data_job import FetchDataJob
 from downloader.jobs.worker_context import DownloaderWorker, FailCtx
 from downloader.jobs.errors import FileDownloadError, FileValidationError
+from downloader.mirrors import MirrorSelector
+from downloader.http_validators import HttpValidators
+from downloader.zip_summary_prefetcher import ZipSummaryPrefetcher
 from typing import Optional, Any
 
 
 class FetchDataWorker(DownloaderWorker):
-    def __init__(self, http_gateway: HttpGateway, file_system: FileSystem, progress_reporter: ProgressReporter, fail_ctx: FailCtx, timeout: int) -> None:
+    def __init__(self, http_gateway: HttpGateway, file_system: FileSystem, progress_reporter: ProgressReporter, fail_ctx: FailCtx, timeout: int, bandwidth_limiter: Optional[BandwidthLimiter] = None, mirror_selector: Optional[MirrorSelector] = None, http_validators: Optional[HttpValidators] = None, zip_summary_prefetcher: Optional[ZipSummaryPrefetcher] = None) -> None:
         self._http_gateway = http_gateway
         self._file_system = file_system
         self._progress_reporter = progress_reporter
         self._fail_ctx = fail_ctx
         self._timeout = timeout
+        self._bandwidth_limiter = bandwidth_limiter
+        self._mirror_selector = mirror_selector
+        self._http_validators = http_validators
+        self._zip_summary_prefetcher = zip_summary_prefetcher
 
     def job_type_id(self) -> int: return FetchDataJob.type_id
     def reporter(self): return self._progress_reporter
 
     def operate_on(self, job: FetchDataJob) -> WorkerResult:  # type: ignore[override]
-        job.data, error = self._fetch_data(job.source, job.description.get('hash', None), job.description.get('size', None), job.calcs)
+        valid_hash = job.description.get('hash', None)
+        if self._zip_summary_prefetcher is not None and valid_hash is not None:
+            job.data = self._zip_summary_prefetcher.take(job.source, valid_hash)
+            if job.data is not None:
+                return [] if job.after_job is None else [job.after_job], None
+
+        candidates = [(job.source, None)] if self._mirror_selector is None else self._mirror_selector.candidates(job.source)
+        max_retries = 10 if len(candidates) == 1 else MIRROR_FAILOVER_HTTP_RETRIES
+        error: Optional[Exception] = None
+        for url, mirror in candidates:
+            start = time.monotonic()
+            job.data, error = self._fetch_data(url, valid_hash, job.description.get('size', None), job.calcs, job.db_id, job.priority, max_retries, job.source if job.priority and mirror is None else None)
+            if error is None and job.data is not None:
+                if self._mirror_selector is not None: self._mirror_selector.report_success(mirror, job.data.getbuffer().nbytes, time.monotonic() - start)
+                break
+
+            if self._mirror_selector is not None: self._mirror_selector.report_failure(mirror)
+
         if error is not None:
             self._fail_ctx.swallow_error(error)
             return [], error
 
         return [] if job.after_job is None else [job.after_job], None
 
-    def _fetch_data(self, url: str, valid_hash: Optional[str], valid_size: Optional[int], calcs: Optional[dict[str, Any]], /) -> tuple[Optional[io.BytesIO], Optional[Exception]]:
+    def _fetch_data(self, url: str, valid_hash: Optional[str], valid_size: Optional[int], calcs: Optional[dict[str, Any]], db_id: Optional[str], priority: bool, max_retries: int, validators_url: Optional[str], /) -> tuple[Optional[io.BytesIO], Optional[Exception]]:
         try:
-            with self._http_gateway.open(url) as (final_url, in_stream):
+            with self._http_gateway.open(url, max_retries=max_retries) as (final_url, in_stream):
                 if in_stream.status != 200:
                     return None, FileDownloadError(f'Bad http status! {final_url}: {in_stream.status}')
 
+                if self._bandwidth_limiter is not None:
+                    in_stream = self._bandwidth_limiter.throttled(in_stream, db_id, priority or self._bandwidth_limiter.is_priority(valid_size))
+
                 return_calc_hash = valid_hash is not None or calcs is not None
                 buf, calc_hash = self._file_system.write_stream_to_data(in_stream, return_calc_hash, self._timeout)
                 calc_size = buf.getbuffer().nbytes
@@ -67,6 +97,8 @@ class FetchDataWorker(DownloaderWorker):
                 if calcs is not None:
                     calcs['hash'] = calc_hash
                     calcs['size'] = calc_size
+                if validators_url is not None and self._http_validators is not None and calc_hash:
+                    self._http_validators.record(validators_url, db_id, in_stream.headers, calc_hash, calc_size)
 
                 return buf, None
 
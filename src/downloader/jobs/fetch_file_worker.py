@@ -16,74 +16,104 @@
 # You can download the latest version of this tool from:
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
-from downloader.constants import SafeFetchInfo, HASH_file_does_not_exist
+from downloader.bandwidth_limiter import BandwidthLimiter
+from downloader.constants import SafeFetchInfo, HASH_file_does_not_exist, MIRROR_FAILOVER_HTTP_RETRIES, SAFE_FETCH_RETRY_WAIT
 from downloader.file_system import FileSystem
 from downloader.http_gateway import HttpGateway
 from downloader.job_system import WorkerResult, ProgressReporter
 from downloader.jobs.fetch_file_job import FetchFileJob
 from downloader.jobs.errors import GetFileError, FileDownloadError, FileValidationError
 from downloader.jobs.file_install import finalize_file_install, prepare_file_install
+import hashlib
 import socket
+import time
 from urllib.error import URLError
 from http.client import HTTPException
-from typing import Optional, TypedDict
+from typing import Any, Optional, TypedDict
 
 from downloader.jobs.worker_context import DownloaderWorker
 from downloader.logger import Logger
+from downloader.metrics import metrics
+from downloader.mirrors import MirrorSelector
 from downloader.waiter import Waiter
 
 
 class FetchFileWorker(DownloaderWorker):
-    def __init__(self, logger: Logger, progress_reporter: ProgressReporter, http_gateway: HttpGateway, file_system: FileSystem, timeout: int) -> None:
+    def __init__(self, logger: Logger, progress_reporter: ProgressReporter, http_gateway: HttpGateway, file_system: FileSystem, timeout: int, bandwidth_limiter: Optional[BandwidthLimiter] = None, mirror_selector: Optional[MirrorSelector] = None) -> None:
         self._logger = logger
         self._progress_reporter = progress_reporter
         self._file_system = file_system
-        self._fetcher = FileFetcher(http_gateway=http_gateway, file_system=file_system, timeout=timeout)
+        self._bandwidth_limiter = bandwidth_limiter
+        self._mirror_selector = mirror_selector
+        self._fetcher = FileFetcher(http_gateway=http_gateway, file_system=file_system, timeout=timeout, bandwidth_limiter=bandwidth_limiter)
 
     def job_type_id(self) -> int: return FetchFileJob.type_id
     def reporter(self): return self._progress_reporter
 
     def operate_on(self, job: FetchFileJob) -> WorkerResult:  # type: ignore[override]
-        source = job.source
-        target_path = job.pkg.full_path
-        desc = job.pkg.description
-
         file_path, temp_path, backup_path = prepare_file_install(self._file_system, job.pkg, job.already_exists)
-        _file_size, error = self._fetcher.fetch_file(source, file_path, fsync=temp_path is not None)
-        if error is not None:
-            return [], error
 
-        file_hash = self._file_system.hash(file_path)
-        if file_hash == HASH_file_does_not_exist:
-            return [], FileDownloadError(f'File {file_path} could not be fetched.')
+        candidates = [(job.source, None)] if self._mirror_selector is None else self._mirror_selector.candidates(job.source)
+        max_retries = 10 if len(candidates) == 1 else MIRROR_FAILOVER_HTTP_RETRIES
+        error: Optional[Exception] = None
+        for url, mirror in candidates:
+            start = time.monotonic()
+            error = self._fetch_and_validate(job, url, file_path, fsync=temp_path is not None, max_retries=max_retries)
+            if error is None:
+                if self._mirror_selector is not None: self._mirror_selector.report_success(mirror, job.pkg.description['size'], time.monotonic() - start)
+                break
 
-        try:
-            if file_hash != desc['hash']:
-                err = self._file_system.unlink(file_path, verbose=False)
-                if err is not None:
-                    self._logger.debug('WARNING: FetchFileWorker could not remove file_path ', file_path, err)
-                return [], FileValidationError(f"Bad hash on {job.pkg.rel_path} ({desc['hash']} != {file_hash})")
+            if self._mirror_selector is not None: self._mirror_selector.report_failure(mirror)
+            if mirror is not None: self._logger.debug(f'Mirror failed for {job.pkg.rel_path}: {url}', error)
 
-            finalize_file_install(self._file_system, file_path, target_path, backup_path)
+        if error is not None:
+            return [], error
 
+        try:
+            finalize_file_install(self._file_system, file_path, job.pkg.full_path, backup_path)
         except Exception as e:
             return [], FileDownloadError(f'Exception during validation! {job.pkg.rel_path}: {str(e)}')
 
         return [] if job.after_job is None else [job.after_job], None
 
+    def _fetch_and_validate(self, job: FetchFileJob, url: str, file_path: str, fsync: bool, max_retries: int) -> Optional[Exception]:
+        desc = job.pkg.description
+        priority = self._bandwidth_limiter is None or self._bandwidth_limiter.is_priority(desc.get('size', None))
+        _file_size, error = self._fetcher.fetch_file(url, file_path, fsync=fsync, db_id=job.db_id, priority=priority, max_retries=max_retries)
+        if error is not None:
+            return error
+
+        file_hash = self._file_system.hash(file_path)
+        if file_hash == HASH_file_does_not_exist:
+            return FileDownloadError(f'File {file_path} could not be fetched.')
+
+        if file_hash != desc['hash']:
+            err = self._file_system.unlink(file_path, verbose=False)
+            if err is not None:
+                self._logger.debug('WARNING: FetchFileWorker could not remove file_path ', file_path, err)
+            return FileValidationError(f"Bad hash on {job.pkg.rel_path} ({desc['hash']} != {file_hash})")
+
+        return None
+
 
 class FileFetcher:
-    def __init__(self, http_gateway: HttpGateway, file_system: FileSystem, timeout: int) -> None:
+    def __init__(self, http_gateway: HttpGateway, file_system: FileSystem, timeout: int, bandwidth_limiter: Optional[BandwidthLimiter] = None) -> None:
         self._http_gateway = http_gateway
         self._file_system = file_system
         self._timeout = timeout
+        self._bandwidth_limiter = bandwidth_limiter
 
-    def fetch_file(self, url: str, download_path: str, fsync: bool = True) -> tuple[int, Optional[GetFileError]]:
+    def fetch_file(self, url: str, download_path: str, fsync: bool = True, db_id: Optional[str] = None, priority: bool = True, max_retries: int = 10, md5: Optional[Any] = None) -> tuple[int, Optional[GetFileError]]:
+        start = time.monotonic()
         try:
-            with self._http_gateway.open(url) as (final_url, in_stream):
+            with self._http_gateway.open(url, max_retries=max_retries) as (final_url, in_stream):
                 if in_stream.status != 200:
                     return 0, FileDownloadError(f'Bad http status! {final_url}: {in_stream.status}')
 
+                if self._bandwidth_limiter is not None:
+                    in_stream = self._bandwidth_limiter.throttled(in_stream, db_id, priority)
+                if md5 is not None:
+                    in_stream = _HashingStream(in_stream, md5)
                 file_size = self._file_system.write_incoming_stream(in_stream, download_path, self._timeout, fsync=fsync)
 
         except socket.gaierror as e: return 0, FileDownloadError(f'Socket Address Error! {url}: {str(e)}', e)
@@ -94,9 +124,27 @@ class FileFetcher:
         except OSError as e: return 0, FileDownloadError(f'OS Error! {url}: {e.errno} {str(e)}', e)
         except BaseException as e: return 0, FileDownloadError(f'Exception during download! {url}: {str(e)}')
 
+        registry = metrics()
+        registry.observe('fetch.file_seconds', time.monotonic() - start)
+        registry.count('fetch.files')
+        registry.count('fetch.bytes', file_size)
         return file_size, None
 
 
+class _HashingStream:
+    def __init__(self, in_stream: Any, md5: Any) -> None:
+        self._in_stream = in_stream
+        self._md5 = md5
+
+    def read(self, amount: int = -1) -> bytes:
+        chunk = self._in_stream.read(amount)
+        self._md5.update(chunk)
+        return chunk
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._in_stream, name)
+
+
 class SafeFetcherConfig(TypedDict):
     downloader_timeout: int
     downloader_retries: int
@@ -112,18 +160,19 @@ class SafeFileFetcher:
     def fetch_file(self, description: SafeFetchInfo, path: str) -> Optional[Exception]:
         i = self._retries
         while True:
-            _file_size, error = self._fetcher.fetch_file(description['url'], path)
+            # Hashing while downloading saves reading the whole file again, which is slow on SD cards.
+            md5 = hashlib.md5()
+            file_size, error = self._fetcher.fetch_file(description['url'], path, md5=md5)
             if error is None:
                 if not self._file_system.is_file(path, use_cache=False):
                     error = FileDownloadError(f'File from {description["url"]} could not be stored.')
 
             if error is None:
-                file_hash = self._file_system.hash(path)
+                file_hash = md5.hexdigest()
                 if file_hash != description['hash']:
                     error = FileValidationError(f'Hash mismatch! {description["url"]}: calculated hash {file_hash} != {description["hash"]}')
 
             if error is None:
-                file_size = self._file_system.size(path)
                 if file_size != description['size']:
                     error = FileValidationError(f'Size mismatch! {description["url"]}: calculated size {file_size} != {description["size"]}')
 
@@ -131,6 +180,6 @@ class SafeFileFetcher:
             if error is None or i <= 0:
                 break
             self._logger.print(f'Retrying {description["url"]}...')
-            self._waiter.sleep(10)
+            self._waiter.sleep(SAFE_FETCH_RETRY_WAIT)
 
         return error
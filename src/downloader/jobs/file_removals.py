@@ -0,0 +1,115 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import os
+import threading
+from typing import Optional
+
+from downloader.config import AllowDelete, Config
+from downloader.constants import FILE_PROP_ENTANGLEMENTS, REMOVAL_JOBS_PER_DRIVE, REMOVAL_MIN_FILES_PER_JOB
+from downloader.job_system import Job
+from downloader.jobs.load_local_store_job import LoadLocalStoreJob
+from downloader.jobs.remove_files_job import RemoveFilesJob, FileRemoval
+from downloader.jobs.reporters import InstallationReportImpl
+from downloader.local_store_wrapper import ReadOnlyStoreAdapter
+from downloader.path_package import PathPackage
+
+# (dbs, full path, tangles, size, drive, rel path)
+FileUnlink = tuple[list[str], str, list[str], int, str, str]
+
+
+class StoreClaims:
+    """Which database stores claim each file, lowered, following the case-sensitivity policy of the
+    claim backstop. Built the first time a removal is planned while the databases are being processed."""
+
+    _SEVERAL: str = ''
+
+    def __init__(self, installation_report: InstallationReportImpl) -> None:
+        self._installation_report = installation_report
+        self._claims: Optional[dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def claimed_by_others(self, db_id: str, lowered_paths: list[str]) -> Optional[set[str]]:
+        """Returns None when the stores are not available, so nothing should be removed yet."""
+        claims = self._load()
+        if claims is None:
+            return None
+        return {lowered for lowered in lowered_paths if lowered in claims and claims[lowered] != db_id}
+
+    def _load(self) -> Optional[dict[str, str]]:
+        with self._lock:
+            if self._claims is None:
+                load_local_store_jobs = self._installation_report.get_completed_jobs(LoadLocalStoreJob)
+                local_store = load_local_store_jobs[0].local_store if len(load_local_store_jobs) > 0 else None
+                if local_store is None:
+                    return None
+
+                claims: dict[str, str] = {}
+                for db_id in list(local_store.db_ids()):
+                    for lowered in local_store.store_by_id(db_id).read_only().lowered_paths('files'):
+                        claims[lowered] = db_id if claims.get(lowered, db_id) == db_id else StoreClaims._SEVERAL
+                self._claims = claims
+
+            return self._claims
+
+
+def make_remove_files_jobs_while_processing(store_claims: StoreClaims, db_id: str, config: Config, files_to_remove: list[PathPackage], store: ReadOnlyStoreAdapter) -> list[Job]:
+    """Removals that don't depend on how the downloads end, so they can run alongside them. Entangled files
+    and paths claimed by other stores are left for the end of the run, when all the databases are known."""
+    if len(files_to_remove) == 0 or config['allow_delete'] == AllowDelete.NONE:
+        return []
+
+    candidates = [pkg for pkg in files_to_remove if len(pkg.description.get(FILE_PROP_ENTANGLEMENTS, [])) == 0]
+    if len(candidates) == 0:
+        return []
+
+    vetoed = store_claims.claimed_by_others(db_id, [pkg.rel_path.lower() for pkg in candidates])
+    if vetoed is None:
+        return []
+
+    unlink_list: list[FileUnlink] = []
+    for pkg in candidates:
+        if pkg.rel_path.lower() in vetoed: continue
+        db_ids = [db_id]
+        size = pkg.description.get('size', 0)
+        for _is_external, drive in store.list_other_drives_for_file(pkg.rel_path, pkg.drive):
+            unlink_list.append((db_ids, os.path.join(drive, pkg.rel_path), [], size, drive, pkg.rel_path))
+        if pkg.is_pext_external():
+            unlink_list.append((db_ids, os.path.join(config['base_path'], pkg.rel_path), [], size, config['base_path'], pkg.rel_path))
+        unlink_list.append((db_ids, pkg.full_path, [], size, pkg.drive or config['base_path'], pkg.rel_path))
+
+    if config['allow_delete'] == AllowDelete.OLD_RBF:
+        unlink_list = [uf for uf in unlink_list if uf[1][-4:].lower() == ".rbf"]
+
+    return make_remove_files_jobs(unlink_list, while_processing=True)
+
+
+def make_remove_files_jobs(unlink_list: list[FileUnlink], while_processing: bool = False) -> list[Job]:
+    # Every drive gets its own jobs, and never more than REMOVAL_JOBS_PER_DRIVE of them, so each device
+    # has a bounded amount of concurrent deletions while different devices are worked on in parallel.
+    removals_by_drive: dict[str, list[FileRemoval]] = {}
+    for db_ids, unlink_file, tangles, size, drive, rel_path in unlink_list:
+        removals_by_drive.setdefault(drive, []).append((db_ids, unlink_file, tangles, size, rel_path))
+
+    jobs: list[Job] = []
+    for drive, removals in removals_by_drive.items():
+        jobs_amount = max(1, min(REMOVAL_JOBS_PER_DRIVE, len(removals) // REMOVAL_MIN_FILES_PER_JOB))
+        chunk_size = -(-len(removals) // jobs_amount)
+        for i in range(0, len(removals), chunk_size):
+            jobs.append(RemoveFilesJob(drive=drive, files=removals[i:i + chunk_size], while_processing=while_processing))
+    return jobs
@@ -17,13 +17,15 @@
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
 from threading import Lock
+from typing import Optional
 
-from downloader.config import Config
+from downloader.config import Config, ConfigDatabaseSection
 from downloader.constants import DB_STATE_FINGERPRINT_NO_HASH, DB_STATE_FINGERPRINT_NO_SIZE
 from downloader.db_entity import DbEntity
 from downloader.db_utils import build_db_config, can_skip_db, can_skip_db_with_external_store_fingerprints, \
     filter_terms_from_ini
 from downloader.file_system import FileSystem
+from downloader.http_validators import HttpValidators
 from downloader.job_system import Job, WorkerResult, JobContext, ProgressReporter
 from downloader.jobs.load_local_store_fingerprints_job import local_store_fingerprints_tag
 from downloader.jobs.mix_store_and_db_job import MixStoreAndDbJob
@@ -31,10 +33,12 @@ from downloader.jobs.open_db_job import OpenDbJob
 from downloader.jobs.reporters import InstallationReportImpl, FileDownloadSessionLogger
 from downloader.jobs.worker_context import DownloaderWorker, FailCtx
 from downloader.logger import Logger
+from downloader.mirrors import MirrorSelector
+from downloader.zip_summary_prefetcher import ZipSummaryPrefetcher
 
 
 class OpenDbWorker(DownloaderWorker):
-    def __init__(self, file_system: FileSystem, logger: Logger, file_download_session_logger: FileDownloadSessionLogger, installation_report: InstallationReportImpl, worker_context: JobContext, progress_reporter: ProgressReporter, fail_ctx: FailCtx, config: Config) -> None:
+    def __init__(self, file_system: FileSystem, logger: Logger, file_download_session_logger: FileDownloadSessionLogger, installation_report: InstallationReportImpl, worker_context: JobContext, progress_reporter: ProgressReporter, fail_ctx: FailCtx, config: Config, mirror_selector: Optional[MirrorSelector] = None, zip_summary_prefetcher: Optional[ZipSummaryPrefetcher] = None, http_validators: Optional[HttpValidators] = None) -> None:
         self._file_system = file_system
         self._logger = logger
         self._file_download_session_logger = file_download_session_logger
@@ -43,6 +47,9 @@ class OpenDbWorker(DownloaderWorker):
         self._progress_reporter = progress_reporter
         self._fail_ctx = fail_ctx
         self._config = config
+        self._mirror_selector = mirror_selector
+        self._zip_summary_prefetcher = zip_summary_prefetcher
+        self._http_validators = http_validators
         self._lock = Lock()
         self._returned_load_local_store_job = False
 
@@ -54,6 +61,9 @@ class OpenDbWorker(DownloaderWorker):
 
         # @TODO: Skip db before opening it, need to calculate the filter in other way for that and that's it. Around 300ms savings
 
+        if self._zip_summary_prefetcher is not None and self._zip_summary_prefetcher.has_candidates(job.section):
+            self._prefetch_zip_summaries(job)
+
         try:
             db_props = self._file_system.load_dict_from_transfer(job.transfer_job.source, job.transfer_job.transfer())  # type: ignore[union-attr]
         except Exception as e:
@@ -78,6 +88,9 @@ class OpenDbWorker(DownloaderWorker):
 
         self._file_download_session_logger.print_header(db)
 
+        if self._http_validators is not None:
+            self._http_validators.set_default_filter(job.ini_description['db_url'], db.default_options.filter)
+
         calcs = job.transfer_job.calcs  # type: ignore[union-attr]
         if calcs is None:
             self._fail_ctx.swallow_error(Exception(f'OpenDbWorker [{db.db_id}] must receive a transfer_job with calcs not null.'))
@@ -86,9 +99,7 @@ class OpenDbWorker(DownloaderWorker):
         db_hash = calcs.get('hash', DB_STATE_FINGERPRINT_NO_HASH)
         db_size = calcs.get('size', DB_STATE_FINGERPRINT_NO_SIZE)
 
-        while self._installation_report.any_in_progress_job_with_tags(_local_store_fingerprints_tags):
-            self._logger.bench('OpenDbWorker waiting for store fingerprints: ', job.section)
-            self._worker_context.wait_for_other_jobs(0.06)
+        self._wait_for_store_fingerprints(job)
 
         ini_description = job.ini_description
 
@@ -112,6 +123,11 @@ class OpenDbWorker(DownloaderWorker):
                 fingerprint_metadata_required = job.load_local_store_fingerprints_job.external_store_fingerprints_supported \
                     and can_skip_db(config['file_checking'], figp, db_hash, db_size, config['filter'])
 
+        mirrors = _db_mirrors(db, ini_description)
+        if self._mirror_selector is not None and len(mirrors) > 0:
+            self._mirror_selector.register(db.base_files_url, mirrors)
+            self._logger.debug(f'Mirrors for {db.db_id}: ', mirrors)
+
         jobs: list[Job] = []
         if not job.load_local_store_job.local_store and not self._returned_load_local_store_job:
             with self._lock:
@@ -132,5 +148,34 @@ class OpenDbWorker(DownloaderWorker):
         self._logger.bench('OpenDbWorker done: ', job.section)
         return jobs, None
 
+    def _wait_for_store_fingerprints(self, job: OpenDbJob) -> None:
+        while self._installation_report.any_in_progress_job_with_tags(_local_store_fingerprints_tags):
+            self._logger.bench('OpenDbWorker waiting for store fingerprints: ', job.section)
+            self._worker_context.wait_for_other_jobs(0.06)
+
+    def _prefetch_zip_summaries(self, job: OpenDbJob) -> None:
+        # When the database changed, its zip summaries probably changed too. They will be fetched
+        # way later, after the database is parsed and mixed with the store, so we start now.
+        calcs = job.transfer_job.calcs  # type: ignore[union-attr]
+        if calcs is None or 'hash' not in calcs:
+            return
+
+        self._wait_for_store_fingerprints(job)
+        fingerprints = job.load_local_store_fingerprints_job.local_store_fingerprints
+        figp = None if fingerprints is None else fingerprints.get(job.section, None)
+        if figp is not None and figp['hash'] == calcs['hash']:
+            return
+
+        self._zip_summary_prefetcher.prefetch(job.section, {job.ini_description['db_url']})  # type: ignore[union-attr]
+
 
 _local_store_fingerprints_tags = [local_store_fingerprints_tag]
+
+
+def _db_mirrors(db: DbEntity, ini_description: ConfigDatabaseSection) -> list[str]:
+    if db.base_files_url == '':
+        return []
+    # Mirrors from the INI come first, the user knows better which ones are close.
+    options = ini_description.get('options', None)
+    ini_mirrors = [] if options is None or options.base_files_mirrors is None else options.base_files_mirrors
+    return [mirror for mirror in ini_mirrors + db.base_files_mirrors if mirror != db.base_files_url]
@@ -25,7 +25,7 @@ from downloader.free_space_reservation import Partition
 from downloader.job_system import Job, JobSystem
 from downloader.jobs.index import Index
 from downloader.local_store_wrapper import ReadOnlyStoreAdapter
-from downloader.path_package import PathPackage
+from downloader.path_package import PathPackage, PathPackageBatch
 
 
 @dataclass(eq=False, order=False)
@@ -45,12 +45,12 @@ class ProcessDbIndexJob(Job):
     def priority(self) -> bool: return True
 
     # Results
-    present_not_validated_files: list[PathPackage] = field(default_factory=list)
+    present_not_validated_files: PathPackageBatch = field(default_factory=PathPackageBatch)
     verified_integrity_pkgs: list[PathPackage] = field(default_factory=list)
     failed_verification_pkgs: list[PathPackage] = field(default_factory=list)
     present_validated_files: list[PathPackage] = field(default_factory=list)
     skipped_updated_files: list[PathPackage] = field(default_factory=list)
-    non_duplicated_files: list[PathPackage] = field(default_factory=list)
+    non_duplicated_files: PathPackageBatch = field(default_factory=PathPackageBatch)
     duplicated_files: list[str] = field(default_factory=list)
 
     installed_folders: list[PathPackage] = field(default_factory=list)
@@ -28,9 +28,11 @@ from downloader.db_entity import check_file_pkg, check_folder_paths
 from downloader.file_filter import BadFileFilterPartException, Config, ZipData, FileFilterFactory
 from downloader.file_system import FileWriteError, FolderCreationError, FsError, ReadOnlyFileSystem, FileSystem
 from downloader.free_space_reservation import Partition, FreeSpaceReservation
+from downloader.http_gateway import HttpGateway
 from downloader.job_system import Job, WorkerResult, ProgressReporter
 from downloader.jobs.errors import WrongDatabaseOptions
 from downloader.jobs.fetch_file_job import FetchFileJob
+from downloader.jobs.file_removals import StoreClaims, make_remove_files_jobs_while_processing
 from downloader.jobs.index import Index
 from downloader.jobs.process_db_index_job import ProcessDbIndexJob
 from downloader.jobs.process_zip_index_job import ProcessZipIndexJob
@@ -39,7 +41,7 @@ from downloader.jobs.worker_context import DownloaderWorker, FailCtx
 from downloader.local_store_wrapper import ReadOnlyStoreAdapter
 from downloader.logger import Logger
 from downloader.other import calculate_url
-from downloader.path_package import PathPackage, PathType, PEXT_KIND_EXTERNAL, \
+from downloader.path_package import PathPackage, PathPackageBatch, PathType, PEXT_KIND_EXTERNAL, \
     PEXT_KIND_STANDARD, PATH_PACKAGE_KIND_PEXT
 from downloader.target_path_calculator import TargetPathsCalculator, StoragePriorityError, TargetPathsCalculatorFactory
 from downloader.update_output import UpdateOutput
@@ -64,6 +66,9 @@ class ProcessIndexCtx:
     file_download_session_logger: FileDownloadSessionLogger
     free_space_reservation: FreeSpaceReservation
     update_output: UpdateOutput
+    http_gateway: Optional[HttpGateway] = None
+    http_prewarm_connections: int = 0
+    store_claims: Optional[StoreClaims] = None
 
 
 class ProcessDbIndexWorker(DownloaderWorker):
@@ -89,6 +94,7 @@ class ProcessDbIndexWorker(DownloaderWorker):
 
             self._logger.bench('ProcessDbIndexWorker fetch jobs: ', db.db_id, zip_id)
             next_jobs = create_fetch_jobs(self._process_index_ctx, db.db_id, non_existing_pkgs, need_update_pkgs, created_folders, db.base_files_url)
+            next_jobs.extend(create_remove_files_jobs(self._process_index_ctx, job, store))
             self._logger.bench('ProcessDbIndexWorker done: ', db.db_id, zip_id)
             return next_jobs, None
         except (BadFileFilterPartException, StoragePriorityError, FsError, OSError) as e:
@@ -111,10 +117,10 @@ def process_index_job_main_sequence(ctx: ProcessIndexCtx, job: Union[ProcessDbIn
     filtered_summary, zip_data = ctx.file_filter_factory.create(db, summary, config).select_filtered_files(summary)
 
     logger.bench(bench_label, ' create pkgs: ', db.db_id, zip_id)
-    check_file_pkgs, job.files_to_remove, create_folder_pkgs, job.directories_to_remove = create_packages_from_index(ctx, config, filtered_summary, store)
+    check_file_batch, job.files_to_remove, create_folder_pkgs, job.directories_to_remove = create_packages_from_index(ctx, config, filtered_summary, store)
 
     logger.bench(bench_label, ' checking duplicates: ', db.db_id, zip_id)
-    job.non_duplicated_files, job.duplicated_files = ctx.installation_report.add_processed_files(check_file_pkgs)
+    job.non_duplicated_files, job.duplicated_files = ctx.installation_report.add_processed_files(check_file_batch)
 
     logger.bench(bench_label, ' Precaching is_file: ', db.db_id, zip_id)
     ctx.file_system.precache_is_file_with_folders(create_folder_pkgs)
@@ -152,20 +158,26 @@ def process_index_job_main_sequence(ctx: ProcessIndexCtx, job: Union[ProcessDbIn
 
     return non_existing_pkgs, need_update_pkgs, created_folders, zip_data, None
 
+# @TODO(python 3.12): Use ProcessDbIndexJob & ProcessZipIndexJob instead of Union, which is incorrect
+def create_remove_files_jobs(ctx: ProcessIndexCtx, job: Union[ProcessDbIndexJob, ProcessZipIndexJob], store: ReadOnlyStoreAdapter) -> list[Job]:
+    if ctx.store_claims is None:
+        return []
+    return make_remove_files_jobs_while_processing(ctx.store_claims, job.db.db_id, job.config, job.files_to_remove, store)
+
 def create_packages_from_index(ctx: ProcessIndexCtx, config: Config, summary: Index, store: ReadOnlyStoreAdapter) -> tuple[
-    list[_CheckFilePackage],
+    PathPackageBatch,
     list[_RemoveFilePackage],
     list[_CreateFolderPackage],
     list[_DeleteFolderPackage]
 ]:
     calculator = ctx.target_paths_calculator_factory.target_paths_calculator(config)
-    check_file_pkgs, remove_files_pkgs = _translate_items(ctx, calculator, summary.files, PathType.FILE, store.all_files())
-    create_folder_pkgs, delete_folder_pkgs = _translate_items(ctx, calculator, summary.folders, PathType.FOLDER, store.all_folders())
-    return check_file_pkgs, remove_files_pkgs, create_folder_pkgs, delete_folder_pkgs
+    check_file_batch, remove_files_pkgs = _translate_items(ctx, calculator, summary.files, PathType.FILE, store.all_files())
+    create_folder_batch, delete_folder_pkgs = _translate_items(ctx, calculator, summary.folders, PathType.FOLDER, store.all_folders())
+    return check_file_batch, remove_files_pkgs, create_folder_batch.pkgs(), delete_folder_pkgs
 
-def _translate_items(ctx: ProcessIndexCtx, calculator: TargetPathsCalculator, items: dict[str, dict[str, Any]], path_type: PathType, stored: dict[str, dict[str, Any]]) -> tuple[list[PathPackage], list[PathPackage]]:
-    present, present_errors = calculator.create_path_packages(items.items(), path_type)
-    present_set = {pkg.rel_path for pkg in present}
+def _translate_items(ctx: ProcessIndexCtx, calculator: TargetPathsCalculator, items: dict[str, dict[str, Any]], path_type: PathType, stored: dict[str, dict[str, Any]]) -> tuple[PathPackageBatch, list[PathPackage]]:
+    present, present_errors = calculator.create_path_package_batch(items.items(), path_type)
+    present_set = set(present.rel_paths)
     removed, removed_errors = calculator.create_path_packages([(path, description) for path, description in stored.items() if path not in present_set], path_type)
 
     for e in removed_errors:
@@ -175,30 +187,28 @@ def _translate_items(ctx: ProcessIndexCtx, calculator: TargetPathsCalculator, it
 
     return present, removed
 
-def process_check_file_packages(ctx: ProcessIndexCtx, non_duplicated_pkgs: list[_CheckFilePackage], db_id: str, store: ReadOnlyStoreAdapter, bench_label: str) -> tuple[list[_FetchFilePackage], list[_ValidateFilePackage], list[_AlreadyInstalledFilePackage]]:
-    if len(non_duplicated_pkgs) == 0:
-        return [], [], []
+def process_check_file_packages(ctx: ProcessIndexCtx, non_duplicated_files: PathPackageBatch, db_id: str, store: ReadOnlyStoreAdapter, bench_label: str) -> tuple[list[_FetchFilePackage], list[_ValidateFilePackage], PathPackageBatch]:
+    if len(non_duplicated_files) == 0:
+        return [], [], non_duplicated_files
 
     file_system = ReadOnlyFileSystem(ctx.file_system)
 
-    ctx.logger.bench(bench_label, ' file_system check: ', db_id, len(non_duplicated_pkgs))
-    existing, non_existing_pkgs = file_system.are_files(non_duplicated_pkgs)
-
-    ctx.logger.bench(bench_label, ' existing loop: ', db_id, len(non_duplicated_pkgs))
-    already_installed_pkgs: list[_ValidateFilePackage]
-    validate_pkgs: list[_ValidateFilePackage]
+    ctx.logger.bench(bench_label, ' file_system check: ', db_id, len(non_duplicated_files))
+    presence = file_system.are_files_at(non_duplicated_files.full_paths())
+    existing = non_duplicated_files.select([i for i, present in enumerate(presence) if present])
+    non_existing_pkgs = non_duplicated_files.select([i for i, present in enumerate(presence) if not present]).pkgs()
 
-    ctx.logger.bench(bench_label, ' invalid hashes start: ', db_id, len(non_duplicated_pkgs))
+    ctx.logger.bench(bench_label, ' invalid hashes start: ', db_id, len(non_duplicated_files))
     invalid_hashes = store.invalid_hashes(existing)
-    ctx.logger.bench(bench_label, ' invalid hashes end: ', db_id, len(non_duplicated_pkgs))
+    ctx.logger.bench(bench_label, ' invalid hashes end: ', db_id, len(non_duplicated_files))
     if any(invalid_hashes):
-        validate_pkgs = [pkg for pkg, inv in zip(existing, invalid_hashes) if inv]
-        already_installed_pkgs = [pkg for pkg, inv in zip(existing, invalid_hashes) if not inv]
+        validate_pkgs = existing.select([i for i, inv in enumerate(invalid_hashes) if inv]).pkgs()
+        already_installed = existing.select([i for i, inv in enumerate(invalid_hashes) if not inv])
     else:
         validate_pkgs = []
-        already_installed_pkgs = existing
+        already_installed = existing
 
-    return non_existing_pkgs, validate_pkgs, already_installed_pkgs
+    return non_existing_pkgs, validate_pkgs, already_installed
 
 
 def process_validate_packages(ctx: ProcessIndexCtx, validate_pkgs: list[_ValidateFilePackage]) -> tuple[list[PathPackage], list[PathPackage], list[_FetchFilePackage]]:
@@ -231,12 +241,12 @@ def process_validate_packages(ctx: ProcessIndexCtx, validate_pkgs: list[_Validat
 
     return present_validated_files, skipped_updated_files, more_fetch_pkgs
 
-def verify_present_not_validated_files_hashes(ctx: ProcessIndexCtx, already_installed_pkgs: list[PathPackage]) -> tuple[list[PathPackage], list[PathPackage]]:
+def verify_present_not_validated_files_hashes(ctx: ProcessIndexCtx, already_installed: PathPackageBatch) -> tuple[list[PathPackage], list[PathPackage]]:
     file_system = ReadOnlyFileSystem(ctx.file_system)
     verified_integrity_pkgs: list[PathPackage] = []
     failed_verification_pkgs: list[_FetchFilePackage] = []
 
-    for pkg in already_installed_pkgs:
+    for pkg in already_installed.pkgs():
         # @TODO: Parallelize the slow hash calculations
         fs_hash = file_system.hash(pkg.full_path)
         if fs_hash == pkg.description['hash']:
@@ -351,6 +361,7 @@ def process_create_folder_packages(ctx: ProcessIndexCtx, create_folder_pkgs: lis
             errors.append(folder_pkg.full_path)
         else:
             created_folders.add(folder_pkg.full_path)
+            ctx.target_paths_calculator_factory.folder_created(folder_pkg.full_path)
 
     installed_folders = [f for f in processing_folders if f.rel_path in db_folder_index]
     return folder_copies_to_be_removed, installed_folders, created_folders, errors
@@ -375,6 +386,10 @@ def create_fetch_jobs(
             (_fetch_job(ctx, pkg,  True, db_id, created_folders, base_files_url) for pkg in need_update_pkgs)
         ) if job is not None
     ]
+    if ctx.http_gateway is not None and ctx.http_prewarm_connections > 0 and fetch_jobs:
+        # Only when there is something to download, for the hosts of the primary URLs, and never more connections than files.
+        hosts = {'/'.join(job.source.split('/', 3)[:3]) for job in fetch_jobs}
+        ctx.http_gateway.prewarm(hosts, min(ctx.http_prewarm_connections, len(fetch_jobs)))
     if should_report_size and fetch_jobs:
         ctx.update_output.database_size_added(
             db_id,
@@ -400,6 +415,7 @@ def _fetch_job(ctx: ProcessIndexCtx, pkg: PathPackage, exists: bool, db_id: str,
         parent_full_path = pkg.drive + '/' + parent_folder
         if parent_full_path not in created_folders:
             ctx.file_system.make_dirs(parent_full_path)
+            ctx.target_paths_calculator_factory.folder_created(parent_full_path)
 
     fetch_job = FetchFileJob(source, exists, pkg, db_id)
     return fetch_job
@@ -25,7 +25,7 @@ from downloader.file_filter import FileFoldersHolder
 from downloader.free_space_reservation import Partition
 from downloader.job_system import Job, JobSystem
 from downloader.local_store_wrapper import StoreFragmentDrivePaths, ReadOnlyStoreAdapter
-from downloader.path_package import PathPackage
+from downloader.path_package import PathPackage, PathPackageBatch
 
 
 @dataclass(eq=False, order=False)
@@ -49,12 +49,12 @@ class ProcessZipIndexJob(Job):
     result_zip_index: StoreFragmentDrivePaths
     filtered_data: Optional[FileFoldersHolder] = field(default=None)
 
-    present_not_validated_files: list[PathPackage] = field(default_factory=list)
+    present_not_validated_files: PathPackageBatch = field(default_factory=PathPackageBatch)
     verified_integrity_pkgs: list[PathPackage] = field(default_factory=list)
     failed_verification_pkgs: list[PathPackage] = field(default_factory=list)
     present_validated_files: list[PathPackage] = field(default_factory=list)
     skipped_updated_files: list[PathPackage] = field(default_factory=list)
-    non_duplicated_files: list[PathPackage] = field(default_factory=list)
+    non_duplicated_files: PathPackageBatch = field(default_factory=PathPackageBatch)
     duplicated_files: list[str] = field(default_factory=list)
 
     installed_folders: list[PathPackage] = field(default_factory=list)
@@ -23,7 +23,7 @@ from downloader.job_system import WorkerResult, Job, ProgressReporter
 from downloader.jobs.index import Index
 from downloader.jobs.jobs_factory import make_zip_kind, make_transfer_job
 from downloader.jobs.open_zip_contents_job import OpenZipContentsJob, ZipKind
-from downloader.jobs.process_db_index_worker import create_fetch_jobs, process_index_job_main_sequence, ProcessIndexCtx
+from downloader.jobs.process_db_index_worker import create_fetch_jobs, create_remove_files_jobs, process_index_job_main_sequence, ProcessIndexCtx
 from downloader.jobs.process_zip_index_job import ProcessZipIndexJob
 from downloader.jobs.worker_context import DownloaderWorker, FailCtx
 from downloader.local_store_wrapper import ReadOnlyStoreAdapter, StoreFragmentDrivePaths
@@ -85,6 +85,7 @@ class ProcessZipIndexWorker(DownloaderWorker):
             if error is not None:
                 return [], error
 
+        next_jobs.extend(create_remove_files_jobs(self._process_index_ctx, job, store))
         self._fill_fragment_with_zip_index(job.result_zip_index, job)
         self._logger.bench('ProcessZipIndexWorker done: ', db.db_id, zip_id)
         return next_jobs, None
@@ -0,0 +1,40 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+from dataclasses import dataclass, field
+
+from downloader.job_system import Job, JobSystem
+
+
+# (dbs, full path, tangles, size, rel path)
+FileRemoval = tuple[list[str], str, list[str], int, str]
+
+
+@dataclass(eq=False, order=False)
+class RemoveFilesJob(Job):
+    type_id: int = field(init=False, default=JobSystem.get_job_type_id())
+
+    drive: str
+    files: list[FileRemoval]
+
+    # Removals queued while the databases are still being processed. Each one is skipped if any database
+    # processes the same path, and databases wait for it to finish before processing more paths.
+    while_processing: bool = False
+
+    # Results
+    removed_files: list[FileRemoval] = field(default_factory=list)
@@ -0,0 +1,72 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+import threading
+
+from downloader.constants import REMOVAL_JOBS_PER_DRIVE
+from downloader.file_system import FileSystem
+from downloader.job_system import WorkerResult, ProgressReporter
+from downloader.jobs.remove_files_job import RemoveFilesJob, FileRemoval
+from downloader.jobs.reporters import InstallationReportImpl
+from downloader.jobs.worker_context import DownloaderWorker
+from downloader.logger import Logger
+from downloader.metrics import metrics
+from downloader.update_output import UpdateOutput
+
+
+class RemoveFilesWorker(DownloaderWorker):
+    def __init__(self, logger: Logger, file_system: FileSystem, progress_reporter: ProgressReporter, update_output: UpdateOutput, installation_report: InstallationReportImpl) -> None:
+        self._logger = logger
+        self._file_system = file_system
+        self._progress_reporter = progress_reporter
+        self._update_output = update_output
+        self._installation_report = installation_report
+        # Jobs come from every database, so the bound of concurrent deletions per device is kept here.
+        self._drive_slots: dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def job_type_id(self) -> int: return RemoveFilesJob.type_id
+    def reporter(self): return self._progress_reporter
+
+    def operate_on(self, job: RemoveFilesJob) -> WorkerResult:  # type: ignore[override]
+        with self._drive_slot(job.drive):
+            for removal in job.files:
+                if job.while_processing:
+                    self._installation_report.unless_processed(removal[4], lambda: self._remove(job, removal))
+                else:
+                    self._remove(job, removal)
+
+        metrics().count('remove_files.unlinked', len(job.removed_files))
+        return [], None
+
+    def _remove(self, job: RemoveFilesJob, removal: FileRemoval) -> None:
+        db_ids, unlink_file, tangles, size, _ = removal
+        if not self._file_system.is_file(unlink_file):
+            return
+
+        err = self._file_system.unlink(unlink_file, verbose=False)
+        if err is None or not self._file_system.is_file(unlink_file, use_cache=False):
+            job.removed_files.append(removal)
+            self._update_output.file_removed(db_ids, unlink_file, tangles, size)
+        if err is not None:
+            self._logger.debug('WARNING: Online Importer could not remove ', unlink_file, err)
+
+    def _drive_slot(self, drive: str) -> threading.Semaphore:
+        with self._lock:
+            if drive not in self._drive_slots:
+                self._drive_slots[drive] = threading.Semaphore(REMOVAL_JOBS_PER_DRIVE)
+            return self._drive_slots[drive]
@@ -18,8 +18,8 @@
 
 import dataclasses
 import threading
-from collections import defaultdict
-from typing import Optional, Type, TypeVar, Generic, Protocol, Union
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Optional, Type, TypeVar, Generic, Protocol, Union
 
 from downloader.db_entity import DbEntity
 from downloader.interruptions import Interruptions
@@ -27,7 +27,7 @@ from downloader.jobs.errors import FileValidationError
 from downloader.jobs.fetch_data_job import FetchDataJob
 from downloader.jobs.fetch_file_job import FetchFileJob
 from downloader.jobs.open_zip_contents_job import OpenZipContentsJob
-from downloader.path_package import PathPackage
+from downloader.path_package import PathPackage, PathPackageBatch
 from downloader.job_system import ProgressReporter, Job
 from downloader.logger import Logger
 from downloader.update_output import UpdateOutput
@@ -165,81 +165,112 @@ class _WithLock(Generic[T]):
         self.lock.release()
 
 
+_STARTED, _CANCELLED, _COMPLETED, _FAILED, _RETRIED = range(5)
+
+
 class InstallationReportImpl(InstallationReport):
     def __init__(self) -> None:
-        # These are only accessed in the main thread
+        # Job transitions are appended without locking by the thread running the job system loop (deque appends are
+        # atomic), and applied in batches by whoever drains them first: the main loop, or a worker querying the report.
+        self._transitions: Deque[tuple[int, Any, Any]] = deque()
+        self._appliers: tuple[Callable[[Any, Any], None], ...] = (self._apply_started, self._apply_cancelled, self._apply_completed, self._apply_failed, self._apply_retried)
+
+        # Following are only modified while draining, under the lifecycle lock
+        self._lifecycle_lock = threading.Lock()
         self._jobs_started: dict[int, list[Job]] = defaultdict(list)
         self._jobs_completed: dict[int, list[Job]] = defaultdict(list)
         self._jobs_cancelled: dict[int, list[Job]] = defaultdict(list)
         self._jobs_failed: dict[int, list[tuple[Job, BaseException]]] = defaultdict(list)
         self._jobs_retried: dict[int, list[tuple[Job, BaseException]]] = defaultdict(list)
+        self._jobs_tag_tracking = JobTagTracking()
+        self._jobs_tag_completed: dict[Union[str, int], list[Job]] = defaultdict(list)
+        self._jobs_tag_failed: dict[Union[str, int], list[Job]] = defaultdict(list)
 
         # Following might be modified by multiple threads, but read only in the main thread
         self._processed_files_set = _WithLock[set[str]](set())
+        self._processed_files_lowered: Optional[set[str]] = None  # Only built once a removal needs it, under the same lock
         self._processed_folders = _WithLock[dict[str, dict[str, PathPackage]]]({})
         self._processed_folders_set = _WithLock[set[str]](set())
-        job_tag_lock = threading.Lock()
-        self._jobs_tag_tracking = _WithLock[JobTagTracking](JobTagTracking(), job_tag_lock)
 
-        # Following might be modified and read in multiple threads
-        self._jobs_tag_completed = _WithLock[dict[Union[str, int], list[Job]]](defaultdict(list), job_tag_lock)
-        self._jobs_tag_failed = _WithLock[dict[Union[str, int], list[Job]]](defaultdict(list), job_tag_lock)
-
-    def add_job_started(self, job: Job) -> None:
+    def add_job_started(self, job: Job) -> None: self._transitions.append((_STARTED, job, None))
+    def add_jobs_cancelled(self, jobs: list[Job]) -> None: self._transitions.append((_CANCELLED, jobs, None))
+    def add_job_completed(self, job: Job, next_jobs: list[Job]) -> None: self._transitions.append((_COMPLETED, job, next_jobs))
+    def add_job_failed(self, job: Job, exception: BaseException) -> None: self._transitions.append((_FAILED, job, exception))
+    def add_job_retried(self, job: Job, retry_job: Job, exception: BaseException) -> None: self._transitions.append((_RETRIED, job, (retry_job, exception)))
+
+    def drain(self) -> None:
+        if not self._transitions: return
+        with self._lifecycle_lock:
+            transitions, appliers = self._transitions, self._appliers
+            while transitions:
+                kind, job, extra = transitions.popleft()
+                appliers[kind](job, extra)
+
+    def _apply_started(self, job: Job, _extra: None) -> None:
         self._jobs_started[job.type_id].append(job)
-        with self._jobs_tag_tracking as tracking: tracking.add_job_started(job)
+        self._jobs_tag_tracking.add_job_started(job)
 
-    def add_jobs_cancelled(self, jobs: list[Job]) -> None:
+    def _apply_cancelled(self, jobs: list[Job], _extra: None) -> None:
         for job in jobs: self._jobs_cancelled[job.type_id].append(job)
-        with self._jobs_tag_tracking as tracking: tracking.add_jobs_cancelled(jobs)
+        self._jobs_tag_tracking.add_jobs_cancelled(jobs)
 
-    def add_job_completed(self, job: Job, next_jobs: list[Job]) -> None:
+    def _apply_completed(self, job: Job, next_jobs: list[Job]) -> None:
         self._jobs_completed[job.type_id].append(job)
-        with self._jobs_tag_tracking as tracking:
-            tracking.add_job_completed(job, next_jobs)
-            for tag in job.tags:
-                self._jobs_tag_completed.data[tag].append(job)
+        self._jobs_tag_tracking.add_job_completed(job, next_jobs)
+        for tag in job.tags:
+            self._jobs_tag_completed[tag].append(job)
 
-    def add_job_failed(self, job: Job, exception: BaseException) -> None:
+    def _apply_failed(self, job: Job, exception: BaseException) -> None:
         self._jobs_failed[job.type_id].append((job, exception))
-        with self._jobs_tag_tracking as tracking:
-            tracking.add_job_failed(job)
-            for tag in job.tags:
-                self._jobs_tag_failed.data[tag].append(job)
+        self._jobs_tag_tracking.add_job_failed(job)
+        for tag in job.tags:
+            self._jobs_tag_failed[tag].append(job)
 
-    def add_job_retried(self, job: Job, retry_job: Job, exception: BaseException) -> None:
+    def _apply_retried(self, job: Job, extra: tuple[Job, BaseException]) -> None:
+        retry_job, exception = extra
         self._jobs_retried[job.type_id].append((job, exception))
-        with self._jobs_tag_tracking as tracking: tracking.add_job_retried(job, retry_job)
+        self._jobs_tag_tracking.add_job_retried(job, retry_job)
 
     def any_in_progress_job_with_tags(self, tags: list[str]) -> bool:
         if len(tags) == 0: return False
-        with self._jobs_tag_tracking as tracking:
+        self.drain()
+        with self._lifecycle_lock:
+            in_progress = self._jobs_tag_tracking.in_progress
             for tag in tags:
-                if len(tracking.in_progress[tag]) > 0: return True
+                if len(in_progress.get(tag, ())) > 0: return True
 
         return False
 
-    def get_jobs_completed_by_tag(self, tag: str) -> list[Job]:
-        with self._jobs_tag_completed as tag_completed:
-            return tag_completed[tag]
+    def get_jobs_completed_by_tag(self, tag: str) -> list[Job]: return self._snapshot(self._jobs_tag_completed, tag)
+    def get_jobs_failed_by_tag(self, tag: str) -> list[Job]: return self._snapshot(self._jobs_tag_failed, tag)
 
-    def get_jobs_failed_by_tag(self, tag: str) -> list[Job]:
-        with self._jobs_tag_failed as tag_failed:
-            return tag_failed[tag]
+    def add_processed_files(self, files: PathPackageBatch) -> tuple[PathPackageBatch, list[str]]:
+        if len(files) == 0: return files, []
 
-    def add_processed_files(self, files: list[PathPackage]) -> tuple[list[PathPackage], list[str]]:
-        if len(files) == 0: return [], []
-
-        files_set = {pkg.rel_path for pkg in files}
+        files_set = set(files.rel_paths)
         with self._processed_files_set as processed_files_set:
             duplicates = files_set.intersection(processed_files_set)
             processed_files_set.update(files_set)
+            if self._processed_files_lowered is not None:
+                self._processed_files_lowered.update(rel_path.lower() for rel_path in files_set)
 
-        non_duplicates_set = files_set - duplicates
-        non_duplicates = [pkg for pkg in files if pkg.rel_path in non_duplicates_set]
+        if len(duplicates) == 0:
+            return files, []
 
+        non_duplicates = files.select([i for i, rel_path in enumerate(files.rel_paths) if rel_path not in duplicates])
         return non_duplicates, list(duplicates)
 
+    def unless_processed(self, rel_path: str, action: Callable[[], None]) -> bool:
+        """Runs 'action' unless some database processed a path matching 'rel_path' case-insensitively.
+        Processing more files waits for it, so a removal can't race with a database taking the same path."""
+        with self._processed_files_set as processed_files_set:
+            if self._processed_files_lowered is None:
+                self._processed_files_lowered = {processed.lower() for processed in processed_files_set}
+            if rel_path.lower() in self._processed_files_lowered:
+                return False
+            action()
+            return True
+
     def add_processed_folders(self, folders: list[PathPackage], db_id: str) -> list[PathPackage]:
         if len(folders) == 0: return []
         non_already_present = []
@@ -256,17 +287,34 @@ class InstallationReportImpl(InstallationReport):
 
         return non_already_present
 
-    def get_started_jobs    (self, job_class: Type[TJob]) -> list[TJob]:                        return self._jobs_started   [job_class.type_id]  # type: ignore[return-value, index]
-    def get_completed_jobs  (self, job_class: Type[TJob]) -> list[TJob]:                        return self._jobs_completed [job_class.type_id]  # type: ignore[return-value, index]
-    def get_failed_jobs     (self, job_class: Type[TJob]) -> list[tuple[TJob, BaseException]]:  return self._jobs_failed    [job_class.type_id]  # type: ignore[return-value, index]
-    def get_retried_jobs    (self, job_class: Type[TJob]) -> list[tuple[TJob, BaseException]]:  return self._jobs_retried   [job_class.type_id]  # type: ignore[return-value, index]
-    def get_cancelled_jobs  (self, job_class: Type[TJob]) -> list[TJob]:                        return self._jobs_cancelled [job_class.type_id]  # type: ignore[return-value, index]
+    def get_started_jobs    (self, job_class: Type[TJob]) -> list[TJob]:                        return self._snapshot(self._jobs_started,   job_class.type_id)  # type: ignore[arg-type]
+    def get_completed_jobs  (self, job_class: Type[TJob]) -> list[TJob]:                        return self._snapshot(self._jobs_completed, job_class.type_id)  # type: ignore[arg-type]
+    def get_failed_jobs     (self, job_class: Type[TJob]) -> list[tuple[TJob, BaseException]]:  return self._snapshot(self._jobs_failed,    job_class.type_id)  # type: ignore[arg-type]
+    def get_retried_jobs    (self, job_class: Type[TJob]) -> list[tuple[TJob, BaseException]]:  return self._snapshot(self._jobs_retried,   job_class.type_id)  # type: ignore[arg-type]
+    def get_cancelled_jobs  (self, job_class: Type[TJob]) -> list[TJob]:                        return self._snapshot(self._jobs_cancelled, job_class.type_id)  # type: ignore[arg-type]
+
+    def _snapshot(self, jobs_by_key: dict[Any, list[Any]], key: Any) -> list[Any]:
+        self.drain()
+        with self._lifecycle_lock:
+            return list(jobs_by_key.get(key, ()))
 
     # All the rest are Non-thread-safe: Should only be used after threads are out
     def processed_folder(self, path: str) -> dict[str, PathPackage]: return self._processed_folders.data[path]
     def all_processed_folders(self) -> list[str]: return list(self._processed_folders.data.keys())
 
 
+class JobLifecycleListener(Protocol):
+    def on_job_started(self, job: Job) -> None: """Called in the main thread when a job starts."""
+    def on_job_completed(self, job: Job) -> None: """Called in the main thread when a job completes successfully."""
+    def on_job_failed(self, job: Job, exception: BaseException) -> None: """Called in the main thread when a job fails without more retries."""
+
+
+class NoopJobLifecycleListener(JobLifecycleListener):
+    def on_job_started(self, job: Job) -> None: pass
+    def on_job_completed(self, job: Job) -> None: pass
+    def on_job_failed(self, job: Job, exception: BaseException) -> None: pass
+
+
 class FileDownloadSessionLogger(Protocol):
     def print_progress_line(self, line: str) -> None:
         """Prints a progress line."""
@@ -284,6 +332,22 @@ class FileDownloadProgressReporter(ProgressReporter, FileDownloadSessionLogger):
         self._interrupts = interrupts
         self._update_output = update_output
         self._report: InstallationReportImpl = InstallationReportImpl()
+        self._job_listener: JobLifecycleListener = NoopJobLifecycleListener()
+
+        # Dispatch by job.type_id, so the main loop doesn't walk isinstance chains on every notification.
+        self._on_started: dict[int, Callable[..., None]] = {
+            FetchFileJob.type_id: self._fetch_file_started,
+            FetchDataJob.type_id: self._fetch_data_started,
+        }
+        self._on_completed: dict[int, Callable[..., None]] = {
+            FetchFileJob.type_id: self._fetch_file_completed,
+            OpenZipContentsJob.type_id: self._open_zip_contents_completed,
+            FetchDataJob.type_id: self._fetch_data_completed,
+        }
+        self._on_failed: dict[int, Callable[..., None]] = {
+            FetchFileJob.type_id: self._fetch_file_failed,
+            OpenZipContentsJob.type_id: self._open_zip_contents_failed,
+        }
 
     def installation_report(self) -> InstallationReport: return self._report
     def session_logger(self) -> FileDownloadSessionLogger: return self
@@ -291,43 +355,65 @@ class FileDownloadProgressReporter(ProgressReporter, FileDownloadSessionLogger):
     def set_installation_report(self, report: InstallationReportImpl):
         self._report = report
 
+    def set_job_listener(self, listener: JobLifecycleListener) -> None:
+        self._job_listener = listener
+
     def notify_job_started(self, job: Job) -> None:
         self._report.add_job_started(job)
-        if isinstance(job, FetchFileJob) and job.db_id is not None:
-            self._update_output.file_started(job.db_id, job.pkg.rel_path, job.pkg.description['size'], job.pkg.description.get('tangle', []))
-        if isinstance(job, FetchDataJob):
-            self._logger.bench('FileDownloadProgressReporter FetchDataJob started: ', job.source)
+        self._job_listener.on_job_started(job)
+        handler = self._on_started.get(job.type_id, None)
+        if handler is not None: handler(job)
 
     def notify_work_in_progress(self) -> None:
+        self._report.drain()
         self._update_output.work_in_progress()
 
     def notify_job_completed(self, job: Job, next_jobs: list[Job]) -> None:
         self._report.add_job_completed(job, next_jobs)
-        if isinstance(job, FetchFileJob) and job.db_id is not None:
-            self._update_output.file_completed(job.db_id, job.pkg.rel_path, job.pkg.description['size'], job.already_exists, reboot=job.pkg.description.get('reboot', False) is True)
-        if isinstance(job, OpenZipContentsJob):
-            for pkg in job.validated_files:
-                self._update_output.file_completed(job.db.db_id, pkg.rel_path, pkg.description['size'], False, job.zip_id, reboot=pkg.description.get('reboot', False) is True)
-            for pkg in job.failed_files:
-                self._update_output.file_failed(job.db.db_id, pkg.rel_path, pkg.description['size'], FileValidationError.__name__)
-        if isinstance(job, FetchDataJob):
-            self._logger.bench('FileDownloadProgressReporter FetchDataJob completed: ', job.source)
+        self._job_listener.on_job_completed(job)
+        handler = self._on_completed.get(job.type_id, None)
+        if handler is not None: handler(job)
 
     def notify_job_failed(self, job: Job, exception: BaseException) -> None:
         self._report.add_job_failed(job, exception)
-        if isinstance(job, FetchFileJob) and job.db_id is not None:
-            self._update_output.file_failed(job.db_id, job.pkg.rel_path, job.pkg.description['size'], type(exception).__name__)
-        if isinstance(job, OpenZipContentsJob):
-            for pkg in job.files_to_unzip:
-                self._update_output.file_failed(job.db.db_id, pkg.rel_path, pkg.description['size'], type(exception).__name__)
-        if isinstance(job, FetchFileJob) and job.db_id is not None:
-            self._logger.debug(exception)
+        self._job_listener.on_job_failed(job, exception)
+        handler = self._on_failed.get(job.type_id, None)
+        if handler is not None: handler(job, exception)
 
     def notify_job_retried(self, job: Job, retry_job: Job, exception: BaseException) -> None:
         self._report.add_job_retried(job, retry_job, exception)
-        if isinstance(job, FetchFileJob) and job.db_id is not None:
+        if job.type_id == FetchFileJob.type_id and job.db_id is not None:  # type: ignore[attr-defined]
+            self._logger.debug(exception)
+
+    def _fetch_file_started(self, job: FetchFileJob) -> None:
+        if job.db_id is not None:
+            self._update_output.file_started(job.db_id, job.pkg.rel_path, job.pkg.description['size'], job.pkg.description.get('tangle', []))
+
+    def _fetch_data_started(self, job: FetchDataJob) -> None:
+        self._logger.bench('FileDownloadProgressReporter FetchDataJob started: ', job.source)
+
+    def _fetch_file_completed(self, job: FetchFileJob) -> None:
+        if job.db_id is not None:
+            self._update_output.file_completed(job.db_id, job.pkg.rel_path, job.pkg.description['size'], job.already_exists, reboot=job.pkg.description.get('reboot', False) is True)
+
+    def _open_zip_contents_completed(self, job: OpenZipContentsJob) -> None:
+        for pkg in job.validated_files:
+            self._update_output.file_completed(job.db.db_id, pkg.rel_path, pkg.description['size'], False, job.zip_id, reboot=pkg.description.get('reboot', False) is True)
+        for pkg in job.failed_files:
+            self._update_output.file_failed(job.db.db_id, pkg.rel_path, pkg.description['size'], FileValidationError.__name__)
+
+    def _fetch_data_completed(self, job: FetchDataJob) -> None:
+        self._logger.bench('FileDownloadProgressReporter FetchDataJob completed: ', job.source)
+
+    def _fetch_file_failed(self, job: FetchFileJob, exception: BaseException) -> None:
+        if job.db_id is not None:
+            self._update_output.file_failed(job.db_id, job.pkg.rel_path, job.pkg.description['size'], type(exception).__name__)
             self._logger.debug(exception)
 
+    def _open_zip_contents_failed(self, job: OpenZipContentsJob, exception: BaseException) -> None:
+        for pkg in job.files_to_unzip:
+            self._update_output.file_failed(job.db.db_id, pkg.rel_path, pkg.description['size'], type(exception).__name__)
+
     def notify_jobs_cancelled(self, jobs: list[Job]) -> None:
         self._report.add_jobs_cancelled(jobs)
         self._update_output.jobs_cancelled(len(jobs))
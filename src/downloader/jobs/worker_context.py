@@ -17,11 +17,12 @@
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
 from abc import abstractmethod
-from typing import Optional
+import threading
+from typing import Callable, Optional
 
 from downloader.error import DownloaderError
 from downloader.fail_policy import FailPolicy
-from downloader.job_system import Job, Worker
+from downloader.job_system import Job, ProgressReporter, Worker, WorkerResult
 from downloader.logger import Logger
 
 
@@ -53,3 +54,29 @@ class DownloaderWorker(Worker):
     @abstractmethod
     def job_type_id(self) -> int:
         """Returns the type id of the job this worker operates on."""
+
+
+class LazyWorker(DownloaderWorker):
+    """Builds the actual worker the first time one of its jobs runs, so that
+    the worker module (and whatever it imports) is only loaded when needed."""
+
+    def __init__(self, job_type_id: int, progress_reporter: ProgressReporter, factory: Callable[[], DownloaderWorker]) -> None:
+        self._job_type_id = job_type_id
+        self._progress_reporter = progress_reporter
+        self._factory: Optional[Callable[[], DownloaderWorker]] = factory
+        self._worker: Optional[DownloaderWorker] = None
+        self._lock = threading.Lock()
+
+    def job_type_id(self) -> int: return self._job_type_id
+    def reporter(self): return self._progress_reporter
+
+    def operate_on(self, job: Job) -> WorkerResult:
+        worker = self._worker
+        if worker is None:
+            with self._lock:
+                if self._worker is None:
+                    assert self._factory is not None
+                    self._worker = self._factory()
+                    self._factory = None
+                worker = self._worker
+        return worker.operate_on(job)
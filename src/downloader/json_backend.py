@@ -0,0 +1,106 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import json
+import os
+import sys
+from typing import Any, Optional, Protocol
+
+from downloader.logger import Logger
+
+
+class JsonBackend(Protocol):
+    name: str
+    def loads(self, data: bytes) -> Any: """Parses UTF-8 encoded json."""
+    def dumps(self, obj: Any) -> bytes: """Must return exactly the bytes of json.dumps(obj).encode()"""
+    def dumps_canonical(self, obj: Any) -> bytes: """Sorted keys, compact separators and ASCII only. Used for fingerprints."""
+
+
+class StdlibJsonBackend(JsonBackend):
+    name = 'json'
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data.decode('utf-8'))
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    def dumps_canonical(self, obj: Any) -> bytes:
+        return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=True).encode()
+
+
+class OrjsonJsonBackend(StdlibJsonBackend):
+    name = 'orjson'
+
+    def __init__(self, orjson_module: Any) -> None:
+        self._orjson = orjson_module
+
+    def loads(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+
+    # Encoding stays on the standard library: orjson can't reproduce its separators
+    # nor the ASCII escaping, and stores and fingerprints must keep the same bytes.
+
+
+_backend: JsonBackend = StdlibJsonBackend()
+
+
+def json_backend() -> JsonBackend:
+    return _backend
+
+
+def set_json_backend(backend: JsonBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+def detect_json_backend(logger: Logger, extensions_folder: Optional[str] = None) -> JsonBackend:
+    # The accelerated decoder is optional. It can be installed system-wide (PC launcher),
+    # or as a compiled module inside the extensions folder on the MiSTer:
+    #  - /media/fat/Scripts/.config/downloader/orjson/orjson.cpython-39-arm-linux-gnueabihf.so
+    #  - /media/fat/Scripts/.config/downloader/orjson/__init__.py
+    logger.bench('JsonBackend detection start.')
+    backend: JsonBackend = StdlibJsonBackend()
+    orjson_module = _import_orjson(logger, extensions_folder)
+    if orjson_module is not None:
+        backend = OrjsonJsonBackend(orjson_module)
+
+    logger.debug('Using JSON backend: ', backend.name)
+    logger.bench('JsonBackend detection done.')
+    return backend
+
+
+def _import_orjson(logger: Logger, extensions_folder: Optional[str]) -> Any:
+    try:
+        import orjson  # type: ignore[import-not-found]
+        return orjson
+    except ImportError:
+        pass
+
+    if extensions_folder is None or not os.path.isdir(os.path.join(extensions_folder, 'orjson')):
+        return None
+
+    sys.path.insert(0, extensions_folder)
+    try:
+        import orjson  # type: ignore[import-not-found]
+        return orjson
+    except Exception as e:
+        logger.debug(e)
+        return None
+    finally:
+        sys.path.remove(extensions_folder)
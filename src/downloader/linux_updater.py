@@ -23,7 +23,8 @@ import tempfile
 import os.path
 from typing import Any
 from downloader.config import Config
-from downloader.constants import FILE_7z_util_uninstalled, FILE_7z_util_uninstalled_description, FILE_Linux_uninstalled, FILE_downloader_needs_reboot_after_linux_update, FILE_MiSTer_version, FILE_7z_util, FILE_Linux_user_files
+from downloader.constants import FILE_7z_util_uninstalled, FILE_7z_util_uninstalled_description, FILE_Linux_uninstalled, FILE_downloader_needs_reboot_after_linux_update, FILE_MiSTer_version, FILE_7z_util, FILE_Linux_user_files, \
+    FOLDER_Linux, FOLDER_Linux_update, FOLDER_Linux_update_files, LINUX_UPDATE_EXCLUDED_FOLDERS
 from downloader.db_entity import DbEntity
 from downloader.file_system import FileSystem
 from downloader.jobs.fetch_file_worker import SafeFileFetcher
@@ -122,31 +123,27 @@ class LinuxUpdater:
             self._update_output.linux_update_failed('fetch_7z', '7z is not present in the system. Aborting Linux update.')
             return
 
+        # The archive MD5 was already verified while downloading it, so there is no need
+        # for a '7za t' pass, which would read the whole image from the SD card once more.
         self._update_output.linux_update_phase('extract')
         sys.stdout.flush()
         result = subprocess.run('''
-                sync
                 RET_CODE=
-                if {0} t "{1}" ; then
-                    if [ -d /media/fat/linux.update ]
-                    then
-                        rm -R "/media/fat/linux.update" > /dev/null 2>&1
-                    fi
-                    mkdir "/media/fat/linux.update"
-                    if {0} x -y "{1}" files/linux/* -o"/media/fat/linux.update" ; then
-                        RET_CODE=0
-                    else
-                        rm -R "/media/fat/linux.update" > /dev/null 2>&1
-                        sync
-                        RET_CODE=101
-                    fi
+                if [ -d "{2}" ]
+                then
+                    rm -R "{2}" > /dev/null 2>&1
+                fi
+                mkdir "{2}"
+                if {0} x -y "{1}" files/linux/* -o"{2}" ; then
+                    RET_CODE=0
                 else
-                    echo "Downloaded installer 7z is broken, deleting {1}"
-                    RET_CODE=102
+                    rm -R "{2}" > /dev/null 2>&1
+                    sync
+                    RET_CODE=101
                 fi
                 rm "{1}" > /dev/null 2>&1
                 exit $RET_CODE
-        '''.format(FILE_7z_util, FILE_Linux_uninstalled), shell=True, stderr=subprocess.STDOUT)
+        '''.format(FILE_7z_util, FILE_Linux_uninstalled, FOLDER_Linux_update), shell=True, stderr=subprocess.STDOUT)
 
         if result.returncode != 0:
             self._update_output.linux_update_failed('extract', 'Error code: %d' % result.returncode)
@@ -161,29 +158,59 @@ class LinuxUpdater:
         sys.stdout.flush()
         self._waiter.sleep(0.5)
 
+        try:
+            self._file_system.move(os.path.join(FOLDER_Linux_update_files, 'linux.img'), os.path.join(FOLDER_Linux, 'linux.img.new'))
+            installed = self._install_changed_files(FOLDER_Linux_update_files, FOLDER_Linux)
+        except Exception as e:
+            self._logger.debug(e)
+            self._update_output.linux_update_failed('flash', str(e))
+            return
+
+        self._logger.debug('Linux files installed: %d' % installed)
         result = subprocess.run('''
+                    rm -R "{0}" > /dev/null 2>&1
                     sync
-                    mv -f "/media/fat/linux.update/files/linux/linux.img" "/media/fat/linux/linux.img.new"
-                    rsync --exclude="gamecontrollerdb/" --out-format='%n' -a "/media/fat/linux.update/files/linux/" "/media/fat/linux/"
-                    rm -R "/media/fat/linux.update" > /dev/null 2>&1
-                    sync
-                    /media/fat/linux/updateboot
+                    {1}/updateboot
                     sync
-                    mv -f "/media/fat/linux/linux.img.new" "/media/fat/linux/linux.img"
+                    mv -f "{1}/linux.img.new" "{1}/linux.img"
                     sync
-                    touch /tmp/downloader_needs_reboot_after_linux_update
-        ''', shell=True, stderr=subprocess.STDOUT)
+                    touch {2}
+        '''.format(FOLDER_Linux_update, FOLDER_Linux, FILE_downloader_needs_reboot_after_linux_update), shell=True, stderr=subprocess.STDOUT)
 
         if result.returncode != 0:
             self._update_output.linux_update_failed('flash', 'Error code: %d' % result.returncode)
         else:
             self._update_output.linux_update_completed()
 
+    def _install_changed_files(self, source_dir: str, target_dir: str) -> int:
+        # Same outcome as 'rsync -a' but skipping the files that are already identical,
+        # so that an update doesn't rewrite the whole linux folder on the SD card.
+        installed = 0
+        for root, dirs, files in os.walk(source_dir):
+            dirs[:] = sorted(d for d in dirs if d not in LINUX_UPDATE_EXCLUDED_FOLDERS)
+            for name in sorted(files):
+                source = os.path.join(root, name)
+                target = os.path.join(target_dir, os.path.relpath(source, source_dir))
+                if self._file_system.is_file(target, use_cache=False) \
+                        and self._file_system.size(target) == self._file_system.size(source) \
+                        and self._file_system.hash(target) == self._file_system.hash(source):
+                    continue
+
+                self._file_system.make_dirs_parent(target)
+                self._file_system.copy(source, target)
+                try:
+                    os.chmod(target, os.stat(source).st_mode & 0o7777)
+                except OSError as e:
+                    self._logger.debug(e)  # FAT partitions don't support permissions
+                self._logger.print(os.path.relpath(source, source_dir))
+                installed += 1
+        return installed
+
     def _restore_user_files(self) -> bool:
         temp_dir = tempfile.mkdtemp()
         self._logger.debug('Created temporary directory for image: %s' % temp_dir)
 
-        mount_cmd = 'mount -t ext4 /media/fat/linux.update/files/linux/linux.img {0}'.format(temp_dir)
+        mount_cmd = 'mount -t ext4 {0}/linux.img {1}'.format(FOLDER_Linux_update_files, temp_dir)
         self._logger.debug('Mounting temporary Linux image with command: %s' % mount_cmd)
         result = subprocess.run(mount_cmd, shell=True, stderr=subprocess.STDOUT)
 
@@ -16,40 +16,49 @@
 # You can download the latest version of this tool from:
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 import os
+import threading
+import time
 from collections import defaultdict
-from typing import Optional
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
 
 from downloader.constants import FILE_downloader_storage_zip, FILE_downloader_log, \
     FILE_downloader_last_successful_run, FILE_downloader_external_storage, FILE_downloader_storage_json, \
     FILE_downloader_storage_sigs_json, FILE_downloader_previous_free_space_json, \
     FILE_downloader_storage_backup_pext, FILE_downloader_storage_fingerprints_json, \
-    FILE_downloader_external_store_fingerprints_json
+    FILE_downloader_external_store_fingerprints_json, FILE_downloader_http_redirects_json, FILE_downloader_http_validators_json, EXTERNAL_STORE_DRIVE_TIMEOUT
 from downloader.external_drives_repository import ExternalDrivesRepository
 from downloader.external_store_fingerprints import EXTERNAL_STORE_FINGERPRINTS, external_store_manifest, \
     external_store_manifest_fragments
 from downloader.fail_policy import FailPolicy
-from downloader.file_system import FileSystem, FsError
+from downloader.file_system import FileSystem, FsError, FsTimeoutError
 from downloader.local_store_wrapper import LocalStoreWrapper, DbStateFingerprint
 from downloader.logger import FilelogSaver, Logger
 from downloader.other import empty_store_without_base_path
 from downloader.store_migrator import make_new_local_store, StoreMigrator
 from downloader.config import Config
 
+T = TypeVar('T')
+
 
 class LocalRepository(FilelogSaver):
-    def __init__(self, config: Config, logger: Logger, file_system: FileSystem, store_migrator: StoreMigrator, external_drives_repository: ExternalDrivesRepository, fail_policy: FailPolicy = FailPolicy.FAULT_TOLERANT) -> None:
+    def __init__(self, config: Config, logger: Logger, file_system: FileSystem, store_migrator: StoreMigrator, external_drives_repository: ExternalDrivesRepository, fail_policy: FailPolicy = FailPolicy.FAULT_TOLERANT, drive_timeout: float = EXTERNAL_STORE_DRIVE_TIMEOUT, store_cache: Optional['StoreCache'] = None) -> None:
         self._config = config
         self._logger = logger
         self._file_system = file_system
         self._store_migrator = store_migrator
         self._external_drives_repository = external_drives_repository
         self._fail_policy = fail_policy
+        self._drive_timeout = drive_timeout
+        self._store_cache = store_cache
         self._storage_path_save_value: Optional[str] = None
         self._storage_path_old_value: Optional[str] = None
         self._storage_path_load_value: Optional[str] = None
         self._store_sigs_path_value: Optional[str] = None
         self._store_fingerprints_path_value: Optional[str] = None
         self._previous_free_spaces_path_value: Optional[str] = None
+        self._http_redirects_path_value: Optional[str] = None
+        self._http_validators_path_value: Optional[str] = None
         self._last_successful_run_value: Optional[str] = None
         self._logfile_path_value: Optional[str] = None
         self._storage_backup_pext_path_value: Optional[str] = None
@@ -101,6 +110,18 @@ class LocalRepository(FilelogSaver):
             self._previous_free_spaces_path_value = os.path.join(self._config['base_system_path'], FILE_downloader_previous_free_space_json)
         return self._previous_free_spaces_path_value
 
+    @property
+    def _http_redirects_path(self) -> str:
+        if self._http_redirects_path_value is None:
+            self._http_redirects_path_value = os.path.join(self._config['base_system_path'], FILE_downloader_http_redirects_json)
+        return self._http_redirects_path_value
+
+    @property
+    def _http_validators_path(self) -> str:
+        if self._http_validators_path_value is None:
+            self._http_validators_path_value = os.path.join(self._config['base_system_path'], FILE_downloader_http_validators_json)
+        return self._http_validators_path_value
+
     @property
     def _last_successful_run(self) -> str:
         if self._last_successful_run_value is None:
@@ -131,6 +152,28 @@ class LocalRepository(FilelogSaver):
         return self._file_system.is_file(self._storage_load_path)
 
     def load_store(self):
+        if self._store_cache is None:
+            return self._load_store_impl()[0]
+
+        signature = self._store_signature()
+        local_store = self._store_cache.get(signature)
+        if local_store is not None:
+            self._logger.bench('LocalRepository Load store from memory.')
+            return local_store
+
+        local_store, complete = self._load_store_impl()
+        if complete:
+            # A store that couldn't be fully loaded must not be served to later commands.
+            self._store_cache.put(signature, local_store)
+        return local_store
+
+    def _store_signature(self) -> tuple[Any, ...]:
+        drives = tuple(sorted(self._store_drives()))
+        paths = [self._storage_load_path] + [os.path.join(drive, FILE_downloader_external_storage) for drive in drives]
+        # The configured databases and the connected drives are part of it because they decide which external stores are merged.
+        return tuple(sorted(self._config['databases'])), drives, tuple((path, _file_signature(path)) for path in paths)
+
+    def _load_store_impl(self) -> tuple[LocalStoreWrapper, bool]:
         self._logger.bench('LocalRepository Load store start.')
         try:
             has_main_store = self._file_system.is_file(self._storage_load_path)
@@ -142,21 +185,18 @@ class LocalRepository(FilelogSaver):
 
             main_db_ids = set(local_store['dbs'])
             configured_db_ids = set(self._config['databases'])
-            external_drives = self._store_drives()
+            external_drives = list(self._store_drives())
+            external_results = self._run_per_drive({drive: lambda drive, _abandoned: self._load_external_store(drive) for drive in external_drives})
 
+            unavailable_drives: set[str] = set()
             for drive in external_drives:
-                external_store_file = os.path.join(drive, FILE_downloader_external_storage)
-                if not self._file_system.is_file(external_store_file):
-                    continue
-
-                try:
-                    self._logger.bench('LocalRepository Open json start.')
-                    external_store = self._file_system.load_dict_from_file(external_store_file)
-                    self._logger.bench('LocalRepository Open json done.')
-                    self._store_migrator.migrate(external_store)  # not very strict with exceptions, because this file is easier to tweak
-                except Exception as e:
-                    self._logger.debug(e)
+                external_store, error = external_results[drive]
+                if error is not None:
+                    self._logger.debug(error)
                     self._logger.print('Could not load external store for drive "%s"' % drive)
+                    unavailable_drives.add(drive)
+                    continue
+                if external_store is None:
                     continue
 
                 for db_id, external in external_store['dbs'].items():
@@ -167,17 +207,30 @@ class LocalRepository(FilelogSaver):
                     local_store['dbs'][db_id]['external'] = local_store['dbs'][db_id].get('external', {})
                     local_store['dbs'][db_id]['external'][drive] = external
 
-            return LocalStoreWrapper(local_store)
+            local_store_wrapper = LocalStoreWrapper(local_store)
+            local_store_wrapper.set_unavailable_drives(unavailable_drives)
+            return local_store_wrapper, len(unavailable_drives) == 0
 
         except Exception as e:
             if self._fail_policy == FailPolicy.FAIL_FAST:
                 raise e
             self._logger.debug(e)
             self._logger.print('ERROR: Could not load store')
-            return LocalStoreWrapper(make_new_local_store(self._store_migrator))
+            return LocalStoreWrapper(make_new_local_store(self._store_migrator)), False
         finally:
             self._logger.bench('LocalRepository Load store done.')
 
+    def _load_external_store(self, drive: str) -> Optional[dict[str, Any]]:
+        external_store_file = os.path.join(drive, FILE_downloader_external_storage)
+        if not self._file_system.is_file(external_store_file):
+            return None
+
+        self._logger.bench('LocalRepository Open json start: ', drive)
+        external_store = self._file_system.load_dict_from_file(external_store_file)
+        self._logger.bench('LocalRepository Open json done: ', drive)
+        self._store_migrator.migrate(external_store)  # not very strict with exceptions, because this file is easier to tweak
+        return external_store
+
     def load_store_fingerprints(self) -> Optional[dict[str, DbStateFingerprint]]:
         self._logger.bench('LocalRepository Load store fingerprints start.')
         try:
@@ -267,6 +320,66 @@ class LocalRepository(FilelogSaver):
         self._logger.bench('LocalRepository Remove free spaces done.')
         return err
 
+    def load_http_redirects(self) -> dict[str, Any]:
+        self._logger.bench('LocalRepository Load http redirects start.')
+        try:
+            if self._file_system.is_file(self._http_redirects_path):
+                return self._file_system.load_dict_from_file(self._http_redirects_path)
+            else:
+                return {}
+        except Exception as e:
+            self._logger.debug('LocalRepository.load_http_redirects: ', e)
+            return {}
+        finally:
+            self._logger.bench('LocalRepository Load http redirects done.')
+
+    def save_http_redirects(self, http_redirects: dict[str, Any]) -> Optional[Exception]:
+        if not http_redirects.get('urls', None) and not http_redirects.get('hosts', None):
+            if self._file_system.is_file(self._http_redirects_path):
+                return self._file_system.unlink(self._http_redirects_path, verbose=False)
+            return None
+
+        self._logger.bench('LocalRepository Save http redirects start.')
+        try:
+            self._file_system.make_dirs_parent(self._http_redirects_path)
+            self._file_system.save_json(http_redirects, self._http_redirects_path)
+        except Exception as e:
+            self._logger.debug('LocalRepository.save_http_redirects: ', e)
+            return e
+        finally:
+            self._logger.bench('LocalRepository Save http redirects done.')
+        return None
+
+    def load_http_validators(self) -> dict[str, Any]:
+        self._logger.bench('LocalRepository Load http validators start.')
+        try:
+            if self._file_system.is_file(self._http_validators_path):
+                return self._file_system.load_dict_from_file(self._http_validators_path)
+            else:
+                return {}
+        except Exception as e:
+            self._logger.debug('LocalRepository.load_http_validators: ', e)
+            return {}
+        finally:
+            self._logger.bench('LocalRepository Load http validators done.')
+
+    def save_http_validators(self, http_validators: dict[str, Any]) -> Optional[Exception]:
+        if not http_validators.get('urls', None):
+            if self._file_system.is_file(self._http_validators_path):
+                return self._file_system.unlink(self._http_validators_path, verbose=False)
+            return None
+
+        self._logger.bench('LocalRepository Save http validators start.')
+        try:
+            self._file_system.make_dirs_parent(self._http_validators_path)
+            self._file_system.save_json(http_validators, self._http_validators_path)
+        except Exception as e:
+            self._logger.debug('LocalRepository.save_http_validators: ', e)
+            return e
+        finally:
+            self._logger.bench('LocalRepository Save http validators done.')
+        return None
+
     def has_last_successful_run(self):
         return self._file_system.is_file(self._last_successful_run)
 
@@ -347,37 +460,35 @@ class LocalRepository(FilelogSaver):
                     self._file_system.is_file(self._storage_save_path, use_cache=False):
                 self._file_system.unlink(self._storage_old_path)
 
-            external_drives = set(self._store_drives())
+            # Drives that couldn't be loaded still hold their previous store, which this run never saw.
+            unavailable_drives = local_store_wrapper.unavailable_drives()
+            for drive in unavailable_drives:
+                self._logger.debug(f'Skipping "{os.path.join(drive, FILE_downloader_external_storage)}" because it could not be loaded.')
 
+            drive_operations: dict[str, Callable[[str, threading.Event], None]] = {drive: self._clean_external_store for drive in self._store_drives() if drive not in unavailable_drives}
             for drive, store in external_stores.items():
-                self._logger.bench('LocalRepository Write external json start: ', drive)
-                external_store_path = os.path.join(drive, FILE_downloader_external_storage)
-                external_store_fingerprints_path = self._external_store_fingerprints_path(drive)
-                try:
-                    self._file_system.save_json(store, external_store_path)
-                    manifest = external_fingerprints_by_drive.get(drive, {})
-                    if len(manifest) > 0:
-                        self._file_system.save_json(manifest, external_store_fingerprints_path)
-                    elif self._file_system.is_file(external_store_fingerprints_path):
-                        self._file_system.unlink(external_store_fingerprints_path)
-                except OSError as e:
-                    self._logger.debug(e)
-                    self._logger.print(f'ERROR: Could not save "{external_store_path}"\n'
+                if drive not in unavailable_drives:
+                    drive_operations[drive] = partial(self._save_external_store, store=store, manifest=external_fingerprints_by_drive.get(drive, {}))
+
+            unexpected_error: Optional[Exception] = None
+            timeout_error: Optional[FsTimeoutError] = None
+            for drive, (_, error) in self._run_per_drive(drive_operations).items():
+                if error is None:
+                    continue
+                elif isinstance(error, FsTimeoutError):
+                    timeout_error = error
+                    self._logger.debug(error)
+                    self._logger.print(f'ERROR: Could not save "{os.path.join(drive, FILE_downloader_external_storage)}"\n'
                                        f'       Is your drive "{drive}" connected and writable?')
-                    if self._file_system.is_file(external_store_fingerprints_path):
-                        self._file_system.unlink(external_store_fingerprints_path)
-                self._logger.bench('LocalRepository Write external json done: ', drive)
-                external_drives.discard(drive)
+                elif unexpected_error is None:
+                    unexpected_error = error
 
-            for drive in external_drives:
-                db_to_clean = os.path.join(drive, FILE_downloader_external_storage)
-                if self._file_system.is_file(db_to_clean):
-                    self._file_system.unlink(db_to_clean)
-                fingerprints_to_clean = self._external_store_fingerprints_path(drive)
-                if self._file_system.is_file(fingerprints_to_clean):
-                    self._file_system.unlink(fingerprints_to_clean)
-
-            self._file_system.touch(self._last_successful_run)
+            if unexpected_error is not None:
+                raise unexpected_error
+
+            # A run isn't successful while some drive could still be holding an outdated store.
+            if timeout_error is None:
+                self._file_system.touch(self._last_successful_run)
         except FsError as e:
             self._logger.debug(e)
             return e
@@ -386,6 +497,73 @@ class LocalRepository(FilelogSaver):
         finally:
             self._logger.bench('LocalRepository Save store end.')
 
+    def _save_external_store(self, drive: str, abandoned: threading.Event, store: dict[str, Any], manifest: dict[str, str]) -> None:
+        self._logger.bench('LocalRepository Write external json start: ', drive)
+        external_store_path = os.path.join(drive, FILE_downloader_external_storage)
+        external_store_fingerprints_path = self._external_store_fingerprints_path(drive)
+        try:
+            if abandoned.is_set():
+                return
+            self._file_system.save_json(store, external_store_path)
+            if abandoned.is_set():
+                # The manifest would describe the previous store, so it's better to have none.
+                if self._file_system.is_file(external_store_fingerprints_path):
+                    self._file_system.unlink(external_store_fingerprints_path, verbose=False)
+            elif len(manifest) > 0:
+                self._file_system.save_json(manifest, external_store_fingerprints_path)
+            elif self._file_system.is_file(external_store_fingerprints_path):
+                self._file_system.unlink(external_store_fingerprints_path)
+        except OSError as e:
+            self._logger.debug(e)
+            self._logger.print(f'ERROR: Could not save "{external_store_path}"\n'
+                               f'       Is your drive "{drive}" connected and writable?')
+            if self._file_system.is_file(external_store_fingerprints_path):
+                self._file_system.unlink(external_store_fingerprints_path)
+        self._logger.bench('LocalRepository Write external json done: ', drive)
+
+    def _clean_external_store(self, drive: str, abandoned: threading.Event) -> None:
+        db_to_clean = os.path.join(drive, FILE_downloader_external_storage)
+        if not abandoned.is_set() and self._file_system.is_file(db_to_clean):
+            self._file_system.unlink(db_to_clean)
+        fingerprints_to_clean = self._external_store_fingerprints_path(drive)
+        if not abandoned.is_set() and self._file_system.is_file(fingerprints_to_clean):
+            self._file_system.unlink(fingerprints_to_clean)
+
+    def _run_per_drive(self, operations: dict[str, Callable[[str, threading.Event], T]]) -> dict[str, tuple[Optional[T], Optional[Exception]]]:
+        # Drives are independent devices (USB disks spinning up, CIFS round-trips), so
+        # their I/O runs concurrently and each drive only pays for its own latency.
+        # A hung drive can't be interrupted: its daemon thread doesn't hold the process exit,
+        # and its own 'abandoned' event tells the operation to not commit anything once it wakes up.
+        abandoned = {drive: threading.Event() for drive in operations}
+        outcomes: dict[str, tuple[Optional[T], Optional[Exception]]] = {}
+
+        def timeout_error(drive: str) -> FsTimeoutError:
+            return FsTimeoutError(f'Drive "{drive}" did not respond after {self._drive_timeout} seconds.')
+
+        def run(drive: str, operation: Callable[[str, threading.Event], T]) -> None:
+            try:
+                result = operation(drive, abandoned[drive])
+                # An operation that noticed it was abandoned may have skipped its work, so it never counts as done.
+                outcomes[drive] = (None, timeout_error(drive)) if abandoned[drive].is_set() else (result, None)
+            except Exception as e:
+                outcomes[drive] = (None, e)
+
+        threads = {drive: threading.Thread(target=run, args=(drive, operation), name=f'drive-io {drive}', daemon=True) for drive, operation in operations.items()}
+        for thread in threads.values():
+            thread.start()
+
+        results: dict[str, tuple[Optional[T], Optional[Exception]]] = {}
+        deadline = time.monotonic() + self._drive_timeout
+        for drive, thread in threads.items():
+            thread.join(max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                abandoned[drive].set()
+                results[drive] = (None, timeout_error(drive))
+            else:
+                results[drive] = outcomes[drive]
+
+        return results
+
     @staticmethod
     def _external_fingerprints_by_drive(external_stores: dict[str, dict], db_ids: set[str]) -> dict[str, dict]:
         return {
@@ -415,6 +593,11 @@ class LocalRepository(FilelogSaver):
 
         self._logger.bench('LocalRepository rotate logs end.')
 
+    def prepare_logfile(self) -> str:
+        self.rotate_logs()
+        self._file_system.make_dirs_parent(self.logfile_path)
+        return self.logfile_path
+
     def set_temp_log_name(self, name: str) -> None:
         self._temp_log_name = name
 
@@ -427,3 +610,32 @@ class LocalRepository(FilelogSaver):
             import traceback
             print(f'ERROR: Could not copy log file from "{path}" to "{self.logfile_path}"')
             traceback.print_exc()
+
+
+class StoreCache:
+    """Keeps the last loaded store in memory for processes that serve several commands, like the daemon.
+    It is only valid while the store files keep the same modification time and size, and it must only be
+    used by commands that don't modify the store (the online check)."""
+
+    def __init__(self) -> None:
+        self._signature: Optional[tuple[Any, ...]] = None
+        self._local_store: Optional[LocalStoreWrapper] = None
+
+    def get(self, signature: tuple[Any, ...]) -> Optional[LocalStoreWrapper]:
+        return self._local_store if signature == self._signature else None
+
+    def put(self, signature: tuple[Any, ...], local_store: LocalStoreWrapper) -> None:
+        self._signature = signature
+        self._local_store = local_store
+
+    def clear(self) -> None:
+        self._signature = None
+        self._local_store = None
+
+
+def _file_signature(path: str) -> Optional[tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
@@ -24,12 +24,12 @@ from downloader.db_entity import ZipIndexEntity
 
 from downloader.error import DownloaderError
 from downloader.other import empty_store_without_base_path
-from typing import Any, Collection, Optional, TypedDict, cast
+from typing import Any, Collection, Iterator, Optional, TypedDict, cast
 from types import MappingProxyType
 from collections import defaultdict, ChainMap
 
 from downloader.external_store_fingerprints import external_store_fragment_fingerprint
-from downloader.path_package import PathPackage, PathType
+from downloader.path_package import PathPackage, PathPackageBatch, PathType
 
 NO_HASH_IN_STORE_CODE = 'file_does_not_exist_so_cant_get_hash'
 
@@ -68,6 +68,7 @@ class LocalStoreWrapper:
         if 'db_fingerprints' not in local_store or not isinstance(local_store['db_fingerprints'], dict): raise LocalStoreValidationException('db_fingerprints')
         self._local_store: LocalStore = cast(LocalStore, local_store)
         self._replicas: dict[str, str] = {}
+        self._unavailable_drives: set[str] = set()
         self._dirty = False
 
     def unwrap_local_store(self) -> LocalStore:
@@ -100,6 +101,13 @@ class LocalStoreWrapper:
     def replicas(self) -> dict[str, str]:
         return self._replicas
 
+    def set_unavailable_drives(self, drives: set[str]) -> None:
+        self._unavailable_drives = drives
+
+    def unavailable_drives(self) -> set[str]:
+        """Drives whose external store could not be loaded, so their files on disk must be left untouched."""
+        return self._unavailable_drives
+
 
 class LocalStoreValidationException(DownloaderError): pass
 class ReadOnlyStoreException(DownloaderError): pass
@@ -490,18 +498,19 @@ class ReadOnlyStoreAdapter:
     def db_state_fingerprint(self) -> DbStateFingerprint:
         return cast(DbStateFingerprint, MappingProxyType(self._db_state_fingerprint))
 
-    def invalid_hashes(self, file_pkgs: list[PathPackage]) -> list[bool]:
+    def invalid_hashes(self, files: PathPackageBatch) -> list[bool]:
         '''Returns a list of booleans indicating invalid hashes with the same order as the input.'''
         store_files = self._store['files']
-        return [
-            (store_files[pkg.rel_path]['hash'] != pkg.description['hash'] if pkg.rel_path in store_files else True)
-            if not pkg.is_pext_external() else
-            (True if 'external' not in self._store
-                else True if pkg.drive not in self._store['external']
-                    else True if pkg.rel_path not in self._store['external'][pkg.drive]['files']
-                        else self._store['external'][pkg.drive]['files'][pkg.rel_path]['hash'] != pkg.description['hash'])
-            for pkg in file_pkgs
-        ]
+        store_external = self._store.get('external', None)
+        result = []
+        for i, (rel_path, drive, description) in enumerate(zip(files.rel_paths, files.drives, files.descriptions)):
+            if not files.is_pext_external(i):
+                result.append(store_files[rel_path]['hash'] != description['hash'] if rel_path in store_files else True)
+            elif store_external is None or drive not in store_external or rel_path not in store_external[drive]['files']:
+                result.append(True)
+            else:
+                result.append(store_external[drive]['files'][rel_path]['hash'] != description['hash'])
+        return result
 
     def zip_summaries(self) -> dict[str, StoreFragmentZipSummary]:
         grouped: dict[str, StoreFragmentZipSummary] = defaultdict(lambda: {'files': {}, 'folders': {}})
@@ -638,6 +647,14 @@ class ReadOnlyStoreAdapter:
                     matching.update(lowered_key for key in external[kind] if (lowered_key := key.lower()) in lowered_candidates)
         return matching
 
+    def lowered_paths(self, kind: str) -> Iterator[str]:
+        """Same sections as matching_paths_ci, for callers checking many candidates over time."""
+        yield from (key.lower() for key in self._store[kind])
+        if 'external' in self._store:
+            for external in self._store['external'].values():
+                if kind in external:
+                    yield from (key.lower() for key in external[kind])
+
     @property
     def has_externals(self) -> bool:
         return 'external' in self._store
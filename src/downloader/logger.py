@@ -16,15 +16,20 @@
 # You can download the latest version of this tool from:
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 import datetime
+import os
+import shutil
 import tempfile
 import sys
+import threading
 import time
 import traceback
-from typing import Any, Optional, Protocol, TextIO, cast
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Protocol, TextIO, cast
 from pathlib import Path
 import json
 from downloader.config import Config
-from downloader.constants import DOWNLOADER_OUTPUT_DLP1_LTSV, K_DOWNLOADER_OUTPUT
+from downloader.constants import DOWNLOADER_OUTPUT_DLP1_LTSV, K_DOWNLOADER_OUTPUT, FILE_LOGGER_BUFFER_LINES, FILE_LOGGER_FLUSH_INTERVAL
 
 
 class Logger(Protocol):
@@ -83,15 +88,20 @@ class FilelogSaver(Protocol):
     def rotate_logs(self) -> None: pass
     def set_temp_log_name(self, name: str) -> None: pass
     def save_log_from_tmp(self, tmp_logfile: str) -> None: pass
+    def prepare_logfile(self) -> str: """Rotates the logs and returns the path where the log of this run should be written."""
 
 class FilelogManager(Protocol):
     def finalize(self) -> None: pass
     def set_local_repository(self, local_repository: FilelogSaver) -> None: pass
+    def use_final_logfile(self) -> None: pass
 
 class FileLogger(Logger, FilelogManager):
-    def __init__(self) -> None:
-        self._logfile: Optional[TextIO] = cast(TextIO, tempfile.NamedTemporaryFile('w', delete=False))
+    def __init__(self, buffer_lines: int = FILE_LOGGER_BUFFER_LINES, flush_interval: float = FILE_LOGGER_FLUSH_INTERVAL) -> None:
+        self._logfile: Optional[TextIO] = cast(TextIO, tempfile.NamedTemporaryFile('w', delete=False, encoding='utf-8', errors='surrogateescape'))
         self._local_repository: Optional[FilelogSaver] = None
+        self._writer: Optional[_BufferedLogWriter] = _BufferedLogWriter(self._logfile, buffer_lines, flush_interval)
+        self._temp_logfile_name: Optional[str] = self._logfile.name
+        self._prepared_final_logfile = False
 
     def finalize(self) -> None:
         if self._logfile is None:
@@ -100,7 +110,15 @@ class FileLogger(Logger, FilelogManager):
         if self._local_repository is None:
             self.print('Log saved in temp file: ' + self._logfile.name)
 
-        if self._local_repository is not None:
+        if self._writer is not None:
+            self._writer.close()
+
+        if self._temp_logfile_name is None:
+            self._logfile.close()
+            self._logfile = None
+            return
+
+        if self._local_repository is not None and not self._prepared_final_logfile:
             self._local_repository.rotate_logs()
 
         self._logfile.close()
@@ -114,6 +132,39 @@ class FileLogger(Logger, FilelogManager):
         if self._logfile is not None:
             self._local_repository.set_temp_log_name(self._logfile.name)
 
+    def use_final_logfile(self) -> None:
+        """Moves the log written so far to its final location and keeps writing there, so finalize doesn't need to copy it."""
+        if self._logfile is None or self._writer is None or self._local_repository is None or self._temp_logfile_name is None:
+            return
+
+        with self._writer.paused():
+            self._logfile.flush()
+            self._prepared_final_logfile = True
+            try:
+                final_path = self._local_repository.prepare_logfile()
+                final_logfile = open(final_path, 'w', encoding='utf-8', errors='surrogateescape')
+            except Exception as e:
+                _do_print('WARNING: Could not open the log file: ', e, sep='', end='\n', file=self._logfile, flush=True)
+                return
+
+            try:
+                with open(self._temp_logfile_name, 'r', encoding='utf-8', errors='surrogateescape') as temp_logfile:
+                    shutil.copyfileobj(temp_logfile, final_logfile)
+            except Exception as e:
+                _do_print('WARNING: Could not copy the temp log file: ', e, sep='', end='\n', file=final_logfile, flush=True)
+
+            self._logfile.close()
+            try:
+                os.unlink(self._temp_logfile_name)
+            except OSError:
+                pass
+
+            self._logfile = final_logfile
+            self._writer.set_file(final_logfile)
+            self._temp_logfile_name = None
+
+        self._local_repository.set_temp_log_name(final_path)
+
     def print(self, *args: Any, sep: str='', end: str='\n', file: Optional[TextIO]=None, flush: bool=True) -> None:
         self._do_print_in_file(*args, sep=sep, end=end, flush=flush)
 
@@ -124,14 +175,86 @@ class FileLogger(Logger, FilelogManager):
         self._do_print_in_file(*args, sep='', end='\n', flush=False)
 
     def _do_print_in_file(self, *args: Any, sep: str, end: str, flush: bool) -> None:
-        if self._logfile is not None:
-            _do_print(*args, sep=sep, end=end, file=self._logfile, flush=flush)
+        if self._writer is not None:
+            self._writer.write(sep.join([str(a) for a in args]) + end, flush)
+
+
+class _BufferedLogWriter:
+    """Lines are queued by any thread and written in batches by a background thread.
+
+    The queue is bounded: when it gets full, the producer thread writes the batch itself.
+    Writes are forced to storage when requested (errors, reboot) and on close."""
+
+    def __init__(self, logfile: TextIO, capacity: int, flush_interval: float) -> None:
+        self._logfile = logfile
+        self._capacity = capacity
+        self._flush_interval = flush_interval
+        self._lines: deque[str] = deque()
+        self._lines_lock = threading.Lock()
+        self._file_lock = threading.RLock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._background_writer, name='FileLoggerWriter', daemon=True)
+        self._thread.start()
+
+    def write(self, text: str, flush: bool) -> None:
+        with self._lines_lock:
+            self._lines.append(text)
+            full = len(self._lines) >= self._capacity
+
+        if flush:
+            self.flush()
+        elif full:
+            with self._file_lock:
+                self._write_pending()
+
+    def flush(self) -> None:
+        with self._file_lock:
+            self._write_pending()
+            self._try_io(self._logfile.flush)
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        with self._file_lock:
+            self._write_pending()
+            yield
+
+    def set_file(self, logfile: TextIO) -> None:
+        with self._file_lock:
+            self._logfile = logfile
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+
+    def _background_writer(self) -> None:
+        while not self._closed.wait(self._flush_interval):
+            self.flush()
+
+    def _write_pending(self) -> None:
+        with self._lines_lock:
+            if len(self._lines) == 0:
+                return
+            batch = ''.join(self._lines)
+            self._lines.clear()
+
+        self._try_io(self._logfile.write, batch)
+
+    @staticmethod
+    def _try_io(operation: Callable[..., Any], *args: Any) -> None:
+        try:
+            operation(*args)
+        except BaseException as error:
+            print('An unknown exception occurred during logging: %s' % str(error))
 
 
 class NoopFileLogger(FileLogger):
     def __init__(self) -> None:
         self._logfile = None
         self._local_repository: Optional[FilelogSaver] = None
+        self._writer = None
+        self._temp_logfile_name = None
+        self._prepared_final_logfile = False
 
 
 class ConfigLogManager(Protocol):
@@ -168,8 +291,9 @@ class TopLogger(Logger, ConfigLogManager):
         self.file_logger.print(*args, sep=sep, end=end, file=file, flush=flush)
 
     def debug(self, *args: Any, sep: str='', end: str='\n', flush: bool=False) -> None:
+        has_exception = any(isinstance(a, BaseException) for a in args)
         if self._verbose_mode is False and self._received_exception is False:
-            if any(isinstance(a, BaseException) for a in args):
+            if has_exception:
                 self._received_exception = True
             else:
                 return
@@ -177,7 +301,8 @@ class TopLogger(Logger, ConfigLogManager):
         trans_args = _transform_debug_args(args)
         if self._verbose_mode:
             self.print_logger.debug(*trans_args, sep=sep, end=end, flush=flush)
-        self.file_logger.debug(*trans_args, sep=sep, end=end, flush=flush)
+        # Errors are forced to storage right away, in case the process doesn't get to finalize the log
+        self.file_logger.debug(*trans_args, sep=sep, end=end, flush=flush or has_exception)
     def bench(self, *args: Any) -> None:
         if not self._bench_mode:
             return
@@ -246,11 +371,11 @@ class DebugOnlyLoggerDecorator(Logger):
     def __init__(self, decorated_logger: Logger) -> None:
         self._decorated_logger = decorated_logger
 
-    def print(self, *args: Any, sep: str='', end: str='\n', file: Optional[TextIO]=None, flush: bool=True) -> None:
+    def print(self, *args: Any, sep: str='', end: str='\n', file: Optional[TextIO]=None, flush: bool=False) -> None:
         """Calls debug instead of print"""
         self._decorated_logger.debug(*args, sep=sep, end=end, flush=flush)
 
-    def debug(self, *args: Any, sep: str='', end: str='\n', flush: bool=True) -> None:
+    def debug(self, *args: Any, sep: str='', end: str='\n', flush: bool=False) -> None:
         self._decorated_logger.debug(*args, sep=sep, end=end, flush=flush)
 
     def bench(self, *args: Any) -> None:
@@ -21,21 +21,27 @@ import sys
 import os
 import locale
 import argparse
+import time
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from downloader.config import Config, Environment, InvalidConfigParameter, default_config
 from downloader.config_reader import ConfigReader
+from downloader.import_profiler import ImportProfileLogger, import_profiler
 from downloader.constants import KENV_LOGLEVEL, KENV_DOWNLOADER_OUTPUT, KENV_LC_HTTP_PROXY, KENV_HTTP_PROXY, \
     KENV_HTTPS_PROXY, KENV_LC_HTTPS_PROXY, KENV_ROTATE_LOGS, KENV_SKIP_FREE_SPACE_CHECKS, DOWNLOADER_OUTPUT_HUMAN, \
-    K_DOWNLOADER_OUTPUT
-from downloader.logger import OffLogger, TopLogger
+    K_DOWNLOADER_OUTPUT, DOWNLOADER_OUTPUT_DLP1_LTSV, FILE_downloader_metrics_json
+from downloader.logger import OffLogger, PrintLogger, TopLogger
+from downloader.metrics import MetricsRegistry, flatten_metrics, metrics, set_metrics
 from downloader.update_output import UpdateOutput, update_output_for_mode
 
+if TYPE_CHECKING:
+    from downloader.daemon import DaemonState
+
 _UTF8_RELAUNCH_ATTEMPTED_ENV = '_DOWNLOADER_UTF8_RELAUNCH_ATTEMPTED'
 
 
-def main(env: Environment, start_time: float, argv=None) -> int:
+def main(env: Environment, start_time: float, argv=None, daemon_state: Optional['DaemonState'] = None) -> int:
     # This function should be called in __main__.py which just bootstraps the application.
     # It should receive an 'env' dictionary produced by calling the "read_env" function below.
 
@@ -48,7 +54,16 @@ def main(env: Environment, start_time: float, argv=None) -> int:
 
     if args.command == 'version':
         from downloader.version_service import VersionService
-        return VersionService().print_version(env['RELEASE_PATCH'])
+        exit_code = VersionService().print_version(env['RELEASE_PATCH'])
+        report_import_profile(PrintLogger())
+        return exit_code
+
+    if args.command == 'daemon':
+        if daemon_state is not None:
+            PrintLogger().print('The daemon is already running.')
+            return 1
+        from downloader.daemon import run_daemon
+        return run_daemon(lambda command_argv, state: main(env, time.monotonic(), command_argv, state))
 
     config_reader = ConfigReader(OffLogger(), env, start_time)
     config = default_config()
@@ -58,14 +73,18 @@ def main(env: Environment, start_time: float, argv=None) -> int:
         if is_print_only_command else TopLogger.for_main(config, start_time)
     update_output = update_output_for_mode(config[K_DOWNLOADER_OUTPUT], logger)
     config_reader.set_logger(logger)
+    if daemon_state is not None:
+        daemon_state.start_command(logger)
     logger.bench('MAIN start.')
 
     # noinspection PyBroadException
     try:
         config_path = config_reader.calculate_config_path(str(Path().resolve()))
         config_reader.read_rest_env_and_config_file(config_path, config)
+        if config['bench']:
+            set_metrics(MetricsRegistry())
         config_reader.report_findings(config, update_output)
-        exit_code = execute_command(args, config, logger, update_output)
+        exit_code = execute_command(args, config, logger, update_output, daemon_state)
     except InvalidConfigParameter as e:
         logger.debug(e)
         update_output.error('config', 'Configuration error: %s' % str(e))
@@ -78,15 +97,41 @@ def main(env: Environment, start_time: float, argv=None) -> int:
     finally:
         if not is_print_only_command:
             logger.bench('MAIN end.')
+            if config['bench']:
+                report_metrics(config, logger, update_output)
+        report_import_profile(logger)
         logger.file_logger.finalize()
 
     return exit_code
 
 
-def execute_command(args, config: Config, logger: TopLogger, update_output: UpdateOutput) -> int:
+def report_metrics(config: Config, logger: TopLogger, update_output: UpdateOutput) -> None:
+    snapshot = metrics().snapshot()
+    if config[K_DOWNLOADER_OUTPUT] == DOWNLOADER_OUTPUT_DLP1_LTSV:
+        update_output.metrics(flatten_metrics(snapshot))
+        return
+
+    from downloader.file_system import FileSystemFactory
+    from downloader.job_system import ActivityTracker
+    file_system = FileSystemFactory(config, {}, logger, ActivityTracker()).create_for_system_scope()
+    metrics_path = os.path.join(config['base_system_path'], FILE_downloader_metrics_json)
+    try:
+        file_system.save_json(snapshot, metrics_path)
+        logger.bench('Metrics saved at: ', metrics_path)
+    except OSError as e:
+        logger.debug(e)
+
+
+def report_import_profile(logger: ImportProfileLogger) -> None:
+    profiler = import_profiler()
+    if profiler is not None:
+        profiler.report(logger)
+
+
+def execute_command(args, config: Config, logger: TopLogger, update_output: UpdateOutput, daemon_state: Optional['DaemonState'] = None) -> int:
     if args.command == 'check':
         from downloader.check_service_factory import CheckServiceFactory
-        check_service = CheckServiceFactory.for_main(logger, update_output).create(config)
+        check_service = CheckServiceFactory.for_main(logger, update_output, daemon_state).create(config)
         return check_service.check_available_updates(args.check_db_ids)
     if args.command == 'uninstall':
         from downloader.uninstall_service_factory import UninstallServiceFactory
@@ -98,15 +143,15 @@ def execute_command(args, config: Config, logger: TopLogger, update_output: Upda
         return list_dbs_service.list_dbs(config, args.list_dbs_filter)
     if args.command == 'print_drives':
         from downloader.full_run_service_factory import FullRunServiceFactory
-        runner = FullRunServiceFactory.for_main(logger, update_output).create(config)
+        runner = FullRunServiceFactory.for_main(logger, update_output, daemon_state).create(config)
         return runner.print_drives()
     if args.command == 'run_only':
         from downloader.full_run_service_factory import FullRunServiceFactory
-        runner = FullRunServiceFactory.for_main(logger, update_output).create(config)
+        runner = FullRunServiceFactory.for_main(logger, update_output, daemon_state).create(config)
         return runner.run_only(args.run_only_db_ids)
 
     from downloader.full_run_service_factory import FullRunServiceFactory
-    runner = FullRunServiceFactory.for_main(logger, update_output).create(config)
+    runner = FullRunServiceFactory.for_main(logger, update_output, daemon_state).create(config)
     # The heart of this execution is the method "download_dbs_contents" in online_importer.py.
     return runner.full_run()
 
@@ -191,6 +236,8 @@ def parse_args(argv):
                           help='list database IDs and exit (optionally only "configured" or "installed")')
     commands.add_argument('--version', '-v', action='store_const', const='version', dest='command',
                           help='print Downloader version and exit')
+    commands.add_argument('--daemon', action='store_const', const='daemon', dest='command',
+                          help='keep running and serve commands through a Unix socket')
     parser.add_argument('--force', action='store_true', help='accept unverifiable external content during uninstall')
     args = [arg for arg in (argv[1:] if len(argv) > 0 else []) if arg != '']
     parsed_args = parser.parse_args(args)
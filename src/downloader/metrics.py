@@ -0,0 +1,194 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import threading
+import time
+from typing import Any, Final, Optional, Protocol, Union
+
+
+class Span(Protocol):
+    def end(self) -> None: """Records the elapsed time since the span was started. Only the first call counts."""
+    def __enter__(self) -> 'Span': ...
+    def __exit__(self, *exc_info: Any) -> None: ...
+
+
+class Metrics(Protocol):
+    def span(self, name: str) -> Span: """Starts a monotonic timer that accumulates into the timer 'name'."""
+    def add_time(self, name: str, seconds: float) -> None: """Accumulates an already measured duration into the timer 'name'."""
+    def count(self, name: str, amount: int = 1) -> None: """Increments the counter 'name'."""
+    def gauge(self, name: str, value: float) -> None: """Sets the current value of 'name', keeping also its peak."""
+    def observe(self, name: str, value: float) -> None: """Adds a sample to the histogram 'name'."""
+    def snapshot(self) -> dict[str, Any]: """Consistent copy of all the metrics, ready to be serialized as json."""
+
+
+class _NoopSpan(Span):
+    def end(self) -> None: pass
+    def __enter__(self) -> Span: return self
+    def __exit__(self, *exc_info: Any) -> None: pass
+
+_NOOP_SPAN: Final = _NoopSpan()
+
+
+class NoopMetrics(Metrics):
+    def span(self, name: str) -> Span: return _NOOP_SPAN
+    def add_time(self, name: str, seconds: float) -> None: pass
+    def count(self, name: str, amount: int = 1) -> None: pass
+    def gauge(self, name: str, value: float) -> None: pass
+    def observe(self, name: str, value: float) -> None: pass
+    def snapshot(self) -> dict[str, Any]: return {'timers': {}, 'counters': {}, 'gauges': {}, 'histograms': {}}
+
+
+HISTOGRAM_BOUNDS: Final[tuple[float, ...]] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class MetricsRegistry(Metrics):
+    def __init__(self, time_monotonic=time.monotonic) -> None:
+        self._time_monotonic = time_monotonic
+        self._lock = threading.Lock()
+        self._timers: dict[str, list[float]] = {}  # name -> [count, total, max]
+        self._counters: dict[str, int] = {}
+        self._gauges: dict[str, list[float]] = {}  # name -> [last, peak]
+        self._histograms: dict[str, _Histogram] = {}
+
+    def span(self, name: str) -> Span:
+        return _TimerSpan(self, name, self._time_monotonic)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timer = self._timers.get(name, None)
+            if timer is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            gauge = self._gauges.get(name, None)
+            if gauge is None:
+                self._gauges[name] = [value, value]
+            else:
+                gauge[0] = value
+                if value > gauge[1]:
+                    gauge[1] = value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name, None)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram()
+            histogram.add(value)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'timers': {name: {'count': int(count), 'total_ms': _ms(total), 'max_ms': _ms(peak)} for name, (count, total, peak) in sorted(self._timers.items())},
+                'counters': dict(sorted(self._counters.items())),
+                'gauges': {name: {'last': last, 'peak': peak} for name, (last, peak) in sorted(self._gauges.items())},
+                'histograms': {name: histogram.to_dict() for name, histogram in sorted(self._histograms.items())},
+            }
+
+
+class _TimerSpan(Span):
+    __slots__ = ('_registry', '_name', '_time_monotonic', '_start')
+
+    def __init__(self, registry: MetricsRegistry, name: str, time_monotonic) -> None:
+        self._registry = registry
+        self._name = name
+        self._time_monotonic = time_monotonic
+        self._start: Optional[float] = time_monotonic()
+
+    def end(self) -> None:
+        if self._start is None:
+            return
+        self._registry.add_time(self._name, self._time_monotonic() - self._start)
+        self._start = None
+
+    def __enter__(self) -> Span: return self
+    def __exit__(self, *exc_info: Any) -> None: self.end()
+
+
+class _Histogram:
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value < self.min: self.min = value
+        if value > self.max: self.max = value
+        for i, bound in enumerate(HISTOGRAM_BOUNDS):
+            if value <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> dict[str, Any]:
+        buckets = {f'le_{bound}': amount for bound, amount in zip(HISTOGRAM_BOUNDS, self.buckets) if amount > 0}
+        if self.buckets[-1] > 0:
+            buckets['le_inf'] = self.buckets[-1]
+        return {'count': self.count, 'sum': round(self.total, 6), 'min': round(self.min, 6), 'max': round(self.max, 6), 'buckets': buckets}
+
+
+def flatten_metrics(snapshot: dict[str, Any]) -> dict[str, Union[str, int]]:
+    """Single level version of a snapshot, for line based outputs such as the DLP1 LTSV 'metrics' event."""
+    result: dict[str, Union[str, int]] = {}
+    for name, timer in snapshot['timers'].items():
+        result[f'timer.{name}.count'] = timer['count']
+        result[f'timer.{name}.ms'] = timer['total_ms']
+        result[f'timer.{name}.max_ms'] = timer['max_ms']
+    for name, amount in snapshot['counters'].items():
+        result[f'counter.{name}'] = amount
+    for name, gauge in snapshot['gauges'].items():
+        result[f'gauge.{name}'] = str(gauge['last'])
+        result[f'gauge.{name}.peak'] = str(gauge['peak'])
+    for name, histogram in snapshot['histograms'].items():
+        result[f'histogram.{name}.count'] = histogram['count']
+        result[f'histogram.{name}.sum'] = str(histogram['sum'])
+        result[f'histogram.{name}.max'] = str(histogram['max'])
+        for bucket, amount in histogram['buckets'].items():
+            result[f'histogram.{name}.{bucket}'] = amount
+    return result
+
+
+def _ms(seconds: float) -> int:
+    return int(round(seconds * 1000))
+
+
+_metrics: Metrics = NoopMetrics()
+
+
+def metrics() -> Metrics:
+    return _metrics
+
+
+def set_metrics(registry: Metrics) -> None:
+    global _metrics
+    _metrics = registry
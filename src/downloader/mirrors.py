@@ -0,0 +1,115 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import threading
+import time
+from typing import Callable, Optional
+
+from downloader.constants import MIRROR_SCORE_EWMA_WEIGHT, MIRROR_SPREAD_FACTOR, MIRROR_FAILURES_TO_DISABLE, MIRROR_DISABLED_SECONDS, MIRROR_REFERENCE_SIZE
+
+
+class MirrorSelector:
+    """Ranks the alternative base URLs of the databases by how fast they have been serving files in this run.
+
+    Mirrors are measured with the regular downloads: mirrors without samples go first once, then the
+    fetches are spread among the mirrors that are close enough to the best one. Mirrors that fail
+    repeatedly are set aside for a while, and the URLs of the rest remain available for failover."""
+
+    def __init__(self, time_monotonic: Callable[[], float] = time.monotonic) -> None:
+        self._time_monotonic = time_monotonic
+        self._lock = threading.Lock()
+        self._groups: dict[str, list[str]] = {}  # primary base url -> base urls, primary included
+        self._stats: dict[str, _MirrorStats] = {}
+        self._round_robin = 0
+
+    def register(self, base_files_url: str, mirrors: list[str]) -> None:
+        if base_files_url == '' or len(mirrors) == 0:
+            return
+
+        with self._lock:
+            group = self._groups.setdefault(base_files_url, [base_files_url])
+            for mirror in mirrors:
+                if mirror not in group:
+                    group.append(mirror)
+                    self._stats.setdefault(mirror, _MirrorStats())
+            self._stats.setdefault(base_files_url, _MirrorStats())
+
+    def any(self) -> bool:
+        return len(self._groups) > 0
+
+    def candidates(self, url: str) -> list[tuple[str, Optional[str]]]:
+        """URLs to try for 'url', best first, each with the base URL that has to be reported back."""
+        if len(self._groups) == 0:
+            return [(url, None)]
+
+        with self._lock:
+            for primary, group in self._groups.items():
+                if url.startswith(primary):
+                    path = url[len(primary):]
+                    return [(base + path, base) for base in self._rank(group)]
+
+        return [(url, None)]
+
+    def report_success(self, base: Optional[str], size: int, seconds: float) -> None:
+        if base is None: return
+        cost = seconds / max(1.0, size / MIRROR_REFERENCE_SIZE)
+        with self._lock:
+            stats = self._stats[base]
+            stats.score = cost if stats.score is None else stats.score * (1 - MIRROR_SCORE_EWMA_WEIGHT) + cost * MIRROR_SCORE_EWMA_WEIGHT
+            stats.failures = 0
+
+    def report_failure(self, base: Optional[str]) -> None:
+        if base is None: return
+        with self._lock:
+            stats = self._stats[base]
+            stats.failures += 1
+            if stats.failures >= MIRROR_FAILURES_TO_DISABLE:
+                stats.disabled_until = self._time_monotonic() + MIRROR_DISABLED_SECONDS
+                stats.failures = 0
+
+    def _rank(self, group: list[str]) -> list[str]:
+        now = self._time_monotonic()
+        healthy = [base for base in group if self._stats[base].disabled_until <= now]
+        disabled = [base for base in group if self._stats[base].disabled_until > now]
+
+        unmeasured = [base for base in healthy if self._stats[base].score is None]
+        measured = sorted((base for base in healthy if self._stats[base].score is not None), key=lambda base: self._stats[base].score)  # type: ignore[arg-type, return-value]
+        self._round_robin += 1
+        if len(unmeasured) > 0:
+            # Every mirror gets its first downloads before ranking, so that it can be measured.
+            first = unmeasured[self._round_robin % len(unmeasured)]
+            unmeasured.remove(first)
+            return [first] + measured + unmeasured + disabled
+
+        if len(measured) > 1:
+            best_score: float = self._stats[measured[0]].score  # type: ignore[assignment]
+            close = [base for base in measured if self._stats[base].score <= best_score * MIRROR_SPREAD_FACTOR]  # type: ignore[operator]
+            first = close[self._round_robin % len(close)]
+            measured.remove(first)
+            measured.insert(0, first)
+
+        return measured + disabled
+
+
+class _MirrorStats:
+    __slots__ = ('score', 'failures', 'disabled_until')
+
+    def __init__(self) -> None:
+        self.score: Optional[float] = None
+        self.failures = 0
+        self.disabled_until = 0.0
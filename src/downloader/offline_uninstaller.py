@@ -18,12 +18,13 @@
 
 import os
 from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 
 from downloader.config import Config
 from downloader.constants import FILE_downloader_storage_fingerprints_json, FILE_downloader_storage_sigs_json, \
-    FILE_PROP_ENTANGLEMENTS
+    FILE_PROP_ENTANGLEMENTS, UNINSTALL_WORKERS_PER_DRIVE
 from downloader.external_store_fingerprints import expected_external_store_fingerprints, \
     external_store_fingerprints_covered
 from downloader.file_system import FileSystem
@@ -36,6 +37,12 @@ from downloader.update_output import UpdateOutput
 from downloader.waiter import Waiter
 
 
+_REMOVAL_DONE = 'removed'
+_REMOVAL_MISSING = 'missing'
+_REMOVAL_DRIVE_DISCONNECTED = 'drive_disconnected'
+_REMOVAL_FAILED = 'failed'
+
+
 @dataclass
 class _StoredPathPackage:
     store_path: str
@@ -229,6 +236,7 @@ class OfflineUninstaller:
         store = local_store['dbs'][db_id]
         disconnected_drives: set[str] = set()
         other_failure = False
+        removals: list[tuple[_StoredFragmentPackages, _StoredPathPackage]] = []
 
         for stored_fragment in fragments:
             drive = stored_fragment.drive
@@ -246,11 +254,6 @@ class OfflineUninstaller:
                 continue
             for stored_path in stored_fragment.files:
                 pkg = stored_path.package
-                size = pkg.description.get('size', 0)
-                if drive in disconnected_drives:
-                    self._update_output.file_skipped(
-                        db_id, pkg.rel_path, size, 'drive_disconnected')
-                    continue
                 claimants = claimants_by_kind_and_path['files'].get(pkg.rel_path.lower(), [])
                 if claimants:
                     fragment['files'].pop(stored_path.store_path, None)
@@ -259,32 +262,29 @@ class OfflineUninstaller:
                         f'Keeping {pkg.rel_path}: still claimed by [{", ".join(claimants)}].',
                     )
                     self._update_output.file_skipped(
-                        db_id, pkg.rel_path, size, 'claimed')
+                        db_id, pkg.rel_path, pkg.description.get('size', 0), 'claimed')
                     continue
-                if not self._file_system.is_file(pkg.full_path):
-                    if drive is not None and not self._file_system.is_folder(drive):
-                        disconnected_drives.add(drive)
-                        self._update_output.file_skipped(
-                            db_id, pkg.rel_path, size, 'drive_disconnected')
-                        continue
-                    fragment['files'].pop(stored_path.store_path, None)
-                    self._update_output.file_skipped(
-                        db_id, pkg.rel_path, size, 'missing')
-                    continue
-                error = self._unlink_with_retries(pkg.full_path, drive)
-                if error is None:
-                    fragment['files'].pop(stored_path.store_path, None)
-                    tangles = pkg.description.get(FILE_PROP_ENTANGLEMENTS, [])
-                    box.add_removed_file(size)
-                    self._update_output.file_removed([db_id], pkg.rel_path, tangles, size)
-                elif drive is not None and not self._file_system.is_folder(drive):
-                    disconnected_drives.add(drive)
-                    self._update_output.file_skipped(
-                        db_id, pkg.rel_path, size, 'drive_disconnected')
-                else:
-                    other_failure = True
-                    self._update_output.file_failed(
-                        db_id, pkg.rel_path, size, str(error))
+                removals.append((stored_fragment, stored_path))
+
+        for stored_fragment, stored_path, outcome, error in self._remove_files_by_drive(removals, disconnected_drives):
+            pkg = stored_path.package
+            size = pkg.description.get('size', 0)
+            if outcome == _REMOVAL_DONE:
+                stored_fragment.fragment['files'].pop(stored_path.store_path, None)
+                tangles = pkg.description.get(FILE_PROP_ENTANGLEMENTS, [])
+                box.add_removed_file(size)
+                self._update_output.file_removed([db_id], pkg.rel_path, tangles, size)
+            elif outcome == _REMOVAL_MISSING:
+                stored_fragment.fragment['files'].pop(stored_path.store_path, None)
+                self._update_output.file_skipped(
+                    db_id, pkg.rel_path, size, 'missing')
+            elif outcome == _REMOVAL_DRIVE_DISCONNECTED:
+                self._update_output.file_skipped(
+                    db_id, pkg.rel_path, size, 'drive_disconnected')
+            else:
+                other_failure = True
+                self._update_output.file_failed(
+                    db_id, pkg.rel_path, size, str(error))
 
         for stored_fragment in fragments:
             drive = stored_fragment.drive
@@ -400,6 +400,59 @@ class OfflineUninstaller:
             for (store_path, _), package in zip(items, packages)
         ]
 
+    def _remove_files_by_drive(
+            self,
+            removals: list[tuple[_StoredFragmentPackages, _StoredPathPackage]],
+            disconnected_drives: set[str],
+    ) -> Iterator[tuple[_StoredFragmentPackages, _StoredPathPackage, str, Optional[Exception]]]:
+        # Deletions of different drives progress in parallel, and each drive has its own bounded pool so
+        # a slow USB device can't starve the rest. Results are yielded in the caller thread as they come.
+        if len(removals) == 0:
+            return
+
+        removals_by_drive: dict[Optional[str], list[tuple[_StoredFragmentPackages, _StoredPathPackage]]] = {}
+        for removal in removals:
+            removals_by_drive.setdefault(removal[0].drive, []).append(removal)
+
+        executors: list[ThreadPoolExecutor] = []
+        futures: dict[Future[tuple[str, Optional[Exception]]], tuple[_StoredFragmentPackages, _StoredPathPackage]] = {}
+        try:
+            for drive, drive_removals in removals_by_drive.items():
+                executor = ThreadPoolExecutor(max_workers=min(UNINSTALL_WORKERS_PER_DRIVE, len(drive_removals)))
+                executors.append(executor)
+                for stored_fragment, stored_path in drive_removals:
+                    future = executor.submit(self._remove_file, stored_path.package.full_path, drive, disconnected_drives)
+                    futures[future] = (stored_fragment, stored_path)
+
+            for future in as_completed(futures):
+                stored_fragment, stored_path = futures[future]
+                e = future.exception()
+                if e is None:
+                    outcome, error = future.result()
+                else:
+                    outcome, error = _REMOVAL_FAILED, e  # type: ignore[assignment]
+                yield stored_fragment, stored_path, outcome, error
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _remove_file(self, full_path: str, drive: Optional[str], disconnected_drives: set[str]) -> tuple[str, Optional[Exception]]:
+        # Runs in the pool threads. Adding to disconnected_drives makes the rest of the drive to be skipped.
+        if drive in disconnected_drives:
+            return _REMOVAL_DRIVE_DISCONNECTED, None
+        if not self._file_system.is_file(full_path):
+            if drive is not None and not self._file_system.is_folder(drive):
+                disconnected_drives.add(drive)
+                return _REMOVAL_DRIVE_DISCONNECTED, None
+            return _REMOVAL_MISSING, None
+        error = self._unlink_with_retries(full_path, drive)
+        if error is None:
+            return _REMOVAL_DONE, None
+        if drive is not None and not self._file_system.is_folder(drive):
+            disconnected_drives.add(drive)
+            return _REMOVAL_DRIVE_DISCONNECTED, None
+        return _REMOVAL_FAILED, error
+
     def _unlink_with_retries(self, path: str, drive: Optional[str]) -> Optional[Exception]:
         retries = self._config['downloader_retries']
         error: Optional[Exception] = None
@@ -25,7 +25,10 @@ from downloader.fail_policy import FailPolicy
 from downloader.external_drives_repository import ExternalDrivesRepository
 from downloader.file_system import FileSystem
 from downloader.http_gateway import HttpGateway
+from downloader.http_validators import HttpValidators
 from downloader.job_system import JobSystem, Worker, Job, JobContext, ProgressReporter
+from downloader.jobs.check_db_validators_job import CheckDbValidatorsJob
+from downloader.jobs.check_db_validators_worker import CheckDbValidatorsWorker, has_check_validators
 from downloader.jobs.check_mix_store_and_db_worker import CheckMixStoreAndDbWorker
 from downloader.jobs.copy_data_job import CopyDataJob
 from downloader.jobs.copy_data_worker import CopyDataWorker
@@ -73,7 +76,8 @@ class OnlineCheckerWorkersFactory:
             file_download_reporter: FileDownloadProgressReporter,
             local_repository: LocalRepository,
             config: Config,
-            external_drives_repository: Optional[ExternalDrivesRepository] = None
+            external_drives_repository: Optional[ExternalDrivesRepository] = None,
+            http_validators: Optional[HttpValidators] = None
     ):
         self._worker_context = worker_context
         self._progress_reporter = progress_reporter
@@ -84,6 +88,7 @@ class OnlineCheckerWorkersFactory:
         self._local_repository = local_repository
         self._config = config
         self._external_drives_repository = external_drives_repository
+        self._http_validators = http_validators
 
     def create_jobs(self, db_pkgs: list[DbSectionPackage]) -> OnlineCheckerJobs:
         jobs: list[Job] = []
@@ -100,6 +105,14 @@ class OnlineCheckerWorkersFactory:
                 load_local_store_fingerprints_job=load_local_store_fingerprints_job,
                 load_local_store_job=load_local_store_job,
             )
+            if self._can_check_validators(pkg):
+                jobs.append(CheckDbValidatorsJob(
+                    section=pkg.db_id,
+                    ini_description=pkg.section,
+                    load_local_store_fingerprints_job=load_local_store_fingerprints_job,
+                    fallback_job=transfer_job,  # type: ignore[arg-type]
+                ))
+                continue
             jobs.append(transfer_job)  # type: ignore[arg-type]
         jobs.insert(int(len(jobs) / 2) + 1, load_local_store_fingerprints_job)
         return OnlineCheckerJobs(
@@ -108,6 +121,12 @@ class OnlineCheckerWorkersFactory:
             load_local_store_job=load_local_store_job,
         )
 
+    def _can_check_validators(self, pkg: DbSectionPackage) -> bool:
+        if self._http_validators is None:
+            return False
+        entry = self._http_validators.entry(pkg.section['db_url'])
+        return entry is not None and has_check_validators(entry)
+
     def create_workers(self) -> OnlineCheckerWorkers:
         installation_report = InstallationReportImpl()
         self._file_download_reporter.set_installation_report(installation_report)
@@ -160,6 +179,16 @@ class OnlineCheckerWorkersFactory:
                 external_drives_repository=self._external_drives_repository,
             ),
         ]
+        if self._http_validators is not None:
+            workers.append(CheckDbValidatorsWorker(
+                http_gateway=self._http_gateway,
+                http_validators=self._http_validators,
+                logger=self._logger,
+                installation_report=installation_report,
+                worker_context=self._worker_context,
+                progress_reporter=self._progress_reporter,
+                config=checker_config,
+            ))
         return OnlineCheckerWorkers(workers=workers, installation_report=installation_report)
 
 
@@ -218,6 +247,9 @@ class OnlineChecker:
         for transfer_job, _e in self._installation_report.get_failed_jobs(FetchDataJob) + self._installation_report.get_failed_jobs(CopyDataJob):
             if transfer_job.db_id is not None:
                 db_states[transfer_job.db_id] = 0
+        for check_db_validators_job in self._installation_report.get_completed_jobs(CheckDbValidatorsJob):
+            if check_db_validators_job.up_to_date:
+                db_states[check_db_validators_job.section] = 1
         for open_db_job in self._installation_report.get_completed_jobs(OpenDbJob):
             if open_db_job.skipped:
                 db_states[open_db_job.section] = 1
@@ -17,10 +17,11 @@
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
 import sys
-from typing import Optional, Any
+from typing import Callable, Optional, Any, Union
 from collections import defaultdict
 import os
 
+from downloader.bandwidth_limiter import BandwidthLimiter
 from downloader.config import Config, AllowDelete
 from downloader.constants import FILE_MiSTer, EXIT_ERROR_BAD_NEW_BINARY, FILE_downloader_storage_fingerprints_json, \
     FILE_downloader_storage_sigs_json, FILE_PROP_ENTANGLEMENTS
@@ -29,15 +30,16 @@ from downloader.db_utils import DbSectionPackage
 from downloader.error import DownloaderError
 from downloader.file_system import FileSystem
 from downloader.http_gateway import HttpGateway
+from downloader.http_validators import HttpValidators
 from downloader.job_system import Job, JobContext, ProgressReporter
 from downloader.jobs.abort_worker import AbortWorker
 from downloader.jobs.copy_data_job import CopyDataJob
-from downloader.jobs.copy_data_worker import CopyDataWorker
 from downloader.jobs.errors import WrongDatabaseOptions, FileDownloadError
 from downloader.jobs.fetch_data_job import FetchDataJob
 from downloader.jobs.fetch_data_worker import FetchDataWorker
 from downloader.jobs.fetch_file_job import FetchFileJob
 from downloader.jobs.fetch_file_worker import FetchFileWorker
+from downloader.jobs.file_removals import FileUnlink, StoreClaims, make_remove_files_jobs
 from downloader.jobs.jobs_factory import make_transfer_job
 from downloader.jobs.load_local_store_job import LoadLocalStoreJob, local_store_tag
 from downloader.jobs.load_local_store_fingerprints_job import LoadLocalStoreFingerprintsJob, local_store_fingerprints_tag
@@ -47,17 +49,18 @@ from downloader.jobs.mix_store_and_db_job import MixStoreAndDbJob
 from downloader.jobs.mix_store_and_db_worker import MixStoreAndDbWorker
 from downloader.jobs.open_db_job import OpenDbJob
 from downloader.jobs.open_db_worker import OpenDbWorker
-from downloader.jobs.open_zip_contents_worker import OpenZipContentsWorker
-from downloader.jobs.open_zip_summary_worker import OpenZipSummaryWorker
+from downloader.jobs.open_zip_summary_job import OpenZipSummaryJob
 from downloader.jobs.process_db_index_worker import ProcessIndexCtx, ProcessDbIndexWorker
 from downloader.jobs.process_db_main_job import ProcessDbMainJob
 from downloader.jobs.process_db_main_worker import ProcessDbMainWorker
-from downloader.jobs.process_zip_index_worker import ProcessZipIndexWorker
-from downloader.jobs.reporters import InstallationReportImpl, InstallationReport, FileDownloadProgressReporter
+from downloader.jobs.reporters import InstallationReportImpl, InstallationReport, FileDownloadProgressReporter, JobLifecycleListener, NoopJobLifecycleListener
+from downloader.jobs.remove_files_job import RemoveFilesJob
 from downloader.jobs.wait_db_zips_worker import WaitDbZipsWorker
-from downloader.jobs.worker_context import FailCtx
+from downloader.jobs.worker_context import DownloaderWorker, FailCtx, LazyWorker
 from downloader.local_repository import LocalRepository
 from downloader.logger import Logger
+from downloader.metrics import metrics
+from downloader.mirrors import MirrorSelector
 from downloader.file_filter import BadFileFilterPartException, FileFoldersHolder, FileFilterFactory
 from downloader.free_space_reservation import Partition, FreeSpaceReservation
 from downloader.job_system import JobSystem
@@ -65,13 +68,14 @@ from downloader.jobs.open_zip_contents_job import OpenZipContentsJob
 from downloader.jobs.process_db_index_job import ProcessDbIndexJob
 from downloader.jobs.process_zip_index_job import ProcessZipIndexJob
 from downloader.local_store_wrapper import LocalStoreWrapper, StoreFragmentDrivePaths
-from downloader.path_package import PathPackage
+from downloader.path_package import PathPackage, PathPackageBatch
 from downloader.target_path_calculator import TargetPathsCalculatorFactory
 from downloader.update_output import UpdateOutput
+from downloader.zip_summary_prefetcher import ZipSummaryPrefetcher
 
 
 class OnlineImporterWorkersFactory:
-    def __init__(self, worker_context: JobContext, progress_reporter: ProgressReporter, file_system: FileSystem, http_gateway: HttpGateway, logger: Logger, file_download_reporter: FileDownloadProgressReporter, file_filter_factory: FileFilterFactory, target_paths_calculator_factory: TargetPathsCalculatorFactory, free_space_reservation: FreeSpaceReservation, local_repository: LocalRepository, config: Config, fail_ctx: FailCtx, update_output: UpdateOutput):
+    def __init__(self, worker_context: JobContext, progress_reporter: ProgressReporter, file_system: FileSystem, http_gateway: HttpGateway, logger: Logger, file_download_reporter: FileDownloadProgressReporter, file_filter_factory: FileFilterFactory, target_paths_calculator_factory: TargetPathsCalculatorFactory, free_space_reservation: FreeSpaceReservation, local_repository: LocalRepository, config: Config, fail_ctx: FailCtx, update_output: UpdateOutput, bandwidth_limiter: Optional[BandwidthLimiter] = None, mirror_selector: Optional[MirrorSelector] = None, http_validators: Optional[HttpValidators] = None):
         self._worker_context = worker_context
         self._progress_reporter = progress_reporter
         self._file_system = file_system
@@ -85,6 +89,10 @@ class OnlineImporterWorkersFactory:
         self._config = config
         self._fail_ctx = fail_ctx
         self._update_output = update_output
+        self._bandwidth_limiter = bandwidth_limiter
+        self._mirror_selector = mirror_selector if mirror_selector is not None else MirrorSelector()
+        self._http_validators = http_validators
+        self._zip_summary_prefetcher = None if http_validators is None else ZipSummaryPrefetcher(http_gateway, http_validators, file_system, logger, config['downloader_timeout'], bandwidth_limiter=bandwidth_limiter)
 
     def create_jobs(self, db_pkgs: list[DbSectionPackage]) -> list[Job]:
         jobs: list[Job] = []
@@ -118,22 +126,24 @@ class OnlineImporterWorkersFactory:
             file_download_session_logger=self._file_download_reporter,
             free_space_reservation=self._free_space_reservation,
             update_output=self._update_output,
+            http_gateway=self._http_gateway,
+            http_prewarm_connections=self._config['http_prewarm_connections'],
+            store_claims=StoreClaims(installation_report),
         )
         return [
             AbortWorker(
                 worker_context=self._worker_context,
                 progress_reporter=self._progress_reporter,
             ),
-            CopyDataWorker(
-                file_system=self._file_system,
-                progress_reporter=self._progress_reporter,
-            ),
+            LazyWorker(CopyDataJob.type_id, self._progress_reporter, self._create_copy_data_worker),
             FetchFileWorker(
                 logger=self._logger,
                 progress_reporter=self._progress_reporter,
                 http_gateway=self._http_gateway,
                 file_system=self._file_system,
                 timeout=self._config["downloader_timeout"],
+                bandwidth_limiter=self._bandwidth_limiter,
+                mirror_selector=self._mirror_selector,
             ),
             FetchDataWorker(
                 http_gateway=self._http_gateway,
@@ -141,6 +151,10 @@ class OnlineImporterWorkersFactory:
                 progress_reporter=self._progress_reporter,
                 fail_ctx=self._fail_ctx,
                 timeout=self._config["downloader_timeout"],
+                bandwidth_limiter=self._bandwidth_limiter,
+                mirror_selector=self._mirror_selector,
+                http_validators=self._http_validators,
+                zip_summary_prefetcher=self._zip_summary_prefetcher,
             ),
             OpenDbWorker(
                 file_system=self._file_system,
@@ -151,6 +165,9 @@ class OnlineImporterWorkersFactory:
                 progress_reporter=self._progress_reporter,
                 fail_ctx=self._fail_ctx,
                 config=self._config,
+                mirror_selector=self._mirror_selector,
+                zip_summary_prefetcher=self._zip_summary_prefetcher,
+                http_validators=self._http_validators,
             ),
             MixStoreAndDbWorker(
                 logger=self._logger,
@@ -165,6 +182,7 @@ class OnlineImporterWorkersFactory:
                 fail_ctx=self._fail_ctx,
                 process_index_ctx=process_index_ctx,
             ),
+            LazyWorker(RemoveFilesJob.type_id, self._progress_reporter, lambda: self._create_remove_files_worker(installation_report)),
             WaitDbZipsWorker(
                 logger=self._logger,
                 installation_report=installation_report,
@@ -176,13 +194,7 @@ class OnlineImporterWorkersFactory:
                 progress_reporter=self._progress_reporter,
                 fail_ctx=self._fail_ctx,
             ),
-            ProcessZipIndexWorker(
-                logger=self._logger,
-                target_paths_calculator_factory=self._target_paths_calculator_factory,
-                progress_reporter=self._progress_reporter,
-                fail_ctx=self._fail_ctx,
-                process_index_ctx=process_index_ctx,
-            ),
+            LazyWorker(ProcessZipIndexJob.type_id, self._progress_reporter, lambda: self._create_process_zip_index_worker(process_index_ctx)),
             LoadLocalStoreFingerprintsWorker(
                 logger=self._logger,
                 local_repository=self._local_repository,
@@ -194,19 +206,56 @@ class OnlineImporterWorkersFactory:
                 progress_reporter=self._progress_reporter,
                 fail_ctx=self._fail_ctx,
             ),
-            OpenZipSummaryWorker(
-                file_system=self._file_system,
-                logger=self._logger,
-                progress_reporter=self._progress_reporter,
-                fail_ctx=self._fail_ctx,
-            ),
-            OpenZipContentsWorker(
-                logger=self._logger,
-                progress_reporter=self._progress_reporter,
-                process_index_ctx=process_index_ctx,
-            ),
+            LazyWorker(OpenZipSummaryJob.type_id, self._progress_reporter, self._create_open_zip_summary_worker),
+            LazyWorker(OpenZipContentsJob.type_id, self._progress_reporter, lambda: self._create_open_zip_contents_worker(process_index_ctx)),
         ]
 
+    # Workers for jobs that many runs never schedule (zips, local copies, removals) are imported on first use.
+
+    def _create_copy_data_worker(self) -> DownloaderWorker:
+        from downloader.jobs.copy_data_worker import CopyDataWorker
+        return CopyDataWorker(
+            file_system=self._file_system,
+            progress_reporter=self._progress_reporter,
+        )
+
+    def _create_remove_files_worker(self, installation_report: InstallationReportImpl) -> DownloaderWorker:
+        from downloader.jobs.remove_files_worker import RemoveFilesWorker
+        return RemoveFilesWorker(
+            logger=self._logger,
+            file_system=self._file_system,
+            progress_reporter=self._progress_reporter,
+            update_output=self._update_output,
+            installation_report=installation_report,
+        )
+
+    def _create_process_zip_index_worker(self, process_index_ctx: ProcessIndexCtx) -> DownloaderWorker:
+        from downloader.jobs.process_zip_index_worker import ProcessZipIndexWorker
+        return ProcessZipIndexWorker(
+            logger=self._logger,
+            target_paths_calculator_factory=self._target_paths_calculator_factory,
+            progress_reporter=self._progress_reporter,
+            fail_ctx=self._fail_ctx,
+            process_index_ctx=process_index_ctx,
+        )
+
+    def _create_open_zip_summary_worker(self) -> DownloaderWorker:
+        from downloader.jobs.open_zip_summary_worker import OpenZipSummaryWorker
+        return OpenZipSummaryWorker(
+            file_system=self._file_system,
+            logger=self._logger,
+            progress_reporter=self._progress_reporter,
+            fail_ctx=self._fail_ctx,
+        )
+
+    def _create_open_zip_contents_worker(self, process_index_ctx: ProcessIndexCtx) -> DownloaderWorker:
+        from downloader.jobs.open_zip_contents_worker import OpenZipContentsWorker
+        return OpenZipContentsWorker(
+            logger=self._logger,
+            progress_reporter=self._progress_reporter,
+            process_index_ctx=process_index_ctx,
+        )
+
 
 class OnlineImporter:
     def __init__(self, config: Config, logger: Logger, file_system: FileSystem, file_filter_factory: FileFilterFactory, file_download_reporter: FileDownloadProgressReporter, fail_ctx: FailCtx, job_system: JobSystem, worker_factory: OnlineImporterWorkersFactory, old_pext_paths: set[str], update_output: UpdateOutput) -> None:
@@ -229,84 +278,41 @@ class OnlineImporter:
         self._job_system.register_workers({w.job_type_id(): w for w in self._worker_factory.create_workers()})
         self._job_system.push_jobs(self._make_jobs(db_pkgs))
 
-        logger.bench('OnlineImporter execute jobs start.')
-        self._job_system.pending_jobs_amount()
-        self._job_system.execute_jobs()
-        self._file_download_reporter.print_pending()
-        logger.bench('OnlineImporter execute jobs done.')
-
-        report: InstallationReport = self._file_download_reporter.installation_report()
         box = InstallationBox()
-
         box.set_old_pext_paths(self._old_pext_paths)
+        builder = InstallationBoxBuilder(box)
 
-        for fetch_file_job in report.get_started_jobs(FetchFileJob):
-            box.add_file_fetch_started(fetch_file_job.pkg.rel_path)
-
-        for fetch_file_job in report.get_completed_jobs(FetchFileJob):
-            if fetch_file_job.db_id is None or fetch_file_job.pkg is None: continue
-            box.add_downloaded_file(fetch_file_job.pkg.rel_path)
-            box.add_validated_file(fetch_file_job.pkg, fetch_file_job.db_id)
-
-        for fetch_file_job, _e in report.get_failed_jobs(FetchFileJob):
-            box.add_failed_file(fetch_file_job.pkg.rel_path)
-            if FILE_PROP_ENTANGLEMENTS in fetch_file_job.pkg.description:
-                box.add_failed_file_entanglements(fetch_file_job.pkg.description[FILE_PROP_ENTANGLEMENTS])
-
-            self._recover_failed_file_from_backup_or_tmp(fetch_file_job.pkg, fetch_file_job.already_exists)
-
-        db_fetch_success = 0
-        for fetch_data_job in report.get_completed_jobs(FetchDataJob):
-            if isinstance(fetch_data_job.after_job, OpenDbJob):
-                db_fetch_success += 1
-
-        db_fetch_errors = 0
-        for transfer_job, e in report.get_failed_jobs(FetchDataJob) + report.get_failed_jobs(CopyDataJob):
-            if isinstance(transfer_job, FetchDataJob) and isinstance(e, FileDownloadError) and isinstance(transfer_job.after_job, OpenDbJob):
-                db_fetch_errors += 1
-
-            box.add_failed_file(transfer_job.source)  # @TODO: This should not count as a file, but as a "source".
-            if transfer_job.db_id is None:
-                continue
+        logger.bench('OnlineImporter execute jobs start.')
+        with metrics().span('online_importer.execute_jobs'):
+            self._file_download_reporter.set_job_listener(builder)
+            try:
+                self._job_system.pending_jobs_amount()
+                self._job_system.execute_jobs()
+            finally:
+                self._file_download_reporter.set_job_listener(NoopJobLifecycleListener())
+            self._file_download_reporter.print_pending()
+        logger.bench('OnlineImporter execute jobs done.')
 
-            if any(isinstance(tag, str) and ':zip:' in tag for tag in transfer_job.tags):
-                continue
+        report: InstallationReport = self._file_download_reporter.installation_report()
 
-            box.add_failed_db(transfer_job.db_id)
+        for failed_pkg, already_exists in builder.failed_files_to_recover():
+            self._recover_failed_file_from_backup_or_tmp(failed_pkg, already_exists)
 
         logger.bench('OnlineImporter determining network problems...')
 
-        network_problems = db_fetch_success == 0 and db_fetch_errors > 0
+        network_problems = builder.db_fetch_success == 0 and builder.db_fetch_errors > 0
         if network_problems:
             logger.bench('OnlineImporter could not progress with network problems.')
-            return box, NetworkProblems(f'Network problems detected. db_fetch_success == {db_fetch_success} and db_fetch_errors == {db_fetch_errors}')
-
-        filter_terms_from_ini = set()
-        for open_db_job in report.get_completed_jobs(OpenDbJob):
-            filter_terms_from_ini.update(open_db_job.filter_terms_from_ini)
-            if open_db_job.skipped is True:
-                box.add_skipped_db(open_db_job.section)
+            return box, NetworkProblems(f'Network problems detected. db_fetch_success == {builder.db_fetch_success} and db_fetch_errors == {builder.db_fetch_errors}')
 
         box.set_unused_filter_tags([
             part
             for part in self._file_filter_factory.unused_filter_parts()
-            if part in filter_terms_from_ini
+            if part in builder.filter_terms_from_ini
         ])
 
-        for open_db_job, _e in report.get_failed_jobs(OpenDbJob):
-            box.add_failed_db(open_db_job.section)
-
-        skipped_after_store_load = False
-        for mount_store_db_job in report.get_completed_jobs(MixStoreAndDbJob):
-            if mount_store_db_job.skipped is True:
-                skipped_after_store_load = True
-                box.add_skipped_db(mount_store_db_job.db.db_id)
-
-        for mount_store_db_job, _e in report.get_failed_jobs(MixStoreAndDbJob):
-            box.add_failed_db(mount_store_db_job.db.db_id)
-
         if len(box.skipped_dbs()) == len(db_pkgs):
-            if skipped_after_store_load and len(load_local_store_jobs := report.get_completed_jobs(LoadLocalStoreJob)) >= 1:
+            if builder.skipped_after_store_load and len(load_local_store_jobs := report.get_completed_jobs(LoadLocalStoreJob)) >= 1:
                 skipped_local_store = load_local_store_jobs[0].local_store
                 if skipped_local_store is not None and skipped_local_store.needs_save():
                     self._remove_store_fingerprints()
@@ -317,6 +323,11 @@ class OnlineImporter:
             return box, None
 
         logger.bench('OnlineImporter applying changes on stores...')
+        with metrics().span('online_importer.apply_changes'):
+            return self._apply_changes(db_pkgs, box, report)
+
+    def _apply_changes(self, db_pkgs: list[DbSectionPackage], box: 'InstallationBox', report: InstallationReport) -> tuple['InstallationBox', Optional[BaseException]]:
+        logger = self._logger
 
         # There is a totally legit case of not loading the store, and that not being an error
         # That happens when all DBs are skipped due to non strict file checking
@@ -336,78 +347,6 @@ class OnlineImporter:
             elif len(report.get_started_jobs(LoadLocalStoreJob)) > 0:
                 local_store_err = DownloaderError('Local Store was not loaded.')
 
-        for db_job in report.get_completed_jobs(ProcessDbMainJob):
-            box.add_installed_db(db_job.db, db_job.config, db_job.db_hash, db_job.db_size)
-            for zip_id in db_job.ignored_zips:
-                box.add_failed_zip(db_job.db.db_id, zip_id)
-            for zip_id in db_job.removed_zips:
-                box.add_removed_zip(db_job.db.db_id, zip_id)
-
-        for db_job, _e in report.get_failed_jobs(ProcessDbMainJob):
-            box.add_failed_db(db_job.db.db_id)
-
-        for index_job in report.get_completed_jobs(ProcessDbIndexJob):
-            box.add_present_not_validated_files(index_job.present_not_validated_files)
-            box.add_verified_integrity_files(index_job.verified_integrity_pkgs, index_job.db.db_id)
-            box.add_failed_verification_files(index_job.failed_verification_pkgs, index_job.db.db_id)
-            box.add_duplicated_files(index_job.duplicated_files, index_job.db.db_id)
-            box.add_non_duplicated_files(index_job.non_duplicated_files, index_job.db.db_id)
-            box.add_present_validated_files(index_job.present_validated_files, index_job.db.db_id)
-            box.add_skipped_updated_files(index_job.skipped_updated_files, index_job.db.db_id)
-            box.add_repeated_store_presence(index_job.repeated_store_presence, index_job.db.db_id)
-            box.add_removed_folders(index_job.removed_folders, index_job.db.db_id)
-            box.add_installed_folders(index_job.installed_folders, index_job.db.db_id)
-            box.queue_directory_removal(index_job.directories_to_remove, index_job.db.db_id)
-            box.queue_file_removal(index_job.files_to_remove, index_job.db.db_id)
-
-        for index_job, e in report.get_failed_jobs(ProcessDbIndexJob):
-            box.add_failed_db(index_job.db.db_id)
-            box.add_full_partitions(index_job.full_partitions)
-            box.add_failed_files(index_job.failed_files_no_space)
-            box.add_failed_folders(index_job.failed_folders)
-            if not isinstance(e, BadFileFilterPartException): continue
-            box.add_failed_db_options(WrongDatabaseOptions(f"Wrong custom download filter on database {index_job.db.db_id}. Part '{str(e)}' is invalid."))
-
-        for zindex_job in report.get_completed_jobs(ProcessZipIndexJob):
-            box.add_present_not_validated_files(zindex_job.present_not_validated_files)
-            box.add_verified_integrity_files(zindex_job.verified_integrity_pkgs, zindex_job.db.db_id)
-            box.add_duplicated_files(zindex_job.duplicated_files, zindex_job.db.db_id)
-            box.add_non_duplicated_files(zindex_job.non_duplicated_files, zindex_job.db.db_id)
-            box.add_present_validated_files(zindex_job.present_validated_files, zindex_job.db.db_id)
-            box.add_skipped_updated_files(zindex_job.skipped_updated_files, zindex_job.db.db_id)
-            box.add_repeated_store_presence(zindex_job.repeated_store_presence, zindex_job.db.db_id)
-            box.add_removed_folders(zindex_job.removed_folders, zindex_job.db.db_id)
-            box.add_installed_folders(zindex_job.installed_folders, zindex_job.db.db_id)
-            box.queue_directory_removal(zindex_job.directories_to_remove, zindex_job.db.db_id)
-            box.queue_file_removal(zindex_job.files_to_remove, zindex_job.db.db_id)
-            if zindex_job.summary_download_failed is not None:
-                box.add_failed_file(zindex_job.summary_download_failed)
-            if zindex_job.filtered_data:
-                box.add_filtered_zip_data(zindex_job.db.db_id, zindex_job.zip_id, zindex_job.filtered_data)
-            if zindex_job.has_new_zip_summary:
-                box.add_installed_zip_summary(zindex_job.db.db_id, zindex_job.zip_id, zindex_job.result_zip_index, zindex_job.zip_index.description)
-
-        for zindex_job, _e in report.get_failed_jobs(ProcessZipIndexJob):
-            box.add_failed_zip(zindex_job.db.db_id, zindex_job.zip_id)
-            if zindex_job.summary_download_failed is not None:
-                box.add_failed_file(zindex_job.summary_download_failed)
-            box.add_failed_files(zindex_job.failed_files_no_space)
-            box.add_full_partitions(zindex_job.full_partitions)
-            box.add_failed_folders(zindex_job.failed_folders)
-
-        for open_zip_job in report.get_completed_jobs(OpenZipContentsJob):
-            box.add_downloaded_files(open_zip_job.downloaded_files)
-            box.add_validated_files(open_zip_job.validated_files, open_zip_job.db.db_id)
-            # We should be able to comment previous line and the test still pass
-            box.add_failed_files(open_zip_job.failed_files)
-            box.queue_directory_removal(open_zip_job.directories_to_remove, open_zip_job.db.db_id)
-            box.queue_file_removal(open_zip_job.files_to_remove, open_zip_job.db.db_id)
-            for failed_pkg in open_zip_job.failed_files:
-                self._recover_failed_file_from_backup_or_tmp(failed_pkg, already_exists=True)
-
-        for open_zip_job, _e in report.get_failed_jobs(OpenZipContentsJob):
-            box.add_failed_files(open_zip_job.files_to_unzip)
-
         if local_store is None:
             logger.bench('OnlineImporter could not progress without loaded store.')
             return box, local_store_err
@@ -446,78 +385,82 @@ class OnlineImporter:
 
         if len(files_to_consume := box.consume_files()) > 0:
             logger.bench('OnlineImporter files_to_consume start.')
-            # Case-insensitive bookkeeping because MiSTer partitions are FAT32/exFAT: when a db renames
-            # a file changing only its case, removing the old path would delete the just-installed file.
-            processed_file_names: set[str] = {file_pkg.rel_path.lower() for file_pkgs, db_id in box.non_duplicated_files() for file_pkg in file_pkgs}
-            # Claim backstop following the case-sensitivity policy: never unlink a path that
-            # case-insensitively matches a path ANY store still claims, whatever its db state
-            # (processed, skipped, failed mid-run or dormant). A db dropping a path this run is
-            # excluded for that path, so its own stale claim cannot veto its own deletion.
-            lowered_file_consumers: dict[str, set[str]] = {}
-            for pkg, dbs in files_to_consume:
-                lowered_file_consumers.setdefault(pkg.rel_path.lower(), set()).update(dbs)
-            for db_id in local_store.db_ids():
-                claiming_store = read_stores[db_id] if db_id in read_stores else non_current_store(db_id).read_only()
-                for lowered_claim in claiming_store.matching_paths_ci('files', lowered_file_consumers):
-                    if db_id not in lowered_file_consumers[lowered_claim]:
-                        processed_file_names.add(lowered_claim)
-            processed_files: dict[str, list[PathPackage]] = defaultdict(list)
-            removed_files: list[tuple[PathPackage, list[str]]] = []
-
-            unlink_list: list[tuple[list[str], str, list[str], int]] = []
-            failed_entanglements = box.failed_file_entanglements()
-            for pkg, dbs in files_to_consume:
-                if is_entangled_with(pkg, failed_entanglements):
-                    continue
-                db_ids = list(dbs)
-                tangles = pkg.description.get(FILE_PROP_ENTANGLEMENTS, [])
-                size = pkg.description.get('size', 0)
-                lower_rel_path = pkg.rel_path.lower()
+            with metrics().span('online_importer.files_to_consume'):
+                # Case-insensitive bookkeeping because MiSTer partitions are FAT32/exFAT: when a db renames
+                # a file changing only its case, removing the old path would delete the just-installed file.
+                processed_file_names: set[str] = {rel_path.lower() for rel_paths, db_id in box.non_duplicated_files() for rel_path in rel_paths}
+                # Claim backstop following the case-sensitivity policy: never unlink a path that
+                # case-insensitively matches a path ANY store still claims, whatever its db state
+                # (processed, skipped, failed mid-run or dormant). A db dropping a path this run is
+                # excluded for that path, so its own stale claim cannot veto its own deletion.
+                lowered_file_consumers: dict[str, set[str]] = {}
+                for pkg, dbs in files_to_consume:
+                    lowered_file_consumers.setdefault(pkg.rel_path.lower(), set()).update(dbs)
+                for db_id in local_store.db_ids():
+                    claiming_store = read_stores[db_id] if db_id in read_stores else non_current_store(db_id).read_only()
+                    for lowered_claim in claiming_store.matching_paths_ci('files', lowered_file_consumers):
+                        if db_id not in lowered_file_consumers[lowered_claim]:
+                            processed_file_names.add(lowered_claim)
+                processed_files: dict[str, list[PathPackage]] = defaultdict(list)
+                removed_files: list[tuple[PathPackage, list[str]]] = []
+
+                unlink_list: list[FileUnlink] = []
+                failed_entanglements = box.failed_file_entanglements()
+                for pkg, dbs in files_to_consume:
+                    if is_entangled_with(pkg, failed_entanglements):
+                        continue
+                    db_ids = list(dbs)
+                    tangles = pkg.description.get(FILE_PROP_ENTANGLEMENTS, [])
+                    size = pkg.description.get('size', 0)
+                    lower_rel_path = pkg.rel_path.lower()
+
+                    for db_id in db_ids:
+                        if lower_rel_path in processed_file_names: continue
+                        for is_external, drive in read_stores[db_id].list_other_drives_for_file(pkg.rel_path, pkg.drive):
+                            unlink_list.append((db_ids, os.path.join(drive, pkg.rel_path), tangles, size, drive, pkg.rel_path))
+
+                    for db_id in db_ids:
+                        write_stores[db_id].remove_file(pkg.rel_path)
+                        write_stores[db_id].remove_file_from_zips(pkg.rel_path)
 
-                for db_id in db_ids:
                     if lower_rel_path in processed_file_names: continue
-                    for is_external, drive in read_stores[db_id].list_other_drives_for_file(pkg.rel_path, pkg.drive):
-                        unlink_list.append((db_ids, os.path.join(drive, pkg.rel_path), tangles, size))
-
-                for db_id in db_ids:
-                    write_stores[db_id].remove_file(pkg.rel_path)
-                    write_stores[db_id].remove_file_from_zips(pkg.rel_path)
-
-                if lower_rel_path in processed_file_names: continue
-                if pkg.is_pext_external():
-                    unlink_list.append((db_ids, os.path.join(self._config['base_path'], pkg.rel_path), tangles, size))
-
-                unlink_list.append((db_ids, pkg.full_path, tangles, size))
-                processed_files[db_ids[0]].append(pkg)
-                processed_file_names.add(lower_rel_path)
-                removed_files.append((pkg, db_ids))
-
-            if self._config['allow_delete'] == AllowDelete.ALL:
-                pass
-            elif self._config['allow_delete'] == AllowDelete.OLD_RBF:
-                self._logger.debug('Not deleted files because AllowDelete.OLD_RBF: ', [uf for uf in unlink_list if uf[1][-4:].lower() != ".rbf"])
-                unlink_list = [uf for uf in unlink_list if uf[1][-4:].lower() == ".rbf"]
-            else:
-                self._logger.debug('Not deleted files because AllowDelete.NONE: ', unlink_list)
-                unlink_list = []
-
-            for db_ids, unlink_file, tangles, size in unlink_list:
-                if self._file_system.is_file(unlink_file):
-                    err = self._file_system.unlink(unlink_file, verbose=False)
-                    if err is None or not self._file_system.is_file(unlink_file, use_cache=False):
-                        self._update_output.file_removed(db_ids, unlink_file, tangles, size)
-                    if err is not None:
-                        self._logger.debug('WARNING: Online Importer could not remove ', unlink_file, err)
-
-            box.add_removed_files(removed_files)
+                    if pkg.is_pext_external():
+                        unlink_list.append((db_ids, os.path.join(self._config['base_path'], pkg.rel_path), tangles, size, self._config['base_path'], pkg.rel_path))
+
+                    unlink_list.append((db_ids, pkg.full_path, tangles, size, pkg.drive or self._config['base_path'], pkg.rel_path))
+                    processed_files[db_ids[0]].append(pkg)
+                    processed_file_names.add(lower_rel_path)
+                    removed_files.append((pkg, db_ids))
+
+                if self._config['allow_delete'] == AllowDelete.ALL:
+                    pass
+                elif self._config['allow_delete'] == AllowDelete.OLD_RBF:
+                    self._logger.debug('Not deleted files because AllowDelete.OLD_RBF: ', [uf for uf in unlink_list if uf[1][-4:].lower() != ".rbf"])
+                    unlink_list = [uf for uf in unlink_list if uf[1][-4:].lower() == ".rbf"]
+                else:
+                    self._logger.debug('Not deleted files because AllowDelete.NONE: ', unlink_list)
+                    unlink_list = []
+
+                # Most removals already ran alongside the downloads. Only the ones that depended on how the downloads
+                # ended (entangled files, paths other dbs claim or extracted zip contents left out by the filter) remain.
+                removed_while_processing = {removal[1] for job in report.get_completed_jobs(RemoveFilesJob) for removal in job.files}
+                unlink_list = [uf for uf in unlink_list if uf[1] not in removed_while_processing]
+                if len(unlink_list) > 0:
+                    self._job_system.push_jobs(make_remove_files_jobs(unlink_list))
+                    self._job_system.execute_jobs()
+                    self._file_download_reporter.print_pending()
+
+                box.add_removed_files(removed_files)
+            metrics().count('online_importer.removed_files', len(removed_files))
             logger.bench('OnlineImporter files_to_consume done.')
         else:
             processed_files = {}
 
         if len(duplicated_files := box.duplicated_files()) > 0:
             logger.bench('OnlineImporter calculating db_id_by_rel_path start.')
-            db_id_by_rel_path = {file_pkg.rel_path: db_id for file_pkgs, db_id in box.non_duplicated_files() for file_pkg in file_pkgs} | \
-                                {file_pkg.rel_path: db_id for db_id, file_pkgs in processed_files.items() for file_pkg in file_pkgs}
+            with metrics().span('online_importer.db_id_by_rel_path'):
+                db_id_by_rel_path = {rel_path: db_id for rel_paths, db_id in box.non_duplicated_files() for rel_path in rel_paths} | \
+                                    {file_pkg.rel_path: db_id for db_id, file_pkgs in processed_files.items() for file_pkg in file_pkgs}
             logger.bench('OnlineImporter calculating db_id_by_rel_path done.')
 
             dbs_by_file: dict[str, list[str]] = {}
@@ -529,6 +472,7 @@ class OnlineImporter:
                 self._update_output.file_duplicated([used_db_id, *duplicate_db_ids], file, used_db_id)
 
         if len(directories_to_consume := box.consume_directories()) > 0:
+            folder_items = FolderItemsCounts(self._file_system)
             # Claim backstop for folders, same shape as the files one above.
             lowered_folder_consumers: dict[str, set[str]] = {}
             for pkg, dbs in directories_to_consume:
@@ -551,7 +495,7 @@ class OnlineImporter:
                         write_stores[db_id].remove_local_folder_from_zips(pkg.rel_path)
                     continue
 
-                if self._file_system.folder_has_items(pkg.full_path):
+                if folder_items.has_items(pkg.full_path):
                     continue
 
                 removing_folders = []
@@ -560,12 +504,12 @@ class OnlineImporter:
                         if is_external:
                             # @TODO: This count part blow is for checking if previously it was previously stored as "is_pext_external_subfolder", but since this information is lost, we need to do this. When we store "path" = "pext" we will have this information again, so we can do this much cleaner.
                             if pkg.rel_path.count('/') >= 2 and pkg.rel_path.count('/') >= 2 \
-                                    and not self._file_system.folder_has_items(full_ext_path := os.path.join(drive, pkg.rel_path)):
+                                    and not folder_items.has_items(full_ext_path := os.path.join(drive, pkg.rel_path)):
                                 write_stores[db_id].remove_external_folder(drive, pkg.rel_path)
                                 write_stores[db_id].remove_external_folder_from_zips(drive, pkg.rel_path)
                                 removing_folders.append(full_ext_path)
                         else:
-                            if not self._file_system.folder_has_items(full_ext_path := os.path.join(drive, pkg.rel_path)):
+                            if not folder_items.has_items(full_ext_path := os.path.join(drive, pkg.rel_path)):
                                 removing_folders.append(full_ext_path)
                                 write_stores[db_id].remove_local_folder(pkg.rel_path)
                                 write_stores[db_id].remove_local_folder_from_zips(pkg.rel_path)
@@ -584,9 +528,11 @@ class OnlineImporter:
 
                 if self._config['allow_delete'] == AllowDelete.ALL:
                     for removing_dir in removing_folders:
-                        if self._file_system.is_folder(removing_dir) and not self._file_system.folder_has_items(removing_dir):
+                        if folder_items.is_empty_folder(removing_dir):
                             err = self._file_system.remove_folder(removing_dir)
-                            if err is not None:
+                            if err is None:
+                                folder_items.folder_removed(removing_dir)
+                            else:
                                 self._logger.debug('WARNING: Online Importer could not remove folder ', removing_dir, err)
                 else:
                     self._logger.debug('Not removing empty folders because of != AllowDelete.ALL', removing_folders)
@@ -742,6 +688,199 @@ def is_entangled_with(pkg: PathPackage, failed_entanglements: set[str]) -> bool:
     return False
 
 
+class FolderItemsCounts:
+    """Counts the items of each folder once. Removing a folder updates the count of its parent, so that
+    pruning bottom-up doesn't need to scan the same folders again."""
+
+    def __init__(self, file_system: FileSystem) -> None:
+        self._file_system = file_system
+        self._counts: dict[str, Optional[int]] = {}
+
+    def has_items(self, path: str) -> bool:
+        count = self._count(path)
+        return count is not None and count > 0
+
+    def is_empty_folder(self, path: str) -> bool:
+        return self._count(path) == 0
+
+    def folder_removed(self, path: str) -> None:
+        self._counts[path] = None
+        parent_count = self._counts.get(os.path.dirname(path), None)
+        if parent_count is not None and parent_count > 0:
+            self._counts[os.path.dirname(path)] = parent_count - 1
+
+    def _count(self, path: str) -> Optional[int]:
+        if path in self._counts:
+            return self._counts[path]
+        count = self._counts[path] = self._file_system.folder_items_count(path)
+        return count
+
+
+class InstallationBoxBuilder(JobLifecycleListener):
+    """Fills the InstallationBox while the jobs are being executed, so only cross-db resolution is left for the end."""
+
+    def __init__(self, box: 'InstallationBox') -> None:
+        self._box = box
+        self._failed_files_to_recover: list[tuple[PathPackage, bool]] = []
+        self.db_fetch_success = 0
+        self.db_fetch_errors = 0
+        self.filter_terms_from_ini: set[str] = set()
+        self.skipped_after_store_load = False
+        self._on_completed: dict[int, Callable[[Any], None]] = {
+            FetchFileJob.type_id: self._fetch_file_completed,
+            FetchDataJob.type_id: self._fetch_data_completed,
+            OpenDbJob.type_id: self._open_db_completed,
+            MixStoreAndDbJob.type_id: self._mix_store_and_db_completed,
+            ProcessDbMainJob.type_id: self._process_db_main_completed,
+            ProcessDbIndexJob.type_id: self._process_db_index_completed,
+            ProcessZipIndexJob.type_id: self._process_zip_index_completed,
+            OpenZipContentsJob.type_id: self._open_zip_contents_completed,
+        }
+        self._on_failed: dict[int, Callable[[Any, BaseException], None]] = {
+            FetchFileJob.type_id: self._fetch_file_failed,
+            FetchDataJob.type_id: self._transfer_failed,
+            CopyDataJob.type_id: self._transfer_failed,
+            OpenDbJob.type_id: self._open_db_failed,
+            MixStoreAndDbJob.type_id: self._mix_store_and_db_failed,
+            ProcessDbMainJob.type_id: self._process_db_main_failed,
+            ProcessDbIndexJob.type_id: self._process_db_index_failed,
+            ProcessZipIndexJob.type_id: self._process_zip_index_failed,
+            OpenZipContentsJob.type_id: self._open_zip_contents_failed,
+        }
+
+    def failed_files_to_recover(self) -> list[tuple[PathPackage, bool]]: return self._failed_files_to_recover
+
+    def on_job_started(self, job: Job) -> None:
+        if job.type_id == FetchFileJob.type_id:
+            self._box.add_file_fetch_started(job.pkg.rel_path)  # type: ignore[attr-defined]
+
+    def on_job_completed(self, job: Job) -> None:
+        handler = self._on_completed.get(job.type_id, None)
+        if handler is not None: handler(job)
+
+    def on_job_failed(self, job: Job, exception: BaseException) -> None:
+        handler = self._on_failed.get(job.type_id, None)
+        if handler is not None: handler(job, exception)
+
+    def _fetch_file_completed(self, job: FetchFileJob) -> None:
+        if job.db_id is None or job.pkg is None: return
+        self._box.add_downloaded_file(job.pkg.rel_path)
+        self._box.add_validated_file(job.pkg, job.db_id)
+
+    def _fetch_file_failed(self, job: FetchFileJob, _e: BaseException) -> None:
+        self._box.add_failed_file(job.pkg.rel_path)
+        if FILE_PROP_ENTANGLEMENTS in job.pkg.description:
+            self._box.add_failed_file_entanglements(job.pkg.description[FILE_PROP_ENTANGLEMENTS])
+        self._failed_files_to_recover.append((job.pkg, job.already_exists))
+
+    def _fetch_data_completed(self, job: FetchDataJob) -> None:
+        if isinstance(job.after_job, OpenDbJob):
+            self.db_fetch_success += 1
+
+    def _transfer_failed(self, job: Union[FetchDataJob, CopyDataJob], e: BaseException) -> None:
+        if isinstance(job, FetchDataJob) and isinstance(e, FileDownloadError) and isinstance(job.after_job, OpenDbJob):
+            self.db_fetch_errors += 1
+
+        self._box.add_failed_file(job.source)  # @TODO: This should not count as a file, but as a "source".
+        if job.db_id is None:
+            return
+
+        if any(isinstance(tag, str) and ':zip:' in tag for tag in job.tags):
+            return
+
+        self._box.add_failed_db(job.db_id)
+
+    def _open_db_completed(self, job: OpenDbJob) -> None:
+        self.filter_terms_from_ini.update(job.filter_terms_from_ini)
+        if job.skipped is True:
+            self._box.add_skipped_db(job.section)
+
+    def _open_db_failed(self, job: OpenDbJob, _e: BaseException) -> None:
+        self._box.add_failed_db(job.section)
+
+    def _mix_store_and_db_completed(self, job: MixStoreAndDbJob) -> None:
+        if job.skipped is True:
+            self.skipped_after_store_load = True
+            self._box.add_skipped_db(job.db.db_id)
+
+    def _mix_store_and_db_failed(self, job: MixStoreAndDbJob, _e: BaseException) -> None:
+        self._box.add_failed_db(job.db.db_id)
+
+    def _process_db_main_completed(self, job: ProcessDbMainJob) -> None:
+        self._box.add_installed_db(job.db, job.config, job.db_hash, job.db_size)
+        for zip_id in job.ignored_zips:
+            self._box.add_failed_zip(job.db.db_id, zip_id)
+        for zip_id in job.removed_zips:
+            self._box.add_removed_zip(job.db.db_id, zip_id)
+
+    def _process_db_main_failed(self, job: ProcessDbMainJob, _e: BaseException) -> None:
+        self._box.add_failed_db(job.db.db_id)
+
+    def _process_db_index_completed(self, job: ProcessDbIndexJob) -> None:
+        box, db_id = self._box, job.db.db_id
+        box.add_present_not_validated_files(job.present_not_validated_files)
+        box.add_verified_integrity_files(job.verified_integrity_pkgs, db_id)
+        box.add_failed_verification_files(job.failed_verification_pkgs, db_id)
+        box.add_duplicated_files(job.duplicated_files, db_id)
+        box.add_non_duplicated_files(job.non_duplicated_files, db_id)
+        box.add_present_validated_files(job.present_validated_files, db_id)
+        box.add_skipped_updated_files(job.skipped_updated_files, db_id)
+        box.add_repeated_store_presence(job.repeated_store_presence, db_id)
+        box.add_removed_folders(job.removed_folders, db_id)
+        box.add_installed_folders(job.installed_folders, db_id)
+        box.queue_directory_removal(job.directories_to_remove, db_id)
+        box.queue_file_removal(job.files_to_remove, db_id)
+
+    def _process_db_index_failed(self, job: ProcessDbIndexJob, e: BaseException) -> None:
+        self._box.add_failed_db(job.db.db_id)
+        self._box.add_full_partitions(job.full_partitions)
+        self._box.add_failed_files(job.failed_files_no_space)
+        self._box.add_failed_folders(job.failed_folders)
+        if not isinstance(e, BadFileFilterPartException): return
+        self._box.add_failed_db_options(WrongDatabaseOptions(f"Wrong custom download filter on database {job.db.db_id}. Part '{str(e)}' is invalid."))
+
+    def _process_zip_index_completed(self, job: ProcessZipIndexJob) -> None:
+        box, db_id = self._box, job.db.db_id
+        box.add_present_not_validated_files(job.present_not_validated_files)
+        box.add_verified_integrity_files(job.verified_integrity_pkgs, db_id)
+        box.add_duplicated_files(job.duplicated_files, db_id)
+        box.add_non_duplicated_files(job.non_duplicated_files, db_id)
+        box.add_present_validated_files(job.present_validated_files, db_id)
+        box.add_skipped_updated_files(job.skipped_updated_files, db_id)
+        box.add_repeated_store_presence(job.repeated_store_presence, db_id)
+        box.add_removed_folders(job.removed_folders, db_id)
+        box.add_installed_folders(job.installed_folders, db_id)
+        box.queue_directory_removal(job.directories_to_remove, db_id)
+        box.queue_file_removal(job.files_to_remove, db_id)
+        if job.summary_download_failed is not None:
+            box.add_failed_file(job.summary_download_failed)
+        if job.filtered_data:
+            box.add_filtered_zip_data(db_id, job.zip_id, job.filtered_data)
+        if job.has_new_zip_summary:
+            box.add_installed_zip_summary(db_id, job.zip_id, job.result_zip_index, job.zip_index.description)
+
+    def _process_zip_index_failed(self, job: ProcessZipIndexJob, _e: BaseException) -> None:
+        self._box.add_failed_zip(job.db.db_id, job.zip_id)
+        if job.summary_download_failed is not None:
+            self._box.add_failed_file(job.summary_download_failed)
+        self._box.add_failed_files(job.failed_files_no_space)
+        self._box.add_full_partitions(job.full_partitions)
+        self._box.add_failed_folders(job.failed_folders)
+
+    def _open_zip_contents_completed(self, job: OpenZipContentsJob) -> None:
+        self._box.add_downloaded_files(job.downloaded_files)
+        self._box.add_validated_files(job.validated_files, job.db.db_id)
+        # We should be able to comment previous line and the test still pass
+        self._box.add_failed_files(job.failed_files)
+        self._box.queue_directory_removal(job.directories_to_remove, job.db.db_id)
+        self._box.queue_file_removal(job.files_to_remove, job.db.db_id)
+        for failed_pkg in job.failed_files:
+            self._failed_files_to_recover.append((failed_pkg, True))
+
+    def _open_zip_contents_failed(self, job: OpenZipContentsJob, _e: BaseException) -> None:
+        self._box.add_failed_files(job.files_to_unzip)
+
+
 class InstallationBox:
     def __init__(self) -> None:
         self._downloaded_files: list[str] = []
@@ -774,7 +913,7 @@ class InstallationBox:
         self._installed_db_fingerprints: list[tuple[DbEntity, Config, str, int]] = []
         self._failed_dbs: set[str] = set()
         self._duplicated_files: list[tuple[list[str], str]] = []
-        self._non_duplicated_files: list[tuple[list[PathPackage], str]] = []
+        self._non_duplicated_files: list[tuple[list[str], str]] = []
         self._unused_filter_tags: list[str] = []
         self._skipped_dbs: list[str] = []
         self._old_pext_paths: set[str] = set()
@@ -824,9 +963,9 @@ class InstallationBox:
     def add_failed_verification_files(self, pkgs: list[PathPackage], _db_id: str) -> None:
         if len(pkgs) == 0: return
         self._failed_verification_file_names.extend(pkg.rel_path for pkg in pkgs)
-    def add_present_not_validated_files(self, paths: list[PathPackage]) -> None:
-        if len(paths) == 0: return
-        self._present_not_validated_files.extend([p.rel_path for p in paths])
+    def add_present_not_validated_files(self, files: PathPackageBatch) -> None:
+        if len(files) == 0: return
+        self._present_not_validated_files.extend(files.rel_paths)
     def add_skipped_updated_files(self, paths: list[PathPackage], db_id: str) -> None:
         if len(paths) == 0: return
         if db_id not in self._skipped_updated_files:
@@ -852,9 +991,9 @@ class InstallationBox:
     def add_duplicated_files(self, files: list[str], db_id: str) -> None:
         if len(files) == 0: return
         self._duplicated_files.append((files, db_id))
-    def add_non_duplicated_files(self, files: list[PathPackage], db_id: str) -> None:
+    def add_non_duplicated_files(self, files: PathPackageBatch, db_id: str) -> None:
         if len(files) == 0: return
-        self._non_duplicated_files.append((files, db_id))
+        self._non_duplicated_files.append((files.rel_paths, db_id))
     def add_failed_zip(self, db_id: str, zip_id: str) -> None:
         self._failed_zips.append((db_id, zip_id))
     def add_removed_zip(self, db_id: str, zip_id: str) -> None:
@@ -19,13 +19,15 @@
 
 import shutil
 import urllib
-from typing import Optional, Any
+from typing import TYPE_CHECKING, Optional, Any
 
 from pathlib import Path
 from downloader.constants import FILE_MiSTer, FILE_downloader_run_signal
-from downloader.file_system import FileSystem
 from downloader.logger import Logger
 
+if TYPE_CHECKING:
+    from downloader.file_system import FileSystem
+
 
 def screen_columns() -> int:
     try:
@@ -34,7 +36,7 @@ def screen_columns() -> int:
         return 40
 
 
-def remove_run_signal(file_system: FileSystem, logger: Logger) -> None:
+def remove_run_signal(file_system: 'FileSystem', logger: Logger) -> None:
     if file_system.is_file(FILE_downloader_run_signal):
         logger.debug('Removing run signal: ', FILE_downloader_run_signal)
         err = file_system.unlink(FILE_downloader_run_signal)
@@ -18,6 +18,7 @@
 
 
 from enum import auto, unique, Enum
+from itertools import repeat
 from typing import Any, Final, Optional
 
 from downloader.constants import SUFFIX_file_in_progress
@@ -141,6 +142,92 @@ class PathPackage:
         else:
             return None
 
+class PathPackageBatch:
+    """Columnar equivalent of a list of PathPackage sharing the same PathType.
+
+    Index processing handles tens of thousands of files per db, so the stages filter these
+    parallel columns by index and only build PathPackage objects for the entries that need them."""
+    __slots__ = ('ty', 'rel_paths', 'drives', 'descriptions', 'kinds', 'pext_props')
+
+    def __init__(
+        self,
+        ty: PathType = PATH_TYPE_FILE,
+        rel_paths: Optional[list[str]] = None,
+        drives: Optional[list[Optional[str]]] = None,
+        descriptions: Optional[list[dict[str, Any]]] = None,
+        kinds: Optional[bytearray] = None,
+        pext_props: Optional[dict[int, 'PextPathProps']] = None
+    ) -> None:
+        self.ty = ty
+        self.rel_paths: list[str] = [] if rel_paths is None else rel_paths
+        self.drives: list[Optional[str]] = [] if drives is None else drives
+        self.descriptions: list[dict[str, Any]] = [] if descriptions is None else descriptions
+        self.kinds: bytearray = bytearray() if kinds is None else kinds  # PathPackageKind values
+        self.pext_props: dict[int, PextPathProps] = {} if pext_props is None else pext_props  # Sparse, only pext entries
+
+    def __len__(self) -> int:
+        return len(self.rel_paths)
+
+    def full_path(self, i: int) -> str:
+        drive = self.drives[i]
+        return self.rel_paths[i] if drive is None else drive + '/' + self.rel_paths[i]
+
+    def full_paths(self) -> list[str]:
+        return [rel_path if drive is None else drive + '/' + rel_path for rel_path, drive in zip(self.rel_paths, self.drives)]
+
+    def is_pext_external(self, i: int) -> bool:
+        props = self.pext_props.get(i, None)
+        return props is not None and props.kind == PEXT_KIND_EXTERNAL
+
+    def select(self, indexes: list[int]) -> 'PathPackageBatch':
+        if len(indexes) == len(self.rel_paths):
+            return self
+
+        rel_paths, drives, descriptions, kinds = self.rel_paths, self.drives, self.descriptions, self.kinds
+        pext_props = {}
+        if len(self.pext_props) > 0:
+            for new_i, old_i in enumerate(indexes):
+                if old_i in self.pext_props:
+                    pext_props[new_i] = self.pext_props[old_i]
+
+        return PathPackageBatch(
+            self.ty,
+            [rel_paths[i] for i in indexes],
+            [drives[i] for i in indexes],
+            [descriptions[i] for i in indexes],
+            bytearray(kinds[i] for i in indexes),
+            pext_props
+        )
+
+    def pkg(self, i: int) -> PathPackage:
+        drive = self.drives[i]
+        pkg = PathPackage(self.rel_paths[i], drive, self.descriptions[i], self.ty, _KIND_BY_CODE[self.kinds[i]], self.pext_props.get(i, None))
+        if drive is None:
+            pkg._full_path = pkg.rel_path
+        return pkg
+
+    def pkgs(self) -> list[PathPackage]:
+        new = object.__new__
+        cls = PathPackage
+
+        # Same creation trick as in TargetPathsCalculator, since this is also hot for perf
+        result_pkgs = [new(cls) for _ in repeat(None, len(self.rel_paths))]
+
+        ty, pext_props, kind_by_code = self.ty, self.pext_props, _KIND_BY_CODE
+        for i, (pkg, rel_path, drive, description, kind) in enumerate(zip(result_pkgs, self.rel_paths, self.drives, self.descriptions, self.kinds)):
+            pkg.rel_path = rel_path
+            pkg.drive = drive
+            pkg.description = description
+            pkg.ty = ty
+            pkg.kind = kind_by_code[kind]
+            pkg.pext_props = pext_props.get(i, None)
+            pkg._full_path = rel_path if drive is None else None
+
+        return result_pkgs
+
+_KIND_BY_CODE: Final[dict[int, PathPackageKind]] = {kind.value: kind for kind in PathPackageKind}
+
+
 class PextPathProps:
     __slots__ = ('kind', 'parent', 'drive', 'other_drives', 'is_subfolder')
 
@@ -20,6 +20,7 @@ from typing import Protocol, Any
 
 from downloader.error import DownloaderError
 from downloader.logger import Logger
+from downloader.metrics import metrics
 
 
 class StoreMigrator:
@@ -40,7 +41,9 @@ class StoreMigrator:
                 raise WrongMigrationException('Migration error: (%s -1) != %s' % (self._migrations[i].version, i))
 
             self._logger.debug('Running migration version %s.' % self._migrations[i].version)
-            self._migrations[i].migrate(local_store)
+            with metrics().span('store_migrator.migration'):
+                self._migrations[i].migrate(local_store)
+            metrics().count('store_migrator.migrations')
 
         local_store['migration_version'] = self.latest_migration_version()
 
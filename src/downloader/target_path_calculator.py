@@ -19,15 +19,15 @@
 from typing import ItemsView, Any, Optional, Union
 import os
 import threading
-from itertools import repeat
 from pathlib import Path
 
 from downloader.config import Config
 from downloader.error import DownloaderError
 from downloader.external_drives_repository import ExternalDrivesRepository
 from downloader.file_system import FileSystem
+from downloader.metrics import metrics
 from downloader.constants import K_STORAGE_PRIORITY, STORAGE_PRIORITY_OFF, STORAGE_PRIORITY_PREFER_SD, STORAGE_PRIORITY_PREFER_EXTERNAL
-from downloader.path_package import PATH_PACKAGE_KIND_PEXT, PATH_PACKAGE_KIND_STANDARD, PATH_PACKAGE_KIND_SYSTEM, PATH_TYPE_FILE, PATH_TYPE_FOLDER, PEXT_KIND_EXTERNAL, PEXT_KIND_PARENT, PEXT_KIND_STANDARD, PextPathProps, PathPackage, PextKind, PathType
+from downloader.path_package import PATH_PACKAGE_KIND_PEXT, PATH_PACKAGE_KIND_STANDARD, PATH_PACKAGE_KIND_SYSTEM, PATH_TYPE_FILE, PATH_TYPE_FOLDER, PEXT_KIND_EXTERNAL, PEXT_KIND_PARENT, PEXT_KIND_STANDARD, PextPathProps, PathPackage, PathPackageBatch, PextKind, PathType
 
 
 
@@ -37,6 +37,7 @@ class TargetPathsCalculatorFactory:
         self._external_drives_repository = external_drives_repository
         self._old_pext_paths = old_pext_paths
         self._lock = threading.Lock()
+        self._drive_folders = DriveFoldersCache(file_system)
 
     @property
     def external_drives_repository(self) -> ExternalDrivesRepository:
@@ -44,19 +45,23 @@ class TargetPathsCalculatorFactory:
 
     def target_paths_calculator(self, config: Config) -> 'TargetPathsCalculator':
         drives = list(self._external_drives_repository.connected_drives_except_base_path_drives(config))
-        return TargetPathsCalculator(self._file_system, config, drives, self._old_pext_paths, self._lock)
+        return TargetPathsCalculator(self._file_system, config, drives, self._old_pext_paths, self._lock, self._drive_folders)
 
     def stored_paths_calculator(self, config: Config) -> 'TargetPathsCalculator':
-        return TargetPathsCalculator(self._file_system, config, [], self._old_pext_paths, self._lock)
+        return TargetPathsCalculator(self._file_system, config, [], self._old_pext_paths, self._lock, self._drive_folders)
+
+    def folder_created(self, path: str) -> None:
+        self._drive_folders.add_folder(path)
 
 
 class TargetPathsCalculator:
-    def __init__(self, file_system: FileSystem, config: Config, drives: list[str], old_pext_paths: set[str], lock: threading.Lock) -> None:
+    def __init__(self, file_system: FileSystem, config: Config, drives: list[str], old_pext_paths: set[str], lock: threading.Lock, drive_folders: 'DriveFoldersCache') -> None:
         self._file_system = file_system
         self._config = config
         self._drives = drives
         self._old_pext_paths = old_pext_paths
         self._lock = lock
+        self._drive_folders = drive_folders
         self._priority_top_folders: dict[str, StoragePriorityRegistryEntry] = dict()
 
     def deduce_target_path(self, path: str, description: dict[str, Any], path_type: PathType) -> tuple[PathPackage, Optional['StoragePriorityError']]:
@@ -64,35 +69,40 @@ class TargetPathsCalculator:
         return result[0], errors[0] if len(errors) > 0 else None
 
     def create_path_packages(self, packages: Union[ItemsView[str, dict[str, Any]], list[tuple[str, dict[str, Any]]]], ty: PathType, /) -> tuple[list[PathPackage], list['StoragePriorityError']]:
+        batch, errors = self.create_path_package_batch(packages, ty)
+        return batch.pkgs(), errors
+
+    def create_path_package_batch(self, packages: Union[ItemsView[str, dict[str, Any]], list[tuple[str, dict[str, Any]]]], ty: PathType, /) -> tuple[PathPackageBatch, list['StoragePriorityError']]:
         errors: list[StoragePriorityError] = []
 
-        new = object.__new__
-        cls = PathPackage
+        # Columns are filled with local appends instead of per-package attribute sets, since this part is super hot for perf
+        rel_paths: list[str] = []
+        drives: list[Optional[str]] = []
+        descriptions: list[dict[str, Any]] = []
+        kinds = bytearray()
+        pext_props: dict[int, PextPathProps] = {}
 
-        # This weird obj creation is an optimization, since python 3.9 works much faster this way than with a traditional loop + traditional object initialization and this is part is super hot for perf
-        result_pkgs = [new(cls) for _ in repeat(None, len(packages))]
+        add_rel_path, add_drive, add_description, add_kind = rel_paths.append, drives.append, descriptions.append, kinds.append
+        kind_standard, kind_system, kind_pext = PATH_PACKAGE_KIND_STANDARD.value, PATH_PACKAGE_KIND_SYSTEM.value, PATH_PACKAGE_KIND_PEXT.value
 
         base_path = self._config['base_path']
-        for (path, description), pkg in zip(packages, result_pkgs):
+        for i, (path, description) in enumerate(packages):
             first_char = path[0]
 
-            pkg.rel_path = path
-            pkg.description = description
-            pkg.ty = ty
+            add_description(description)
             if first_char == '/':
-                pkg._full_path = path
-                pkg.drive = None
-                pkg.kind = PATH_PACKAGE_KIND_STANDARD
-                pkg.pext_props = None
+                add_rel_path(path)
+                add_drive(None)
+                add_kind(kind_standard)
                 continue
 
             # @TODO: Following condition should never happen. Remove once confidence in non-old-pext paths is 100%
             if first_char == '|':
-                pkg.rel_path = path[1:]
+                path = path[1:]
                 with self._lock:
-                    self._old_pext_paths.add(pkg.rel_path)
+                    self._old_pext_paths.add(path)
 
-            pkg._full_path = None
+            add_rel_path(path)
 
             is_system_file = False
             is_pext_file = False
@@ -103,27 +113,25 @@ class TargetPathsCalculator:
                     is_pext_file = True
 
             if is_pext_file:
-                external, error = self._deduce_possible_external_target_path(path=pkg.rel_path, path_type=pkg.ty)
+                external, error = self._deduce_possible_external_target_path(path=path, path_type=ty)
                 if error is not None:
-                    pkg.drive = base_path
-                    pkg.kind = PATH_PACKAGE_KIND_STANDARD
-                    pkg.pext_props = None
+                    add_drive(base_path)
+                    add_kind(kind_standard)
                     errors.append(error)
                     continue
 
-                pkg.drive, pkg.pext_props = external
-                pkg.kind = PATH_PACKAGE_KIND_PEXT
+                drive, pext_props[i] = external
+                add_drive(drive)
+                add_kind(kind_pext)
 
             elif is_system_file:
-                pkg.drive = self._config['base_system_path']
-                pkg.kind = PATH_PACKAGE_KIND_SYSTEM
-                pkg.pext_props = None
+                add_drive(self._config['base_system_path'])
+                add_kind(kind_system)
             else:
-                pkg.drive = base_path
-                pkg.kind = PATH_PACKAGE_KIND_STANDARD
-                pkg.pext_props = None
+                add_drive(base_path)
+                add_kind(kind_standard)
 
-        return result_pkgs, errors
+        return PathPackageBatch(ty, rel_paths, drives, descriptions, kinds, pext_props), errors
 
     def create_stored_path_packages(
             self,
@@ -187,13 +195,16 @@ class TargetPathsCalculator:
                 self._priority_top_folders[first_folder] = StoragePriorityRegistryEntry()
 
             registry = self._priority_top_folders[first_folder]
+            found = registry.folders.get(first_two_folders, None)
 
-            if first_two_folders not in registry.folders:
-                drive, external, others = self._search_drive_for_directory(first_folder, second_folder)
-                registry.folders[first_two_folders] = (drive, external, others)
-                registry.drives.add(drive)
+        if found is None:
+            # Searching out of the lock, so other index jobs are not blocked while a drive is scanned for the first time
+            found = self._search_drive_for_directory(first_folder, second_folder)
+            with self._lock:
+                found = registry.folders.setdefault(first_two_folders, found)
+                registry.drives.add(found[0])
 
-        drive, external, others = registry.folders[first_two_folders]
+        drive, external, others = found
         return drive, PextPathProps(
             external,  # kind
             first_folder,  # parent
@@ -208,7 +219,7 @@ class TargetPathsCalculator:
         if priority == STORAGE_PRIORITY_OFF:
             return base_path, PEXT_KIND_STANDARD, ()
         elif priority == STORAGE_PRIORITY_PREFER_SD:
-            result, others = self._first_drive_with_existing_directory_prefer_sd(os.path.join(first_folder, second_folder))
+            result, others = self._first_drive_with_existing_directory_prefer_sd(first_folder, second_folder)
             if result is not None:
                 return result, PEXT_KIND_EXTERNAL, others
 
@@ -219,7 +230,7 @@ class TargetPathsCalculator:
             #   They should be the actual behavior instead of the legacy behavior we are using right now. We'll need to fix it in a later release
             #   where the following code would be uncommented and these tests would replace the current passing test.
             #
-            result, others = self._first_drive_with_existing_directory_prefer_sd(os.path.join(first_folder, second_folder))
+            result, others = self._first_drive_with_existing_directory_prefer_sd(first_folder, second_folder)
             if result is not None:
                return result, PEXT_KIND_EXTERNAL, others
 
@@ -231,12 +242,11 @@ class TargetPathsCalculator:
         else:
             raise StoragePriorityError('%s "%s" not valid!' % (K_STORAGE_PRIORITY, priority))
 
-    def _first_drive_with_existing_directory_prefer_sd(self, directory: str) -> tuple[Optional[str], tuple[str, ...]]:
+    def _first_drive_with_existing_directory_prefer_sd(self, first_folder: str, second_folder: str) -> tuple[Optional[str], tuple[str, ...]]:
         result: Optional[str] = None
         others: Optional[list[str]] = None
         for drive in self._drives:
-            absolute_directory = os.path.join(drive, directory)
-            if self._file_system.is_folder(absolute_directory):
+            if self._drive_folders.has_folder(drive, first_folder, second_folder):
                 if result is None:
                     result = drive
                 elif others is None:
@@ -258,6 +268,48 @@ class TargetPathsCalculator:
         return result, () if others is None else others
 
 
+class DriveFoldersCache:
+    """Second level folders of the drives, scanned once per run with a single scandir per top folder.
+
+    Pext resolution of thousands of files across several drives becomes a dict lookup instead of an is_folder call per drive.
+    Folders created during the run must be added with add_folder, so that databases processed later can see them."""
+    def __init__(self, file_system: FileSystem) -> None:
+        self._file_system = file_system
+        self._subfolders: dict[str, tuple[set[str], set[str]]] = dict()
+        self._lock = threading.Lock()
+
+    def has_folder(self, drive: str, first_folder: str, second_folder: str) -> bool:
+        top_folder = os.path.join(drive, first_folder)
+        with self._lock:
+            entry = self._subfolders.get(top_folder, None)
+
+        if entry is None:
+            names = self._file_system.subfolder_names(top_folder)
+            metrics().count('drive_folders.listings')
+            with self._lock:
+                entry = self._subfolders.setdefault(top_folder, (names, {name.lower() for name in names}))
+        else:
+            metrics().count('drive_folders.listing_cache_hits')
+
+        names, lower_names = entry
+        if second_folder in names:
+            return True
+
+        if second_folder.lower() in lower_names:
+            # Only the case differs, so it depends on whether the drive filesystem is case-insensitive (FAT32/exFAT)
+            return self._file_system.is_folder(os.path.join(top_folder, second_folder))
+
+        return False
+
+    def add_folder(self, path: str) -> None:
+        with self._lock:
+            for top_folder, (names, lower_names) in self._subfolders.items():
+                if path.startswith(top_folder + '/'):
+                    name = path[len(top_folder) + 1:].split('/', 1)[0]
+                    names.add(name)
+                    lower_names.add(name.lower())
+
+
 class StoragePriorityError(DownloaderError): pass
 
 class StoragePriorityRegistryEntry:
@@ -0,0 +1,151 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+from typing import Callable, Optional
+
+from downloader.constants import THREADS_AUTOTUNE_PERIOD, THREADS_AUTOTUNE_TOLERANCE, THREADS_AUTOTUNE_MAX_IOWAIT, THREADS_AUTOTUNE_MAX_LATENCY_FACTOR
+from downloader.job_system import ActivityTracker, ThreadsTuner
+from downloader.logger import Logger
+from downloader.metrics import metrics
+
+
+class ThreadsAutotuner(ThreadsTuner):
+    """Hill climbing on downloaded bytes per second. Every period it moves the amount of active threads one step
+    in the current direction, and turns around when throughput drops, the storage is saturated with I/O wait,
+    or the servers start answering much slower than before."""
+
+    def __init__(self, logger: Logger, activity_tracker: ActivityTracker, first_byte_latency: Callable[[], Optional[float]], min_threads: int, max_threads: int, iowait: Optional['IoWaitMeter'] = None, period: float = THREADS_AUTOTUNE_PERIOD, print_report: bool = False) -> None:
+        self._logger = logger
+        self._print_report = print_report
+        self._activity_tracker = activity_tracker
+        self._first_byte_latency = first_byte_latency
+        self._min_threads = min_threads
+        self._max_threads = max(min_threads, max_threads)
+        self._iowait = iowait if iowait is not None else IoWaitMeter()
+        self._period = period
+        self._threads = (self._min_threads + self._max_threads) // 2
+        self._direction = 1
+        self._window_start: Optional[float] = None
+        self._window_bytes = 0
+        self._window_loops = 0
+        self._window_busy_loops = 0
+        self._last_rate: Optional[float] = None
+        self._base_latency: Optional[float] = None
+        self._best_rate = 0.0
+        self._best_threads = self._threads
+
+    def active_threads(self, now: float, has_queued_jobs: bool) -> int:
+        if self._window_start is None:
+            self._start_window(now)
+            return self._threads
+
+        self._window_loops += 1
+        if has_queued_jobs:
+            self._window_busy_loops += 1
+
+        elapsed = now - self._window_start
+        if elapsed < self._period:
+            return self._threads
+
+        rate = (self._activity_tracker.transferred_bytes - self._window_bytes) / elapsed
+        iowait = self._iowait.sample()
+
+        # Windows without queued work waiting for a thread, or with local jobs only, say nothing about the right amount of threads.
+        if rate > 0 and self._window_busy_loops * 2 >= self._window_loops:
+            self._climb(rate, iowait, self._first_byte_latency())
+
+        self._start_window(now)
+        return self._threads
+
+    def report(self) -> None:
+        self._window_start = None
+        self._last_rate = None
+        if self._best_rate <= 0:
+            return
+
+        metrics().gauge('threads_autotuner.best_threads', self._best_threads)
+        message = (f'Threads autotune: best throughput was {_kbps(self._best_rate)} with {self._best_threads} threads. '
+                   f'Set "downloader_threads_limit = {self._best_threads}" in downloader.ini to pin it.')
+        if self._print_report:
+            self._logger.print(message)
+        else:
+            self._logger.debug(message)
+
+    def _climb(self, rate: float, iowait: Optional[float], latency: Optional[float]) -> None:
+        if rate > self._best_rate:
+            self._best_rate = rate
+            self._best_threads = self._threads
+
+        if iowait is not None and iowait > THREADS_AUTOTUNE_MAX_IOWAIT:
+            direction = -1
+        elif latency is not None and self._base_latency is not None and latency > self._base_latency * THREADS_AUTOTUNE_MAX_LATENCY_FACTOR:
+            direction = -1
+        elif self._last_rate is not None and rate < self._last_rate * (1 - THREADS_AUTOTUNE_TOLERANCE):
+            direction = -self._direction
+        else:
+            direction = self._direction
+
+        if latency is not None and (self._base_latency is None or latency < self._base_latency):
+            self._base_latency = latency
+
+        self._direction = direction
+        self._last_rate = rate
+        threads = min(self._max_threads, max(self._min_threads, self._threads + direction))
+        metrics().gauge('threads_autotuner.threads', threads)
+        if threads == self._threads:
+            return
+
+        self._logger.debug(f'Threads autotune: {self._threads} -> {threads} threads ({_kbps(rate)}'
+                           f'{"" if iowait is None else f", iowait {iowait * 100:.0f}%"}'
+                           f'{"" if latency is None else f", 1st byte {latency * 1000:.0f}ms"})')
+        self._threads = threads
+
+    def _start_window(self, now: float) -> None:
+        self._window_start = now
+        self._window_bytes = self._activity_tracker.transferred_bytes
+        self._window_loops = 0
+        self._window_busy_loops = 0
+
+
+class IoWaitMeter:
+    """Fraction of CPU time spent waiting for I/O since the previous sample, from /proc/stat. None where unavailable."""
+
+    def __init__(self, stat_path: str = '/proc/stat') -> None:
+        self._stat_path = stat_path
+        self._last: Optional[tuple[int, int]] = None
+
+    def sample(self) -> Optional[float]:
+        try:
+            with open(self._stat_path, 'r') as f:
+                fields = [int(field) for field in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+
+        if len(fields) < 5:
+            return None
+
+        current = (fields[4], sum(fields))
+        last, self._last = self._last, current
+        if last is None or current[1] <= last[1]:
+            return None
+
+        return (current[0] - last[0]) / (current[1] - last[1])
+
+
+def _kbps(rate: float) -> str:
+    return f'{rate / 1024:.0f} KB/s'
@@ -17,11 +17,12 @@
 # https://github.com/MiSTer-devel/Downloader_MiSTer
 
 import sys
+import threading
 import time
-from typing import Optional, Protocol, TextIO, Union
+from typing import Any, Callable, Final, Optional, Protocol, TextIO, Union
 
 from downloader.config import ConfigDatabaseSection
-from downloader.constants import DOWNLOADER_OUTPUT_DLP1_LTSV
+from downloader.constants import DOWNLOADER_OUTPUT_DLP1_LTSV, UPDATE_OUTPUT_BATCH_INTERVAL, UPDATE_OUTPUT_BATCH_MAX_LINES
 from downloader.logger import Logger
 from downloader.other import screen_columns
 
@@ -69,6 +70,7 @@ class UpdateOutput(Protocol):
     def installed_databases(self, db_ids: list[str]) -> None: pass
     def uninstall_started(self, total_bytes: int, total_files: int, total_dbs: int) -> None: pass
     def uninstall_finished(self, exit_code: int, removed_bytes: int, removed_files: int) -> None: pass
+    def metrics(self, values: dict[str, Union[str, int]]) -> None: pass
 
 
 class NoopUpdateOutput(UpdateOutput):
@@ -109,11 +111,12 @@ class NoopUpdateOutput(UpdateOutput):
     def installed_databases(self, db_ids: list[str]) -> None: pass
     def uninstall_started(self, total_bytes: int, total_files: int, total_dbs: int) -> None: pass
     def uninstall_finished(self, exit_code: int, removed_bytes: int, removed_files: int) -> None: pass
+    def metrics(self, values: dict[str, Union[str, int]]) -> None: pass
 
 
 class HumanUpdateOutput(UpdateOutput):
-    def __init__(self, logger: Logger) -> None:
-        self._logger = logger
+    def __init__(self, logger: Logger, batch_interval: float = UPDATE_OUTPUT_BATCH_INTERVAL, time_monotonic: Callable[[], float] = time.monotonic) -> None:
+        self._logger = _DeferredLinesPrinter(logger, batch_interval, time_monotonic)
         self._check_time: float = 0
         self._needs_newline: bool = False
         self._need_clear_header: bool = False
@@ -145,6 +148,7 @@ class HumanUpdateOutput(UpdateOutput):
         self._check_time = time.monotonic() + 2.0
 
     def work_in_progress(self) -> None:
+        self._logger.flush_if_due()
         now = time.monotonic()
         if self._check_time < now:
             self._symbols.append('*')
@@ -155,12 +159,13 @@ class HumanUpdateOutput(UpdateOutput):
         if self._needs_newline:
             self._logger.print()
             self._needs_newline = False
+        self._logger.flush()
 
     def jobs_cancelled(self, count: int) -> None:
         self._logger.print(f"Cancelled {count} jobs.")
 
     def file_started(self, db_id: str, path: str, size: int, tangles: list[str]) -> None:
-        self._print_line(path)
+        self._print_line(path, defer=True)
         self._check_time = time.monotonic() + 2.0
 
     def file_completed(self, db_id: str, path: str, size: int, already_exists: bool, zip_id: str = '', reboot: bool = False) -> None:
@@ -169,7 +174,7 @@ class HumanUpdateOutput(UpdateOutput):
             self._print_symbols()
 
     def file_removed(self, dbs: list[str], path: str, tangles: list[str], size: int) -> None:
-        self._print_line(f'Removing {path}')
+        self._print_line(f'Removing {path}', defer=True)
 
     def file_failed(self, db_id: str, path: str, size: int, reason: str) -> None:
         self._symbols.append('~')
@@ -240,6 +245,7 @@ class HumanUpdateOutput(UpdateOutput):
     def error(self, code: str, message: str = '') -> None:
         if message:
             self._logger.print(f'ERROR: {message}')
+        self._logger.flush()
 
     def database_failed(self, db_id: str) -> None:
         pass
@@ -308,20 +314,76 @@ class HumanUpdateOutput(UpdateOutput):
         self._needs_newline = True
         self._check_time = time.monotonic() + (1.0 if last_is_asterisk else 2.0)
 
-    def _print_line(self, line: str) -> None:
+    def _print_line(self, line: str, defer: bool = False) -> None:
         if self._need_clear_header:
             line = '\n' + line
         if self._needs_newline:
             line = '\n' + line
-        self._logger.print(line)
+        if defer:
+            self._logger.defer(line)
+        else:
+            self._logger.print(line)
         self._needs_newline = False
         self._need_clear_header = False
 
 
+class _DeferredLinesPrinter(Logger):
+    """Joins the deferred lines of high volume events (per file lines) into a single print, at most once per interval.
+
+    Any regular print writes the deferred lines first, so the output order doesn't change."""
+
+    def __init__(self, logger: Logger, interval: float, time_monotonic: Callable[[], float]) -> None:
+        self._logger = logger
+        self._interval = interval
+        self._time_monotonic = time_monotonic
+        self._lines: list[str] = []
+        self._next_write: float = 0
+
+    def print(self, *args: Any, sep: str='', end: str='\n', file: Optional[TextIO]=None, flush: bool=False) -> None:
+        self.flush()
+        self._logger.print(*args, sep=sep, end=end, file=file, flush=flush)
+
+    def debug(self, *args: Any, sep: str='', end: str='\n', flush: bool=False) -> None:
+        self._logger.debug(*args, sep=sep, end=end, flush=flush)
+
+    def bench(self, *args: Any) -> None:
+        self._logger.bench(*args)
+
+    def defer(self, line: str) -> None:
+        self._lines.append(line)
+        if len(self._lines) >= UPDATE_OUTPUT_BATCH_MAX_LINES or self._time_monotonic() >= self._next_write:
+            self.flush()
+
+    def flush_if_due(self) -> None:
+        if len(self._lines) > 0 and self._time_monotonic() >= self._next_write:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self._lines) == 0:
+            return
+
+        text = '\n'.join(self._lines)
+        self._lines.clear()
+        self._next_write = self._time_monotonic() + self._interval
+        self._logger.print(text)
+
+
 class LtsvUpdateOutput(UpdateOutput):
-    def __init__(self, logger: Logger, stream: Optional[TextIO] = None) -> None:
+    """High volume events (see _BATCHED_EVENTS) are queued and written together at most once per interval,
+    followed by a cumulative 'progress' event. Any other event writes the queue first, so the order is kept."""
+
+    def __init__(self, logger: Logger, stream: Optional[TextIO] = None, batch_interval: float = UPDATE_OUTPUT_BATCH_INTERVAL, time_monotonic: Callable[[], float] = time.monotonic) -> None:
         self._stream = sys.stdout if stream is None else stream
-        self._human_output = HumanUpdateOutput(logger)
+        self._human_output = HumanUpdateOutput(logger, batch_interval, time_monotonic)
+        self._batch_interval = batch_interval
+        self._time_monotonic = time_monotonic
+        self._lock = threading.Lock()
+        self._pending_lines: list[str] = []
+        self._next_write: float = 0
+        self._files_done = 0
+        self._bytes_done = 0
+        self._files_removed = 0
+        self._progress_changed = False
 
     def run_started(self, version: str, commit: str) -> None:
         self._emit('run_start', version=version, commit=commit)
@@ -341,9 +403,14 @@ class LtsvUpdateOutput(UpdateOutput):
         self._human_output.progress_line(line)
 
     def work_in_progress(self) -> None:
+        with self._lock:
+            if len(self._pending_lines) > 0 and self._time_monotonic() >= self._next_write:
+                self._write_pending()
         self._human_output.work_in_progress()
 
     def flush_pending(self) -> None:
+        with self._lock:
+            self._write_pending()
         self._human_output.flush_pending()
 
     def jobs_cancelled(self, count: int) -> None:
@@ -368,6 +435,7 @@ class LtsvUpdateOutput(UpdateOutput):
             fields['zip'] = zip_id
         if reboot:
             fields['reboot'] = 'true'
+        self._add_progress(files_done=1, bytes_done=size)
         self._emit('file_done', **fields)
         self._human_output.file_completed(db_id, path, size, already_exists, zip_id, reboot)
 
@@ -380,6 +448,7 @@ class LtsvUpdateOutput(UpdateOutput):
         fields['path'] = path
         if len(tangles) > 0:
             fields['tangle'] = ','.join(tangles)
+        self._add_progress(files_removed=1)
         self._emit('file_remove', **fields)
         self._human_output.file_removed(dbs, path, tangles, size)
 
@@ -498,11 +567,51 @@ class LtsvUpdateOutput(UpdateOutput):
     def uninstall_finished(self, exit_code: int, removed_bytes: int, removed_files: int) -> None:
         self._emit('uninstall_finish', code=exit_code, bytes=removed_bytes, files=removed_files)
 
+    def metrics(self, values: dict[str, Union[str, int]]) -> None:
+        self._emit('metrics', **values)
+
     def _emit(self, event: str, **fields: Union[str, int]) -> None:
         line = ['DLP1', f'event:{_sanitize(event)}']
         for key, value in fields.items():
             line.append(f'{_sanitize(key)}:{_sanitize(str(value))}')
-        print('\t'.join(line), file=self._stream, flush=True)
+
+        with self._lock:
+            if event not in _BATCHED_EVENTS:
+                self._write_pending('\t'.join(line))
+                return
+
+            self._pending_lines.append('\t'.join(line))
+            if len(self._pending_lines) >= UPDATE_OUTPUT_BATCH_MAX_LINES or self._time_monotonic() >= self._next_write:
+                self._write_pending()
+
+    def _add_progress(self, files_done: int = 0, bytes_done: int = 0, files_removed: int = 0) -> None:
+        with self._lock:
+            self._files_done += files_done
+            self._bytes_done += bytes_done
+            self._files_removed += files_removed
+            self._progress_changed = True
+
+    def _write_pending(self, unbatched_line: Optional[str] = None) -> None:
+        if self._progress_changed:
+            self._progress_changed = False
+            self._pending_lines.append(f'DLP1\tevent:progress\tfiles:{self._files_done}\tbytes:{self._bytes_done}\tremoved:{self._files_removed}')
+
+        if unbatched_line is not None:
+            self._pending_lines.append(unbatched_line)
+
+        if len(self._pending_lines) == 0:
+            return
+
+        self._pending_lines.append('')
+        text = '\n'.join(self._pending_lines)
+        self._pending_lines.clear()
+        self._next_write = self._time_monotonic() + self._batch_interval
+        print(text, end='', file=self._stream, flush=True)
+
+
+_BATCHED_EVENTS: Final[frozenset[str]] = frozenset({
+    'db_size_add', 'file_start', 'file_done', 'file_remove', 'file_fail', 'file_skip', 'file_duplicate', 'not_overwritten'
+})
 
 
 def update_output_for_mode(mode: str, logger: Logger) -> UpdateOutput:
@@ -0,0 +1,143 @@
+# Copyright (c) 2021-2026 José Manuel Barroso Galindo <theypsilon@gmail.com>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# You can download the latest version of this tool from:
+# https://github.com/MiSTer-devel/Downloader_MiSTer
+
+import io
+import threading
+from collections import deque
+from typing import Optional
+
+from downloader.bandwidth_limiter import BandwidthLimiter
+from downloader.constants import ZIP_SUMMARY_PREFETCH_THREADS
+from downloader.file_system import FileSystem
+from downloader.http_gateway import HttpGateway
+from downloader.http_validators import HttpValidators
+from downloader.logger import Logger
+
+
+class ZipSummaryPrefetcher:
+    """Speculatively downloads the zip summaries a database used in the previous run, while the new
+    database is still being parsed and mixed with the store. Requests are conditional, so summaries that
+    didn't change cost just a 304. The payloads are only used if their MD5 matches the summary_file hash
+    of the new database, otherwise they are discarded and the regular fetch takes place.
+
+    Being speculative, they go through the bandwidth limiter without priority, and stop once the run is interrupted."""
+
+    def __init__(self, http_gateway: HttpGateway, http_validators: HttpValidators, file_system: FileSystem, logger: Logger, timeout: int, max_threads: int = ZIP_SUMMARY_PREFETCH_THREADS, bandwidth_limiter: Optional[BandwidthLimiter] = None) -> None:
+        self._http_gateway = http_gateway
+        self._http_validators = http_validators
+        self._file_system = file_system
+        self._logger = logger
+        self._timeout = timeout
+        self._max_threads = max_threads
+        self._bandwidth_limiter = bandwidth_limiter
+        self._lock = threading.Lock()
+        self._prefetches: dict[str, '_Prefetch'] = {}
+        self._queue: deque['_Prefetch'] = deque()
+        self._threads = 0
+        self.used = 0
+        self.discarded = 0
+
+    def has_candidates(self, db_id: str) -> bool:
+        return len(self._http_validators.db_urls(db_id)) > 0
+
+    def prefetch(self, db_id: str, exclude_urls: set[str]) -> int:
+        urls = [url for url in self._http_validators.db_urls(db_id) if url not in exclude_urls]
+        with self._lock:
+            queued = 0
+            for url in urls:
+                if url in self._prefetches: continue
+                prefetch = _Prefetch(url)
+                self._prefetches[url] = prefetch
+                self._queue.append(prefetch)
+                queued += 1
+
+            new_threads = min(self._max_threads - self._threads, len(self._queue))
+            self._threads += new_threads
+
+        for _ in range(new_threads):
+            threading.Thread(target=self._drain_queue, daemon=True).start()
+
+        if queued > 0: self._logger.debug(f'Prefetching {queued} zip summaries for: ', db_id)
+        return queued
+
+    def take(self, url: str, expected_hash: str) -> Optional[io.BytesIO]:
+        with self._lock:
+            prefetch = self._prefetches.pop(url, None)
+            if prefetch is None:
+                return None
+            if not prefetch.started:
+                # Too late to be useful, the regular fetch is going to happen now.
+                prefetch.cancelled = True
+                return None
+
+        prefetch.done.wait(self._timeout)
+        if prefetch.data is None or prefetch.hash != expected_hash:
+            if prefetch.data is not None: self.discarded += 1
+            return None
+
+        self.used += 1
+        self._logger.debug('Using prefetched zip summary: ', url)
+        return prefetch.data
+
+    def _drain_queue(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._queue) == 0 or self._http_gateway.out_of_service:
+                    # Interruptions take the gateway out of service, and then the remaining prefetches are dropped.
+                    self._queue.clear()
+                    self._threads -= 1
+                    return
+                prefetch = self._queue.popleft()
+                if prefetch.cancelled:
+                    continue
+                prefetch.started = True
+
+            try:
+                self._fetch(prefetch)
+            except Exception as e:
+                self._logger.debug('Zip summary prefetch failed: ', prefetch.url, ' ', e)
+            finally:
+                prefetch.done.set()
+
+    def _fetch(self, prefetch: '_Prefetch') -> None:
+        with self._http_gateway.open(prefetch.url, headers=self._http_validators.conditional_headers(prefetch.url)) as (_final_url, in_stream):
+            if in_stream.status == 304:
+                self._http_validators.confirm(prefetch.url)
+                return
+            if in_stream.status != 200:
+                return
+
+            entry = self._http_validators.entry(prefetch.url)
+            db_id = None if entry is None else entry.get('db_id', None)
+            if self._bandwidth_limiter is not None:
+                in_stream = self._bandwidth_limiter.throttled(in_stream, db_id, False)
+            data, data_hash = self._file_system.write_stream_to_data(in_stream, True, self._timeout)
+            self._http_validators.record(prefetch.url, db_id, in_stream.headers, data_hash, data.getbuffer().nbytes)
+            prefetch.data, prefetch.hash = data, data_hash
+
+
+class _Prefetch:
+    __slots__ = ('url', 'done', 'started', 'cancelled', 'data', 'hash')
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.done = threading.Event()
+        self.started = False
+        self.cancelled = False
+        self.data: Optional[io.BytesIO] = None
+        self.hash = ''